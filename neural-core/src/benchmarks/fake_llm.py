@@ -0,0 +1,60 @@
+"""
+LLM falso para benchmarks: responde sem rede com um resumo determinístico
+"""
+import time
+from typing import Any, Iterator, List
+
+from langchain.schema import AIMessage
+
+DEFAULT_SUMMARY = """## Key Announcements
+- The team announced the mainnet upgrade and the staking launch date
+- A partnership and exchange listing were confirmed by the official account
+
+## Development Updates
+- Testnet release fixed the bridge bug and deployed the new smart contract
+- Roadmap milestone for governance proposal voting is on track
+
+## Community Highlights
+- Members discussed validator rewards, node fees and wallet support
+- Price speculation and moon posts continued in the main chat
+
+## Summary
+- Governance vote, staking and the mainnet upgrade dominated the discussion
+"""
+
+class FakeLLM:
+    """Imita a interface usada de ChatOpenAI (invoke/stream) sem chamadas externas"""
+
+    def __init__(self, summary: str = DEFAULT_SUMMARY, latency: float = 0.0, chars_per_token: int = 4):
+        self.summary = summary
+        self.latency = latency
+        self.chars_per_token = chars_per_token
+        self.calls = 0
+        self.prompt_chars = 0
+
+    def _usage(self, prompt: List[Any]) -> dict:
+        chars = sum(len(str(getattr(message, "content", message))) for message in prompt)
+        self.prompt_chars += chars
+        input_tokens = chars // self.chars_per_token
+        output_tokens = len(self.summary) // self.chars_per_token
+        return {"input_tokens": input_tokens, "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens}
+
+    def invoke(self, prompt: List[Any], **kwargs) -> AIMessage:
+        self.calls += 1
+        usage = self._usage(prompt)
+        if self.latency:
+            time.sleep(self.latency)
+        return AIMessage(content=self.summary, usage_metadata=usage)
+
+    def stream(self, prompt: List[Any], **kwargs) -> Iterator[AIMessage]:
+        self.calls += 1
+        usage = self._usage(prompt)
+        if self.latency:
+            time.sleep(self.latency)
+        lines = self.summary.splitlines(keepends=True)
+        for i, line in enumerate(lines):
+            chunk = {"content": line}
+            if i == len(lines) - 1:
+                chunk["usage_metadata"] = usage
+            yield AIMessage(**chunk)
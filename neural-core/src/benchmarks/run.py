@@ -0,0 +1,224 @@
+"""
+Suite de benchmarks offline do pipeline do Neural Core
+
+Uso (a partir de neural-core/src):
+    python -m benchmarks.run run --sizes 1000,100000 --output ../shared/benchmarks/atual.json
+    python -m benchmarks.run compare base.json atual.json
+"""
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+# O benchmark nunca chama a OpenAI; Config só exige que a chave exista
+os.environ.setdefault("OPENAI_API_KEY", "benchmark-fake-key")
+
+import typer
+from sqlalchemy import insert
+
+from benchmarks.fake_llm import FakeLLM
+from benchmarks.synthetic import SyntheticMessageGenerator, SyntheticProfile
+from models import Message
+from services.ai_processor import AIProcessor
+from services.database import DatabaseManager
+from services.rollups import rebuild_rollups
+from utils.profiling import StageProfiler
+
+app = typer.Typer(help="Offline benchmarks for the Neural Core summary path", add_completion=False)
+
+SCHEMA_VERSION = 1
+INSERT_CHUNK = 10_000
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+def _load_messages(db: DatabaseManager, project_id: int, size: int, seed: int, profile: SyntheticProfile) -> datetime:
+    """Popula o banco com `size` mensagens sintéticas e retorna o fim do intervalo"""
+    end = datetime.utcnow()
+    generator = SyntheticMessageGenerator(profile, seed=seed)
+    chunk: List[Dict[str, Any]] = []
+    sender_ids: Dict[str, int] = {}  # Autor sintético -> telegram_id estável
+
+    def flush(connection):
+        # Texto na tabela de conteúdo e autor na tabela de autores, como na ingestão do Oracle Eye
+        content_ids = db.content_store.intern(connection, [row["content"] for row in chunk])
+        senders = [{"telegram_id": sender_ids.setdefault(row["author"], len(sender_ids) + 1),
+                    "username": row["author"][1:] if row["author"].startswith("@") else None,
+                    "display_name": row["author"]} for row in chunk]
+        author_ids = db.author_store.intern(connection, senders)
+        connection.execute(insert(Message), [
+            {**row, "content": "", "content_id": content_ids[row["content"]],
+             "author": None, "author_id": author_ids[sender_ids[row["author"]]]} for row in chunk
+        ])
+        chunk.clear()
+
+    with db.engine.begin() as connection:
+        for row in generator.generate(project_id, size, end=end):
+            chunk.append(row)
+            if len(chunk) >= INSERT_CHUNK:
+                flush(connection)
+        if chunk:
+            flush(connection)
+    return end
+
+def _measure(name: str, fn: Callable[[], Any], repeat: int, track_memory: bool, items: int) -> Dict[str, Any]:
+    """Executa `fn` `repeat` vezes e resume tempo de parede, CPU e pico de memória"""
+    walls, cpus, peaks = [], [], []
+    result = None
+    for _ in range(repeat):
+        profiler = StageProfiler(track_memory=track_memory)
+        profiler.start()
+        try:
+            with profiler.stage(name):
+                result = fn()
+        finally:
+            profiler.stop()
+        timing = profiler.stages[name]
+        walls.append(timing.wall_seconds)
+        cpus.append(timing.cpu_seconds)
+        peaks.append(timing.peak_memory_bytes)
+
+    best = min(walls)
+    return {
+        "benchmark": name,
+        "items": items,
+        "repeat": repeat,
+        "wall_seconds": {"min": round(best, 6), "median": round(statistics.median(walls), 6)},
+        "cpu_seconds": {"min": round(min(cpus), 6), "median": round(statistics.median(cpus), 6)},
+        "peak_memory_mb": round(max(peaks) / (1024 * 1024), 3) if track_memory else None,
+        "throughput_per_sec": round(items / best, 2) if best > 0 else None,
+        "_result": result,
+    }
+
+def _run_size(size: int, repeat: int, seed: int, track_memory: bool, profile: SyntheticProfile,
+              workdir: Path) -> List[Dict[str, Any]]:
+    db_path = workdir / f"bench_{size}.db"
+    db = DatabaseManager(db_url=f"sqlite:///{db_path}")
+    project = db.create_project(name=f"bench-{size}", telegram_group="@bench")
+
+    typer.echo(f"  loading {size:,} synthetic messages...")
+    end = _load_messages(db, project.id, size, seed, profile)
+    # A ingestão real mantém os rollups; aqui eles são reconstruídos após a carga direta
+    rebuild_rollups(db, project)
+    start = end - timedelta(days=3650)
+
+    llm = FakeLLM()
+    processor = AIProcessor(db=db, llm=llm)
+    # O teto de custo é irrelevante com LLM falso e abortaria os tamanhos grandes
+    processor.config.MAX_COST_PER_SUMMARY = float("inf")
+    analyzer = processor.relevance_analyzer
+
+    results = []
+
+    def record(name: str, fn: Callable[[], Any], items: int = size) -> Any:
+        entry = _measure(name, fn, repeat, track_memory, items)
+        value = entry.pop("_result")
+        entry["size"] = size
+        results.append(entry)
+        typer.echo(f"    {name:<32} {entry['wall_seconds']['min']:>9.3f}s  "
+                   f"{entry['throughput_per_sec'] or 0:>12,.0f}/s  "
+                   f"{entry['peak_memory_mb'] if entry['peak_memory_mb'] is not None else '-':>8} MB")
+        return value
+
+    messages = record("get_messages_by_project", lambda: db.get_messages_by_project(project.id, start, end))
+    record("estimate_cost", lambda: processor.estimate_cost(project, start, end))
+    scores = record("analyze_messages_batch", lambda: analyzer.analyze_messages_batch(messages))
+    record("generate_relevance_metadata", lambda: analyzer.generate_relevance_metadata(messages, scores))
+    record("extract_citations_from_summary",
+           lambda: processor._extract_citations_from_summary(llm.summary, messages, scores))
+    topics = record("cluster_topics", lambda: processor._cluster(messages))
+    record("prepare_messages_for_ai", lambda: processor._prepare_messages_for_ai(messages, topics))
+    record("generate_summary_fake_llm", lambda: processor.generate_summary(project, start, end))
+
+    db.engine.dispose()
+    return results
+
+@app.command()
+def run(
+    sizes: str = typer.Option("1000,100000", "--sizes", "-s", help="Comma-separated message counts (e.g. 1000,100000,1000000)"),
+    repeat: int = typer.Option(3, "--repeat", "-r", help="Repetitions per benchmark (min and median reported)"),
+    seed: int = typer.Option(42, "--seed", help="Random seed for the synthetic generator"),
+    spam_ratio: float = typer.Option(0.15, "--spam-ratio", help="Fraction of spam messages"),
+    link_density: float = typer.Option(0.08, "--link-density", help="Fraction of messages with links"),
+    authors: int = typer.Option(2000, "--authors", help="Distinct authors (Zipf distributed)"),
+    memory: bool = typer.Option(True, "--memory/--no-memory", help="Track peak memory with tracemalloc (slower)"),
+    output: Optional[str] = typer.Option(None, "--output", "-o", help="JSON results file"),
+    workdir: Optional[str] = typer.Option(None, "--workdir", help="Directory for the temporary benchmark databases")
+):
+    """Run the benchmark suite and write comparable JSON results"""
+    size_list = [int(value.replace("_", "")) for value in sizes.split(",") if value.strip()]
+    profile = SyntheticProfile(spam_ratio=spam_ratio, link_density=link_density, author_count=authors)
+
+    all_results: List[Dict[str, Any]] = []
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+        for size in size_list:
+            typer.echo(f"Benchmarking {size:,} messages")
+            all_results.extend(_run_size(size, repeat, seed, memory, profile, Path(tmp)))
+
+    report = {
+        "schema_version": SCHEMA_VERSION,
+        "created_at": datetime.utcnow().isoformat() + "Z",
+        "git_commit": _git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "parameters": {
+            "sizes": size_list, "repeat": repeat, "seed": seed, "memory_tracked": memory,
+            "profile": profile.__dict__,
+        },
+        "results": all_results,
+    }
+
+    output_path = Path(output or f"../shared/benchmarks/bench_{datetime.utcnow():%Y%m%d_%H%M%S}.json")
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    typer.echo(f"Results saved to: {output_path}")
+
+@app.command()
+def compare(
+    baseline: str = typer.Argument(..., help="Baseline results JSON"),
+    candidate: str = typer.Argument(..., help="Candidate results JSON"),
+    threshold: float = typer.Option(0.10, "--threshold", help="Relative slowdown flagged as regression")
+):
+    """Compare two result files benchmark by benchmark"""
+    with open(baseline, 'r', encoding='utf-8') as f:
+        base = json.load(f)
+    with open(candidate, 'r', encoding='utf-8') as f:
+        cand = json.load(f)
+
+    base_index = {(r["benchmark"], r["size"]): r for r in base["results"]}
+    typer.echo(f"{'Benchmark':<34} {'Size':>9} {'Base (s)':>10} {'New (s)':>10} {'Ratio':>7} {'Mem Δ MB':>9}")
+    regressions = 0
+    for result in cand["results"]:
+        key = (result["benchmark"], result["size"])
+        if key not in base_index:
+            continue
+        old = base_index[key]
+        old_wall = old["wall_seconds"]["min"]
+        new_wall = result["wall_seconds"]["min"]
+        ratio = new_wall / old_wall if old_wall else float("inf")
+        mem_delta = "-"
+        if old.get("peak_memory_mb") is not None and result.get("peak_memory_mb") is not None:
+            mem_delta = f"{result['peak_memory_mb'] - old['peak_memory_mb']:+.1f}"
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        typer.echo(f"{key[0]:<34} {key[1]:>9,} {old_wall:>10.3f} {new_wall:>10.3f} {ratio:>7.2f} {mem_delta:>9}{flag}")
+
+    if regressions:
+        typer.echo(f"{regressions} benchmark(s) slower than {threshold:.0%} threshold")
+        raise typer.Exit(1)
+
+if __name__ == "__main__":
+    app()
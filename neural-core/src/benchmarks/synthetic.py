@@ -0,0 +1,123 @@
+"""
+Gerador sintético de mensagens de comunidade para benchmarks
+"""
+import math
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Any, Iterator, List
+
+COMMON_WORDS = [
+    "the", "a", "is", "to", "and", "of", "in", "for", "this", "that", "it", "on", "with", "we", "you",
+    "are", "be", "just", "guys", "anyone", "know", "when", "how", "what", "why", "today", "tomorrow",
+    "price", "chart", "wallet", "exchange", "node", "validator", "token", "team", "community", "bridge",
+    "fees", "network", "block", "tx", "swap", "pool", "liquidity", "rewards", "holders", "support",
+    "thanks", "question", "issue", "working", "great", "soon", "week", "month", "news", "looks", "good",
+]
+
+RELEVANT_PHRASES = [
+    "announce", "launch", "release", "partnership", "listing", "staking", "governance", "proposal",
+    "vote", "upgrade", "mainnet", "testnet", "roadmap", "milestone", "deploy", "smart contract",
+    "tokenomics", "whitepaper", "documentation", "api", "consensus", "bug", "fix", "feature",
+]
+
+SPAM_PHRASES = [
+    "moon", "lambo", "pump", "dump", "hodl", "diamond hands", "wen moon", "to the moon",
+    "buy the dip", "sell the news",
+]
+
+LINK_TEMPLATES = [
+    "https://medium.com/@project/post-{n}", "https://github.com/project/repo/pull/{n}",
+    "https://twitter.com/project/status/{n}", "www.project.io/blog/{n}",
+]
+
+@dataclass
+class SyntheticProfile:
+    """Parâmetros da distribuição das mensagens geradas"""
+    spam_ratio: float = 0.15          # fração de mensagens de spam
+    link_density: float = 0.08        # fração de mensagens com link
+    relevant_ratio: float = 0.20      # fração de mensagens com termos de alta relevância
+    admin_ratio: float = 0.01         # fração de mensagens de contas oficiais
+    author_count: int = 2000          # autores distintos
+    author_zipf_s: float = 1.1        # expoente Zipf da atividade dos autores
+    length_median_words: float = 12   # mediana log-normal do tamanho em palavras
+    length_sigma: float = 0.9
+    max_words: int = 600
+    messages_per_hour: float = 40.0   # densidade temporal
+    reply_ratio: float = 0.30         # fração de respostas a uma das 30 mensagens anteriores
+
+class SyntheticMessageGenerator:
+    """Gera linhas de `message` realistas e reproduzíveis (seed fixa)"""
+
+    def __init__(self, profile: SyntheticProfile = None, seed: int = 42):
+        self.profile = profile or SyntheticProfile()
+        self.random = random.Random(seed)
+        self.replies = random.Random(seed + 1)  # sequência própria: o conteúdo não muda com reply_ratio
+        self.authors = self._build_authors()
+        weights = [1.0 / math.pow(rank, self.profile.author_zipf_s) for rank in range(1, len(self.authors) + 1)]
+        total = 0.0
+        self._author_cum_weights = []
+        for weight in weights:
+            total += weight
+            self._author_cum_weights.append(total)
+        self._admins = [f"@project_admin{i}" for i in range(3)] + ["@project_official", "Core Team"]
+
+    def _build_authors(self) -> List[str]:
+        authors = []
+        for i in range(self.profile.author_count):
+            if i % 3 == 0:
+                authors.append(f"User {i}")
+            else:
+                authors.append(f"@member_{i}")
+        return authors
+
+    def _word_count(self) -> int:
+        mu = math.log(self.profile.length_median_words)
+        count = int(self.random.lognormvariate(mu, self.profile.length_sigma))
+        return max(1, min(self.profile.max_words, count))
+
+    def _content(self, n: int) -> str:
+        rng = self.random
+        words = rng.choices(COMMON_WORDS, k=self._word_count())
+        roll = rng.random()
+        if roll < self.profile.spam_ratio:
+            for _ in range(rng.randint(1, 3)):
+                words.insert(rng.randrange(len(words) + 1), rng.choice(SPAM_PHRASES))
+        elif roll < self.profile.spam_ratio + self.profile.relevant_ratio:
+            for _ in range(rng.randint(1, 4)):
+                words.insert(rng.randrange(len(words) + 1), rng.choice(RELEVANT_PHRASES))
+        if rng.random() < 0.15:
+            words.append(str(rng.randint(1, 100000)))
+        if rng.random() < self.profile.link_density:
+            words.append(rng.choice(LINK_TEMPLATES).format(n=n))
+        return " ".join(words)
+
+    def generate(self, project_id: int, count: int, end: datetime = None) -> Iterator[Dict[str, Any]]:
+        """Gera `count` mensagens em ordem cronológica terminando em `end`"""
+        end = end or datetime.utcnow()
+        span_hours = count / self.profile.messages_per_hour
+        start = end - timedelta(hours=span_hours)
+        step = (end - start) / max(count, 1)
+        threads: Dict[int, int] = {}
+        for n in range(count):
+            if self.random.random() < self.profile.admin_ratio:
+                author = self.random.choice(self._admins)
+            else:
+                author = self.random.choices(self.authors, cum_weights=self._author_cum_weights)[0]
+            content = self._content(n)
+            timestamp = start + step * n
+            reply_to = None
+            if n and self.replies.random() < self.profile.reply_ratio:
+                reply_to = max(1, n + 1 - self.replies.randint(1, 30))
+            threads[n + 1] = threads[reply_to] if reply_to else n + 1
+            yield {
+                "project_id": project_id,
+                "telegram_message_id": n + 1,
+                "content": content,
+                "author": author,
+                "timestamp": timestamp,
+                "message_type": "link" if "http" in content else "text",
+                "reply_to_message_id": reply_to,
+                "thread_id": threads[n + 1],
+                "collected_at": timestamp,
+            }
@@ -1,5 +1,11 @@
 from .project import Project
 from .message import Message
 from .summary import Summary
+from .rollup import ActivityRollup, AuthorRollup
+from .content import MessageContent, ContentDictionary
+from .author import Author
+from .relevance import MessageRelevance, RescoreRange
+from .usage import LlmUsage
 
-__all__ = ["Project", "Message", "Summary"]
+__all__ = ["Project", "Message", "Summary", "ActivityRollup", "AuthorRollup", "MessageContent", "ContentDictionary", "Author",
+           "MessageRelevance", "RescoreRange", "LlmUsage"]
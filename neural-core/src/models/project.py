@@ -14,6 +14,20 @@ class Project(SQLModel, table=True):
     telegram_group: str = Field(index=True)
     is_active: bool = Field(default=True)
     last_collected_message_id: Optional[int] = Field(default=None)
+    next_collection_at: Optional[datetime] = Field(default=None)
+    
+    # Agendamento adaptativo da coleta
+    last_collected_at: Optional[datetime] = Field(default=None)
+    message_velocity: Optional[float] = Field(default=None)  # Mensagens/hora (média móvel exponencial)
+    collection_interval: Optional[int] = Field(default=None)  # Override fixo em segundos (desativa adaptação)
+    min_collection_interval: Optional[int] = Field(default=None)  # Override do limite mínimo
+    max_collection_interval: Optional[int] = Field(default=None)  # Override do limite máximo
+    
+    # Arquivamento (mensagens antigas em Parquet fora do banco)
+    archive_after_days: Optional[int] = Field(default=None)  # Override do horizonte (0 = nunca arquivar)
+    archived_before: Optional[datetime] = Field(default=None)  # Mensagens anteriores estão no arquivo
+    digest_periods: Optional[str] = Field(default=None)  # Override dos digests pré-calculados, ex: "daily,weekly" ("" = nenhum)
+    rollups_complete_at: Optional[datetime] = Field(default=None)  # Quando os rollups passaram a cobrir todas as mensagens (None = rodar stats --rebuild)
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
     
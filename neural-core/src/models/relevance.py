@@ -0,0 +1,36 @@
+from sqlmodel import SQLModel, Field
+from sqlalchemy import Index, UniqueConstraint
+from typing import Optional
+from datetime import datetime
+
+class MessageRelevance(SQLModel, table=True):
+    """Score de relevância gravado pelo `rescore` (o mais recente de cada mensagem)"""
+    __table_args__ = (
+        Index("ux_messagerelevance_message", "message_id", unique=True),
+    )
+    
+    id: Optional[int] = Field(default=None, primary_key=True)
+    message_id: int = Field(foreign_key="message.id")
+    project_id: int = Field(foreign_key="project.id", index=True)
+    rules_version: str  # RelevanceAnalyzer.rules_version usado no score
+    score: float
+    category: str
+    confidence: float
+    keywords: str = Field(default="")  # separadas por vírgula
+    reasoning: str = Field(default="")
+    scored_at: datetime = Field(default_factory=datetime.utcnow)
+
+class RescoreRange(SQLModel, table=True):
+    """Faixa de ids de um rescore: faixas concluídas são puladas ao retomar"""
+    __table_args__ = (
+        UniqueConstraint("project_id", "rules_version", "first_id", name="uq_rescorerange_project_rules_first"),
+    )
+    
+    id: Optional[int] = Field(default=None, primary_key=True)
+    project_id: int = Field(foreign_key="project.id", index=True)
+    rules_version: str
+    first_id: int
+    last_id: int
+    scored: int = Field(default=0)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    completed_at: Optional[datetime] = Field(default=None)
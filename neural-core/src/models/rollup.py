@@ -0,0 +1,33 @@
+from sqlmodel import SQLModel, Field
+from sqlalchemy import Index, UniqueConstraint
+from typing import Optional
+from datetime import datetime
+
+class ActivityRollup(SQLModel, table=True):
+    """Agregado horário de atividade de um projeto (mantido na ingestão)"""
+    __table_args__ = (
+        UniqueConstraint("project_id", "bucket_start", name="uq_activityrollup_project_bucket"),
+    )
+    
+    id: Optional[int] = Field(default=None, primary_key=True)
+    project_id: int = Field(foreign_key="project.id", index=True)
+    bucket_start: datetime = Field(index=True)  # Início da hora (UTC)
+    message_count: int = Field(default=0)
+    distinct_authors: int = Field(default=0)
+    link_count: int = Field(default=0)
+    char_count: int = Field(default=0)
+    spam_count: int = Field(default=0)
+    high_relevance_count: int = Field(default=0)
+
+class AuthorRollup(SQLModel, table=True):
+    """Mensagens por autor e hora (autores distintos e top autores)"""
+    __table_args__ = (
+        UniqueConstraint("project_id", "bucket_start", "author", name="uq_authorrollup_project_bucket_author"),
+        Index("ix_authorrollup_project_bucket", "project_id", "bucket_start"),
+    )
+    
+    id: Optional[int] = Field(default=None, primary_key=True)
+    project_id: int = Field(foreign_key="project.id")
+    bucket_start: datetime
+    author: str
+    message_count: int = Field(default=0)
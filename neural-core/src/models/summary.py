@@ -22,6 +22,7 @@ class Summary(SQLModel, table=True):
     summary_metadata: Optional[str] = Field(default=None)  # JSON string com metadata
     citations: Optional[str] = Field(default=None)  # JSON string com citações
     high_relevance_count: int = Field(default=0)  # Contador de mensagens de alta relevância
+    digest_period: Optional[str] = Field(default=None, index=True)  # daily/weekly quando pré-calculado pelo digest worker
     
     # Relacionamento com Project
     project: Optional["Project"] = Relationship(back_populates="summaries")
@@ -0,0 +1,22 @@
+from sqlmodel import SQLModel, Field
+from typing import Optional
+from datetime import datetime
+
+class LlmUsage(SQLModel, table=True):
+    """Uma chamada ao LLM: tokens informados pelo modelo, latência e custo real"""
+    
+    id: Optional[int] = Field(default=None, primary_key=True)
+    project_id: int = Field(foreign_key="project.id", index=True)
+    summary_id: Optional[int] = Field(default=None, foreign_key="summary.id")
+    operation: str = Field(default="summary")  # summary ou digest
+    model: str = Field(index=True)
+    message_count: int = Field(default=0)
+    estimated_prompt_chars: int = Field(default=0)  # previsão do estimate_cost (a partir dos totais do período)
+    prompt_chars: int = Field(default=0)  # tamanho real do prompt enviado
+    prompt_tokens: int = Field(default=0)
+    completion_tokens: int = Field(default=0)
+    usage_reported: bool = Field(default=True)  # False: o modelo não informou o uso (tokens estimados)
+    estimated_cost: float = Field(default=0.0)
+    cost: float = Field(default=0.0)
+    latency_seconds: float = Field(default=0.0)
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
@@ -1,4 +1,11 @@
-from .database import DatabaseManager
-from .ai_processor import AIProcessor
-
 __all__ = ["DatabaseManager", "AIProcessor"]
+
+def __getattr__(name):
+    # Sob demanda: processos que só usam o banco (workers do rescore) não carregam o LangChain
+    if name == "DatabaseManager":
+        from .database import DatabaseManager
+        return DatabaseManager
+    if name == "AIProcessor":
+        from .ai_processor import AIProcessor
+        return AIProcessor
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,18 +1,26 @@
 import logging
 import os
-import json
-from typing import List, Optional, Dict, Any
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import Callable, List, Optional, Dict, Any, Tuple
 from datetime import datetime
 from dataclasses import dataclass
 
 from langchain_openai import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate
-from langchain.schema import HumanMessage, SystemMessage
 
 from models import Project, Message, Summary
 from services.database import DatabaseManager
 from services.relevance_analyzer import RelevanceAnalyzer
+from services.evidence_linker import EvidenceLinker
+from services.topic_clustering import Topic, TopicClusterer, allocate_token_budget
+from services.model_router import ModelRouter, SummaryPlan
+from services.reply_threads import Thread, assign_threads, build_threads
+from services.usage_ledger import BULK_OPERATION, UsageLedger, reported_usage
 from utils.config import Config
+from utils.json_codec import decode_json, encode_json
+from utils.profiling import StageProfiler
 
 logger = logging.getLogger(__name__)
 
@@ -23,30 +31,59 @@ class CostEstimate:
     message_count: int
     cost_per_message: float
     estimated_tokens: int
+    model: str = ""
+    prompt_chars: int = 0  # tamanho previsto do prompt
+    output_tokens: int = 0
+    calibration: str = "default"  # project, model ou default (sem histórico de uso)
+    calibration_samples: int = 0
+    plan: Optional[SummaryPlan] = None  # modelos e estágios escolhidos pelo ModelRouter
+
+@dataclass
+class CostCurvePoint:
+    """Custo de resumir os últimos `days` dias (uma janela da curva de custo)"""
+    days: int
+    message_count: int
+    total_cost: float
+    model: str = ""
+    adjusted: bool = False  # plano trocou de modelo, descartou notas ou cortou o contexto
+    fits: bool = True
 
 class AIProcessor:
-    def __init__(self):
+    def __init__(self, db: Optional[DatabaseManager] = None, llm: Optional[Any] = None):
         self.config = Config()
-        self.db = DatabaseManager()
+        self.db = db or DatabaseManager()
         self.relevance_analyzer = RelevanceAnalyzer()
-        self._setup_langchain()
+        self.evidence_linker = EvidenceLinker(self.config.CITATIONS_PER_STATEMENT)
+        self.topic_clusterer = TopicClusterer(self.config.TOPIC_MAX_CLUSTERS, self.config.TOPIC_MIN_MESSAGES)
+        self.usage_ledger = UsageLedger(self.db)
+        self.router = ModelRouter(self.config, self.usage_ledger)
+        self.profiler: Optional[StageProfiler] = None
+        self._llms: Dict[tuple, Any] = {}
+        self._setup_langchain(llm)
+        self.model = getattr(self.llm, "model_name", None) or self.config.DEFAULT_MODEL
     
-    def _setup_langchain(self):
-        """Configura o LangChain com OpenAI"""
+    def _stage(self, name: str):
+        """Mede um estágio do pipeline quando o profiling está ativo"""
+        return self.profiler.stage(name) if self.profiler else nullcontext()
+    
+    def _setup_langchain(self, llm: Optional[Any] = None):
+        """Configura o LangChain com OpenAI (ou com um LLM injetado, ex: benchmarks)"""
         try:
             # Set OpenAI API key
             os.environ["OPENAI_API_KEY"] = self.config.OPENAI_API_KEY
             
             # Initialize ChatOpenAI
-            self.llm = ChatOpenAI(
+            self._injected_llm = llm is not None
+            self.llm = llm or ChatOpenAI(
                 model=self.config.DEFAULT_MODEL,
                 temperature=0.1,
+                stream_usage=True,  # uso de tokens também no streaming (registro de uso)
                 verbose=self.config.LANGCHAIN_VERBOSE
             )
             
-            # Create prompt template
+            # Create prompt template (tuplas: objetos SystemMessage/HumanMessage não são formatados)
             self.prompt_template = ChatPromptTemplate.from_messages([
-                SystemMessage(content="""You are an expert community analyst who specializes in analyzing community discussions and extracting key insights. 
+                ("system", """You are an expert community analyst who specializes in analyzing community discussions and extracting key insights. 
                 
 Your task is to analyze community messages and create a comprehensive summary that highlights:
 1. Key announcements and updates
@@ -62,114 +99,211 @@ Format your response as a clear, structured markdown summary with the following
 ## Summary
 
 Be concise but informative, focusing on actionable insights that would be valuable for community members."""),
-                HumanMessage(content="""Please analyze the following community messages from {project_name} and create a comprehensive summary:
+                ("human", """Please analyze the following community messages from {project_name} and create a comprehensive summary.
+The messages are grouped by topic, largest topics first; each topic shows its most representative messages
+and, when not all of them fit, notes on the remaining ones.
 
 {messages_text}
 
 Focus on extracting the most important information and presenting it in a clear, structured format.""")
             ])
             
+            # Estágio em lote (modelo barato): notas sobre as mensagens que ficaram fora da amostra
+            self.notes_template = ChatPromptTemplate.from_messages([
+                ("system", """You take notes on one topic of a community chat for an analyst who will write the final report.
+Write at most 5 short bullet points with the concrete facts in these messages: announcements, dates, numbers,
+decisions, technical changes and recurring concerns. Skip greetings, spam and price chatter. No introduction."""),
+                ("human", """Project: {project_name}
+Topic: {topic_label}
+
+{messages_text}""")
+            ])
+            
             logger.info("✅ LangChain configured successfully")
             
         except Exception as e:
             logger.error(f"❌ Error setting up LangChain: {e}")
             raise
     
-    def estimate_cost(self, project: Project, start_date: datetime, end_date: datetime) -> CostEstimate:
-        """Estima o custo de processamento para um projeto e período"""
+    def estimate_cost(self, project: Project, start_date: datetime, end_date: datetime,
+                      max_cost: Optional[float] = None, messages: Optional[List[Message]] = None) -> CostEstimate:
+        """Estima o custo de processamento para um projeto e período
+
+        `max_cost` (padrão MAX_COST_PER_SUMMARY) é o orçamento usado para escolher o plano.
+        Com `messages` (já buscadas), os totais vêm delas e não dos rollups.
+        """
         try:
-            # Busca mensagens no período
-            messages = self.db.get_messages_by_project(
-                project.id, start_date, end_date
-            )
+            # Totais do período: rollups horários quando completos, senão as próprias mensagens
+            with self._stage("db_fetch"):
+                totals = None if messages is not None else self.db.get_activity_totals(project.id, start_date, end_date)
+                if totals is None:
+                    if messages is None:
+                        messages = self.db.get_messages_by_project(project.id, start_date, end_date)
+                    totals = (len(messages), sum(len(msg.content) for msg in messages))
+            message_count, total_chars = totals
             
-            if not messages:
+            if not message_count:
                 return CostEstimate(
                     total_cost=0.0,
                     message_count=0,
                     cost_per_message=0.0,
-                    estimated_tokens=0
+                    estimated_tokens=0,
+                    model=self.model
                 )
             
-            # Estima tokens (aproximação simples)
-            total_chars = sum(len(msg.content) for msg in messages)
-            estimated_tokens = total_chars // 4  # Aproximação: 4 chars = 1 token
-            
-            # Adiciona tokens de saída estimados
-            output_tokens = 500  # Resumo estimado
-            total_tokens = estimated_tokens + output_tokens
-            
-            # Calcula custo (GPT-3.5 Turbo pricing)
-            input_cost = (estimated_tokens / 1000) * 0.0015  # $0.0015 per 1K tokens
-            output_cost = (output_tokens / 1000) * 0.002     # $0.002 per 1K tokens
-            total_cost = input_cost + output_cost
-            
-            cost_per_message = total_cost / len(messages) if messages else 0.0
+            # Plano de modelos dentro do orçamento; tokens pela calibração do histórico de uso
+            with self._stage("model_routing"):
+                plan = self.router.plan(project.id, message_count, total_chars, self._template_chars(project), max_cost)
+                calibration = self.usage_ledger.calibration(project.id, plan.synthesis.model)
             
             return CostEstimate(
-                total_cost=total_cost,
-                message_count=len(messages),
-                cost_per_message=cost_per_message,
-                estimated_tokens=total_tokens
+                total_cost=plan.total_cost,
+                message_count=message_count,
+                cost_per_message=plan.total_cost / message_count,
+                estimated_tokens=sum(step.prompt_tokens + step.output_tokens for step in plan.steps),
+                model=plan.synthesis.model,
+                prompt_chars=plan.synthesis.prompt_chars,
+                output_tokens=plan.synthesis.output_tokens,
+                calibration=calibration.scope,
+                calibration_samples=calibration.samples,
+                plan=plan
             )
             
         except Exception as e:
             logger.error(f"❌ Error estimating cost: {e}")
             raise
     
-    def generate_summary(self, project: Project, start_date: datetime, end_date: datetime) -> Summary:
-        """Gera um resumo para um projeto e período"""
+    def _template_chars(self, project: Project) -> int:
+        template = self.prompt_template.format_messages(project_name=project.name, messages_text="")
+        return sum(len(message.content) for message in template)
+    
+    def estimate_curve(self, projects: List[Project], days: int, max_cost: Optional[float] = None,
+                       now: Optional[datetime] = None) -> Dict[int, List[CostCurvePoint]]:
+        """Custo de cada janela de 1 a `days` dias para cada projeto: {project_id: [ponto por janela]}
+
+        Os totais diários de todos os projetos vêm de uma única passada agrupada
+        (`get_daily_totals`); cada janela soma os dias e passa pelo ModelRouter.
+        """
+        now = now or datetime.utcnow()
+        with self._stage("db_fetch"):
+            daily = self.db.get_daily_totals(projects, days, now)
+        curves = {}
+        with self._stage("model_routing"):
+            for project in projects:
+                template_chars = self._template_chars(project)
+                calibrations = {}
+                points, messages, chars = [], 0, 0
+                for day, (count, day_chars) in enumerate(daily[project.id], 1):
+                    messages += count
+                    chars += day_chars
+                    if not messages:
+                        points.append(CostCurvePoint(day, 0, 0.0))
+                        continue
+                    plan = self.router.plan(project.id, messages, chars, template_chars, max_cost, calibrations)
+                    points.append(CostCurvePoint(day, messages, plan.total_cost, plan.synthesis.model,
+                                                 bool(plan.notes), plan.fits))
+                curves[project.id] = points
+        return curves
+    
+    def generate_summary(self, project: Project, start_date: datetime, end_date: datetime,
+                         on_token: Optional[Callable[[str], None]] = None,
+                         digest_period: Optional[str] = None,
+                         on_plan: Optional[Callable[[CostEstimate], None]] = None,
+                         max_cost: Optional[float] = None) -> Summary:
+        """Gera um resumo para um projeto e período
+
+        Com `on_token`, o texto é transmitido em pedaços à medida que o LLM o gera;
+        o Summary só é gravado quando a geração termina. `on_plan` recebe a estimativa
+        com o plano escolhido antes da primeira chamada ao LLM.
+        """
         try:
             # Busca mensagens no período
-            messages = self.db.get_messages_by_project(
-                project.id, start_date, end_date
-            )
+            with self._stage("db_fetch"):
+                messages = self.db.get_messages_by_project(
+                    project.id, start_date, end_date
+                )
             
             if not messages:
                 raise ValueError(f"No messages found for project {project.name} in the specified period")
             
-            # Estima custo antes do processamento
-            cost_estimate = self.estimate_cost(project, start_date, end_date)
+            # Estima custo e escolhe os modelos antes do processamento
+            with self._stage("estimate_cost"):
+                # Pelas mensagens buscadas: os rollups podem ainda não incluir as últimas gravadas
+                cost_estimate = self.estimate_cost(project, start_date, end_date, max_cost, messages)
+            plan = cost_estimate.plan
             
-            # Verifica limite de custo
-            if cost_estimate.total_cost > self.config.MAX_COST_PER_SUMMARY:
-                raise ValueError(f"Estimated cost ${cost_estimate.total_cost:.2f} exceeds limit ${self.config.MAX_COST_PER_SUMMARY}")
+            # Só falha quando nem o menor contexto com o modelo mais barato cabe no orçamento
+            if not plan.fits:
+                raise ValueError(f"Estimated cost ${cost_estimate.total_cost:.2f} exceeds limit ${plan.max_cost:.2f} "
+                                 f"({'; '.join(plan.notes)})")
+            for note in plan.notes:
+                logger.info(f"Model routing: {note}")
+            if on_plan:
+                on_plan(cost_estimate)
             
-            # Prepara dados para processamento
-            messages_text = self._prepare_messages_for_ai(messages)
+            # Agrupa as mensagens em tópicos
+            with self._stage("topic_clustering"):
+                topics = self._cluster(messages)
+                self._allocate(topics, plan.prompt_token_budget)
             
-            # Cria o prompt
-            prompt = self.prompt_template.format_messages(
-                project_name=project.name,
-                messages_text=messages_text
-            )
+            # Notas do modelo barato sobre as mensagens fora da amostra
+            notes, usages = {}, []
+            if plan.bulk:
+                with self._stage("topic_notes"):
+                    notes, usages = self._topic_notes(project, topics, plan.bulk.model, plan.bulk.cost / plan.bulk.calls)
+            
+            # Prepara dados para processamento
+            with self._stage("prepare_messages"):
+                messages_text = self._prepare_messages_for_ai(messages, topics, plan.prompt_token_budget, notes)
+                
+                # Cria o prompt
+                prompt = self.prompt_template.format_messages(
+                    project_name=project.name,
+                    messages_text=messages_text
+                )
             
             # Executa o processamento
-            result = self.llm.invoke(prompt)
-            summary_content = result.content
+            with self._stage("llm_call"):
+                started = time.perf_counter()
+                summary_content, usage = self._call_llm(prompt, on_token, self._llm_for(plan.synthesis.model))
+                latency = time.perf_counter() - started
             
-            # Calcula custo real (aproximação)
-            actual_cost = cost_estimate.total_cost * 1.1  # 10% de margem
+            # Custo real: tokens informados pelo modelo, gravados no registro de uso
+            with self._stage("usage_ledger"):
+                usages.append(self.usage_ledger.record(
+                    project.id, plan.synthesis.model, "digest" if digest_period else "summary",
+                    sum(len(message.content) for message in prompt), summary_content, usage, latency,
+                    len(messages), plan.synthesis.prompt_chars, plan.synthesis.cost
+                ))
+            actual_cost = sum(llm_usage.cost for llm_usage in usages)
             
             # Gera metadata e citações (sempre)
             logger.info("Generating metadata and citations...")
             metadata_json, citations_json, high_relevance_count = self._generate_metadata_and_citations(
-                messages, summary_content, project.name
+                messages, summary_content, project.name, topics
             )
             
             # Cria o resumo no banco
-            summary = self.db.create_summary(
-                project_id=project.id,
-                content=summary_content,
-                date_range_start=start_date,
-                date_range_end=end_date,
-                cost_estimate=cost_estimate.total_cost,
-                actual_cost=actual_cost,
-                message_count=len(messages),
-                summary_metadata=metadata_json,
-                citations=citations_json,
-                high_relevance_count=high_relevance_count
-            )
+            with self._stage("db_write"):
+                summary = self.db.create_summary(
+                    project_id=project.id,
+                    content=summary_content,
+                    date_range_start=start_date,
+                    date_range_end=end_date,
+                    cost_estimate=cost_estimate.total_cost,
+                    actual_cost=actual_cost,
+                    message_count=len(messages),
+                    summary_metadata=metadata_json,
+                    citations=citations_json,
+                    high_relevance_count=high_relevance_count,
+                    digest_period=digest_period
+                )
+                for llm_usage in usages:
+                    if llm_usage.id:
+                        self.db.link_llm_usage(llm_usage.id, summary.id)
+            
+            if self.profiler and metadata_json:
+                summary = self._store_profile(summary)
             
             logger.info(f"✅ Summary generated for {project.name} with {len(messages)} messages")
             return summary
@@ -178,24 +312,132 @@ Focus on extracting the most important information and presenting it in a clear,
             logger.error(f"❌ Error generating summary: {e}")
             raise
     
-    def _generate_metadata_and_citations(self, messages: List[Message], summary_content: str, project_name: str) -> tuple:
+    def _llm_for(self, model: str, max_tokens: Optional[int] = None) -> Any:
+        """LLM do modelo escolhido pelo plano (um LLM injetado atende todos os modelos)"""
+        if self._injected_llm or (model == self.model and max_tokens is None):
+            return self.llm
+        key = (model, max_tokens)
+        if key not in self._llms:
+            self._llms[key] = ChatOpenAI(
+                model=model,
+                temperature=0.1,
+                max_tokens=max_tokens,
+                stream_usage=True,
+                verbose=self.config.LANGCHAIN_VERBOSE
+            )
+        return self._llms[key]
+    
+    def _topic_notes(self, project: Project, topics: List[Topic], model: str,
+                     estimated_cost: float = 0.0) -> Tuple[Dict[int, str], List[Any]]:
+        """Notas por tópico (índice -> texto) sobre as mensagens fora da amostra, em lotes de BULK_CHUNK_TOKENS"""
+        chunks = []
+        for index, topic in enumerate(topics):
+            selected = {id(msg) for msg in topic.selected}
+            chunk, used = [], 0
+            for msg in topic.messages:
+                if id(msg) in selected:
+                    continue
+                line = self._format_message(msg)
+                tokens = len(line) // 4 + 1
+                if chunk and used + tokens > self.config.BULK_CHUNK_TOKENS:
+                    chunks.append((index, topic, chunk))
+                    chunk, used = [], 0
+                chunk.append(line)
+                used += tokens
+            if chunk:
+                chunks.append((index, topic, chunk))
+        if not chunks:
+            return {}, []
+        
+        llm = self._llm_for(model, self.config.BULK_NOTE_TOKENS)
+        
+        def take_notes(item):
+            index, topic, lines = item
+            prompt = self.notes_template.format_messages(
+                project_name=project.name, topic_label=topic.label, messages_text="\n\n".join(lines)
+            )
+            started = time.perf_counter()
+            content, usage = self._call_llm(prompt, llm=llm)
+            latency = time.perf_counter() - started
+            llm_usage = self.usage_ledger.record(
+                project.id, model, BULK_OPERATION, sum(len(message.content) for message in prompt),
+                content, usage, latency, len(lines), estimated_cost=estimated_cost
+            )
+            return index, content.strip(), llm_usage
+        
+        notes: Dict[int, List[str]] = {}
+        usages = []
+        with ThreadPoolExecutor(max_workers=max(1, self.config.BULK_CONCURRENCY)) as pool:
+            for index, content, llm_usage in pool.map(take_notes, chunks):
+                notes.setdefault(index, []).append(content)
+                usages.append(llm_usage)
+        logger.info(f"Topic notes: {len(chunks)} calls to {model} for {len(notes)} topics")
+        return {index: "\n".join(parts) for index, parts in notes.items()}, usages
+    
+    def _call_llm(self, prompt: List[Any], on_token: Optional[Callable[[str], None]] = None,
+                  llm: Optional[Any] = None) -> Tuple[str, Optional[Tuple[int, int]]]:
+        """(conteúdo completo, tokens de entrada/saída informados); em modo streaming repassa cada pedaço a `on_token`"""
+        llm = llm or self.llm
+        if on_token is None:
+            response = llm.invoke(prompt)
+            return response.content, reported_usage(response)
+        
+        parts = []
+        usage = None
+        started = time.perf_counter()
+        for chunk in llm.stream(prompt):
+            # O uso vem num pedaço próprio (em geral o último, sem texto)
+            chunk_usage = reported_usage(chunk)
+            if chunk_usage:
+                usage = tuple(a + b for a, b in zip(usage, chunk_usage)) if usage else chunk_usage
+            text = chunk.content
+            if not text:
+                continue
+            if not parts:
+                logger.info(f"First token after {time.perf_counter() - started:.2f}s")
+            parts.append(text)
+            on_token(text)
+        return "".join(parts), usage
+    
+    def _store_profile(self, summary: Summary) -> Summary:
+        """Anexa os tempos por estágio ao summary_metadata para análise de tendência"""
+        try:
+            metadata = decode_json(summary.summary_metadata)
+            metadata["profiling"] = self.profiler.as_dict()
+            updated = self.db.update_summary(summary.id, summary_metadata=self._encode_json(metadata))
+            return updated or summary
+        except Exception as e:
+            logger.error(f"Error storing profiling data: {e}")
+            return summary
+    
+    def _encode_json(self, value: Any) -> str:
+        """JSON compacto (comprimido acima do limite) para as colunas de metadata/citações"""
+        return encode_json(value, self.config.SUMMARY_JSON_COMPRESSION, self.config.SUMMARY_JSON_COMPRESS_MIN_BYTES)
+    
+    def _generate_metadata_and_citations(self, messages: List[Message], summary_content: str, project_name: str,
+                                         topics: Optional[List[Topic]] = None) -> tuple:
         """Gera metadata e citações para o resumo"""
         try:
             # Analisa relevância das mensagens
-            relevance_scores = self.relevance_analyzer.analyze_messages_batch(messages)
-            
-            # Gera metadata de relevância
-            metadata = self.relevance_analyzer.generate_relevance_metadata(messages, relevance_scores)
+            with self._stage("relevance_analysis"):
+                relevance_scores = self.relevance_analyzer.analyze_messages_batch(messages)
+                
+                # Gera metadata de relevância
+                metadata = self.relevance_analyzer.generate_relevance_metadata(messages, relevance_scores)
+                if topics:
+                    metadata["topics"] = [topic.as_metadata() for topic in topics]
             
             # Gera citações baseadas no resumo
-            citations = self._extract_citations_from_summary(summary_content, messages, relevance_scores)
+            with self._stage("citations"):
+                citations = self._extract_citations_from_summary(summary_content, messages, relevance_scores)
             
             # Conta mensagens de alta relevância
             high_relevance_count = len([s for s in relevance_scores if s.score >= 80])
             
             # Converte para JSON
-            metadata_json = json.dumps(metadata, indent=2)
-            citations_json = json.dumps(citations, indent=2)
+            with self._stage("json_serialization"):
+                metadata_json = self._encode_json(metadata)
+                citations_json = self._encode_json(citations)
             
             logger.info(f"Generated metadata for {len(messages)} messages with {high_relevance_count} high-relevance")
             
@@ -206,50 +448,89 @@ Focus on extracting the most important information and presenting it in a clear,
             return None, None, 0
 
     def _extract_citations_from_summary(self, summary_content: str, messages: List[Message], relevance_scores: List) -> List[Dict[str, Any]]:
-        """Extrai citações do resumo baseado nas mensagens de alta relevância"""
-        citations = []
-        
-        # Mapeia scores por message_id
-        score_map = {score.message_id: score for score in relevance_scores}
-        
-        # Pega mensagens de alta relevância
-        high_relevance_messages = []
-        for message in messages:
-            if message.id in score_map and score_map[message.id].score >= 80:
-                high_relevance_messages.append((message, score_map[message.id]))
-        
-        # Ordena por relevância
-        high_relevance_messages.sort(key=lambda x: x[1].score, reverse=True)
-        
-        # Cria citações para as top mensagens
-        for message, score in high_relevance_messages[:20]:  # Top 20 mensagens
-            citation = {
-                "message_id": message.id,
-                "telegram_message_id": message.telegram_message_id,
-                "author": message.author,
-                "timestamp": message.timestamp.isoformat(),
-                "content_preview": message.content[:200] + "..." if len(message.content) > 200 else message.content,
-                "relevance_score": score.score,
-                "category": score.category,
-                "confidence": score.confidence,
-                "keywords": score.keywords,
-                "reasoning": score.reasoning
-            }
-            citations.append(citation)
-        
-        return citations
+        """Liga cada afirmação do resumo às mensagens que a sustentam (BM25)"""
+        return self.evidence_linker.link(summary_content, messages, relevance_scores)
 
-    def _prepare_messages_for_ai(self, messages: List[Message]) -> str:
-        """Prepara mensagens para processamento de IA"""
-        formatted_messages = []
+    def _format_message(self, msg: Message, reply_to: Optional[str] = None) -> str:
+        author = msg.author or "Unknown"
+        if msg.forward_from:
+            author += f" (forwarded from {msg.forward_from})"
+        if reply_to:
+            author += f" → {reply_to}"
+        timestamp = msg.timestamp.strftime("%Y-%m-%d %H:%M")
+        content = msg.content[:500]  # Limita tamanho para evitar tokens excessivos
+        return f"[{timestamp}] {author}: {content}"
+    
+    def _format_thread(self, thread: Thread) -> str:
+        """Thread como bloco: a primeira mensagem, as respostas indentadas e as omitidas resumidas"""
+        if thread.message_count == 1:
+            return self._format_message(thread.messages[0])
+        authors = {msg.telegram_message_id: msg.author or "Unknown" for msg in thread.messages}
+        lines = []
+        for position, msg in enumerate(thread.shown):
+            if position == thread.head and thread.omitted:
+                names = sorted({msg.author or "Unknown" for msg in thread.omitted})
+                shown_names = ", ".join(names[:5]) + (f" and {len(names) - 5} others" if len(names) > 5 else "")
+                count = len(thread.omitted)
+                lines.append(f"  … {count} more {'reply' if count == 1 else 'replies'} ({shown_names})")
+            if position == 0:
+                lines.append(self._format_message(msg))
+            else:
+                lines.append(f"  ↳ {self._format_message(msg, authors.get(msg.reply_to_message_id))}")
+        return "\n".join(lines)
+    
+    def _cluster(self, messages: List[Message]) -> List[Topic]:
+        """Tópicos do período; com REPLY_THREADS, cada thread fica inteira num tópico
+
+        Threads que não levam a nada (THREAD_MIN_CHARS) ficam de fora e as longas são
+        encurtadas para THREAD_MAX_MESSAGES no prompt.
+        """
+        if not self.config.REPLY_THREADS:
+            return self.topic_clusterer.cluster(messages)
+        threads = build_threads(messages, self.config.THREAD_MAX_MESSAGES)
+        if len(threads) == len(messages):
+            return self.topic_clusterer.cluster(messages)  # nenhuma resposta no período
+        kept = [thread for thread in threads if not thread.goes_nowhere(self.config.THREAD_MIN_CHARS)] or threads
+        if len(kept) < len(threads):
+            dropped = sum(thread.message_count for thread in threads) - sum(thread.message_count for thread in kept)
+            logger.info(f"Dropped {len(threads) - len(kept)} reply threads that go nowhere ({dropped} messages)")
+        topics = self.topic_clusterer.cluster([msg for thread in kept for msg in thread.messages])
+        return assign_threads(topics, kept)
+    
+    def _allocate(self, topics: List[Topic], token_budget: Optional[int] = None) -> List[Topic]:
+        budget = self.config.PROMPT_TOKEN_BUDGET if token_budget is None else token_budget
+        return allocate_token_budget(topics, budget, lambda msg: len(self._format_message(msg)) // 4 + 1)
+    
+    def _prepare_messages_for_ai(self, messages: List[Message], topics: Optional[List[Topic]] = None,
+                                 token_budget: Optional[int] = None, notes: Optional[Dict[int, str]] = None) -> str:
+        """Prepara mensagens para processamento de IA: blocos por tópico dentro do orçamento de tokens
+
+        `notes` (índice do tópico -> texto) entram antes da amostra do tópico.
+        """
+        if topics is None:
+            topics = self._cluster(messages)
+        self._allocate(topics, token_budget)
+        notes = notes or {}
         
-        for msg in messages:
-            author = msg.author or "Unknown"
-            timestamp = msg.timestamp.strftime("%Y-%m-%d %H:%M")
-            content = msg.content[:500]  # Limita tamanho para evitar tokens excessivos
-            
-            formatted_messages.append(
-                f"[{timestamp}] {author}: {content}"
-            )
+        sections = []
+        for number, topic in enumerate(topics, 1):
+            selected = sorted(topic.selected, key=lambda msg: msg.timestamp)
+            if topic.threads:
+                # Threads como unidades, em ordem da primeira mensagem mostrada
+                included = {id(msg) for msg in selected}
+                threads = sorted((thread for thread in topic.threads if id(thread.shown[0]) in included),
+                                 key=lambda thread: thread.shown[0].timestamp)
+                lines = "\n\n".join(self._format_thread(thread) for thread in threads)
+            else:
+                lines = "\n\n".join(self._format_message(msg) for msg in selected)
+            if number - 1 in notes:
+                omitted = topic.message_count - len(selected)
+                lines = f"Notes on the {omitted} messages not shown:\n{notes[number - 1]}\n\n{lines}"
+            if len(topics) == 1:
+                sections.append(lines)
+                continue
+            header = f"### Topic {number}: {topic.label} ({topic.message_count} messages"
+            header += f", {len(selected)} shown)" if len(selected) < topic.message_count else ")"
+            sections.append(f"{header}\n\n{lines}")
         
-        return "\n\n".join(formatted_messages)
\ No newline at end of file
+        return "\n\n".join(sections)
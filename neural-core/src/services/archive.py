@@ -0,0 +1,284 @@
+import logging
+import os
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from sqlalchemy import Boolean, DateTime, Float, Integer, delete, func, select, text
+
+from models import Message, MessageRelevance, Project
+from utils.config import Config
+
+logger = logging.getLogger(__name__)
+
+DELETE_CHUNK = 5000  # ids por DELETE ... IN (limite de variáveis do SQLite)
+
+def _arrow_type(column) -> pa.DataType:
+    """Tipo Arrow equivalente a uma coluna do modelo"""
+    if isinstance(column.type, Boolean):
+        return pa.bool_()
+    if isinstance(column.type, Integer):
+        return pa.int64()
+    if isinstance(column.type, Float):
+        return pa.float64()
+    if isinstance(column.type, DateTime):
+        return pa.timestamp("us")
+    return pa.string()
+
+def arrow_schema(columns) -> pa.Schema:
+    """Schema Arrow para colunas de uma tabela SQLAlchemy"""
+    return pa.schema([(column.name, _arrow_type(column)) for column in columns])
+
+def _month_start(value: datetime) -> datetime:
+    return datetime(value.year, value.month, 1)
+
+def _next_month(value: datetime) -> datetime:
+    return datetime(value.year + (value.month == 12), value.month % 12 + 1, 1)
+
+@dataclass
+class ArchiveResult:
+    """Resultado do arquivamento de um projeto"""
+    project_name: str
+    cutoff: Optional[datetime]
+    messages_archived: int = 0
+    partitions: List[str] = field(default_factory=list)
+
+class MessageArchive:
+    """Arquivos Parquet de mensagens antigas, particionados por projeto e mês
+
+    Layout: ARCHIVE_DIR/project_id=<id>/month=<YYYY-MM>/messages.parquet
+    """
+
+    def __init__(self, archive_dir: Optional[str] = None, compression: Optional[str] = None):
+        self.config = Config()
+        self.archive_dir = Path(archive_dir or self.config.ARCHIVE_DIR)
+        self.compression = compression or self.config.ARCHIVE_COMPRESSION
+        self.columns = list(Message.__table__.columns)
+        self.schema = arrow_schema(self.columns)
+
+    def partition_path(self, project_id: int, month: datetime) -> Path:
+        return self.archive_dir / f"project_id={project_id}" / f"month={month:%Y-%m}" / "messages.parquet"
+
+    def partitions(self, project_id: int, start: Optional[datetime] = None,
+                   end: Optional[datetime] = None) -> List[Path]:
+        """Partições existentes do projeto que podem conter mensagens em [start, end]"""
+        project_dir = self.archive_dir / f"project_id={project_id}"
+        if not project_dir.exists():
+            return []
+        paths = []
+        for month_dir in sorted(project_dir.glob("month=*")):
+            month = datetime.strptime(month_dir.name.split("=", 1)[1], "%Y-%m")
+            if start and _next_month(month) <= start:
+                continue
+            if end and month > end:
+                continue
+            path = month_dir / "messages.parquet"
+            if path.exists():
+                paths.append(path)
+        return paths
+
+    def write_partition(self, project_id: int, month: datetime, batches: Iterator[List[Dict[str, Any]]]) -> int:
+        """Grava (ou mescla com) a partição do mês; escrita atômica via arquivo temporário"""
+        path = self.partition_path(project_id, month)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".parquet.tmp")
+
+        existing_ids = set()
+        written = 0
+        with pq.ParquetWriter(tmp_path, self.schema, compression=self.compression) as writer:
+            if path.exists():
+                existing = self._read_file(path)
+                existing_ids = set(existing.column("telegram_message_id").to_pylist())
+                writer.write_table(existing)
+            for rows in batches:
+                # Reexecuções após falha não duplicam mensagens já arquivadas
+                rows = [row for row in rows if row["telegram_message_id"] not in existing_ids]
+                if rows:
+                    writer.write_table(pa.Table.from_pylist(rows, schema=self.schema))
+                    written += len(rows)
+        if not written and not existing_ids:
+            tmp_path.unlink()  # Mês sem mensagens: nenhuma partição vazia
+            return 0
+        os.replace(tmp_path, path)
+        return written
+
+    def _read_file(self, path: Path, filters=None) -> pa.Table:
+        table = pq.read_table(path, filters=filters)
+        # Arquivos antigos podem não ter colunas adicionadas depois ao modelo
+        for name in self.schema.names:
+            if name not in table.column_names:
+                table = table.append_column(name, pa.nulls(table.num_rows, self.schema.field(name).type))
+        return table.select(self.schema.names).cast(self.schema)
+
+    def _filters(self, start: Optional[datetime], end: Optional[datetime]):
+        filters = []
+        if start:
+            filters.append(("timestamp", ">=", start))
+        if end:
+            filters.append(("timestamp", "<=", end))
+        return filters or None
+
+    def read_messages(self, project_id: int, start: Optional[datetime] = None,
+                      end: Optional[datetime] = None) -> List[Message]:
+        """Mensagens arquivadas do projeto no período (objetos Message desanexados)"""
+        messages = []
+        filters = self._filters(start, end)
+        for path in self.partitions(project_id, start, end):
+            for row in self._read_file(path, filters).to_pylist():
+                messages.append(Message(**row))
+        return messages
+
+    def iter_batches(self, project_id: int, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                     columns: Optional[List[str]] = None, batch_size: int = 10000) -> Iterator[pa.Table]:
+        """Lê as partições em lotes (memória constante), em ordem cronológica de mês"""
+        for path in self.partitions(project_id, start, end):
+            parquet_file = pq.ParquetFile(path)
+            available = set(parquet_file.schema_arrow.names)
+            for batch in parquet_file.iter_batches(batch_size=batch_size):
+                table = pa.Table.from_batches([batch])
+                if start:
+                    table = table.filter(pc.greater_equal(table["timestamp"], pa.scalar(start, pa.timestamp("us"))))
+                if end:
+                    table = table.filter(pc.less_equal(table["timestamp"], pa.scalar(end, pa.timestamp("us"))))
+                if not table.num_rows:
+                    continue
+                for name in self.schema.names:
+                    if name not in available:
+                        table = table.append_column(name, pa.nulls(table.num_rows, self.schema.field(name).type))
+                table = table.select(self.schema.names).cast(self.schema)
+                yield table.select(columns) if columns else table
+
+    def count_messages(self, project_id: int, start: Optional[datetime] = None,
+                       end: Optional[datetime] = None) -> int:
+        filters = self._filters(start, end)
+        total = 0
+        for path in self.partitions(project_id, start, end):
+            if filters:
+                total += pq.read_table(path, columns=["timestamp"], filters=filters).num_rows
+            else:
+                total += pq.ParquetFile(path).metadata.num_rows
+        return total
+
+    def totals(self, project_id: int, start: datetime, end: datetime, end_inclusive: bool = True) -> Tuple[int, int]:
+        """(mensagens, caracteres) arquivados em [start, end] (ou [start, end) sem `end_inclusive`)"""
+        filters = [("timestamp", ">=", start), ("timestamp", "<=" if end_inclusive else "<", end)]
+        messages, chars = 0, 0
+        for path in self.partitions(project_id, start, end):
+            table = pq.read_table(path, columns=["content"], filters=filters)
+            messages += table.num_rows
+            chars += pc.sum(pc.utf8_length(table["content"])).as_py() or 0
+        return messages, chars
+
+class MessageArchiver:
+    """Move mensagens mais antigas que o horizonte do projeto para o arquivo"""
+
+    def __init__(self, db, archive: Optional[MessageArchive] = None):
+        self.db = db
+        self.config = db.config
+        self.archive = archive or db.archive
+
+    def horizon_days(self, project: Project) -> int:
+        if project.archive_after_days is not None:
+            return project.archive_after_days
+        return self.config.ARCHIVE_AFTER_DAYS
+
+    def cutoff(self, project: Project, days: Optional[int] = None,
+               now: Optional[datetime] = None) -> Optional[datetime]:
+        """Mensagens com timestamp anterior ao cutoff vão para o arquivo (None = não arquivar)"""
+        days = self.horizon_days(project) if days is None else days
+        if not days or days <= 0:
+            return None
+        return (now or datetime.utcnow()) - timedelta(days=days)
+
+    def pending_count(self, project: Project, cutoff: datetime) -> int:
+        table = Message.__table__
+        with self.db.engine.connect() as connection:
+            return connection.execute(
+                select(func.count()).select_from(table)
+                .where(table.c.project_id == project.id, table.c.timestamp < cutoff)
+            ).scalar() or 0
+
+    def _oldest_timestamp(self, project_id: int, cutoff: datetime,
+                          after: Optional[datetime] = None) -> Optional[datetime]:
+        table = Message.__table__
+        statement = select(table.c.timestamp).where(table.c.project_id == project_id, table.c.timestamp < cutoff)
+        if after:
+            statement = statement.where(table.c.timestamp >= after)
+        with self.db.engine.connect() as connection:
+            return connection.execute(statement.order_by(table.c.timestamp).limit(1)).scalar()
+
+    def _month_batches(self, project_id: int, lower: datetime, upper: datetime,
+                       read_ids: List[int]) -> Iterator[List[Dict[str, Any]]]:
+        """Lotes de mensagens do mês; os ids lidos vão para `read_ids` (só eles são apagados depois)"""
+        table = Message.__table__
+        statement = self.db.content_store.with_content(select(table)).where(
+            table.c.project_id == project_id, table.c.timestamp >= lower, table.c.timestamp < upper
+        ).order_by(table.c.timestamp)
+        with self.db.engine.connect() as connection:
+            result = connection.execution_options(stream_results=True).execute(statement)
+            while True:
+                rows = result.mappings().fetchmany(self.config.ARCHIVE_BATCH_SIZE)
+                if not rows:
+                    return
+                read_ids.extend(row["id"] for row in rows)
+                # O Parquet guarda o texto completo (a tabela de conteúdo fica só no banco)
+                yield self.db.message_rows(rows)
+
+    def archive_project(self, project: Project, days: Optional[int] = None,
+                        now: Optional[datetime] = None) -> ArchiveResult:
+        """Arquiva mês a mês: grava a partição, depois apaga as linhas e avança a marca d'água
+
+        Só as linhas gravadas na partição são apagadas: mensagens inseridas durante a
+        leitura ficam no banco para o próximo arquivamento. Meses sem mensagens são pulados.
+        """
+        cutoff = self.cutoff(project, days, now)
+        result = ArchiveResult(project_name=project.name, cutoff=cutoff)
+        if not cutoff:
+            return result
+
+        oldest = self._oldest_timestamp(project.id, cutoff)
+        month = _month_start(oldest) if oldest else None
+        table = Message.__table__
+        relevance = MessageRelevance.__table__
+        while month and month < cutoff:
+            upper = min(_next_month(month), cutoff)
+            read_ids: List[int] = []
+            written = self.archive.write_partition(project.id, month,
+                                                   self._month_batches(project.id, month, upper, read_ids))
+            with self.db.engine.begin() as connection:
+                for start in range(0, len(read_ids), DELETE_CHUNK):
+                    chunk = read_ids[start:start + DELETE_CHUNK]
+                    connection.execute(delete(relevance).where(relevance.c.message_id.in_(chunk)))
+                    connection.execute(delete(table).where(table.c.id.in_(chunk)))
+                # Marca d'água e remoção na mesma transação: leituras nunca perdem mensagens
+                archived_before = project.archived_before
+                if not archived_before or upper > archived_before:
+                    connection.execute(
+                        Project.__table__.update().where(Project.__table__.c.id == project.id)
+                        .values(archived_before=upper)
+                    )
+                    project.archived_before = upper
+            result.messages_archived += written
+            if read_ids:
+                result.partitions.append(f"{month:%Y-%m}")
+                logger.info(f"Archived {written} messages of {project.name} for {month:%Y-%m}")
+            oldest = self._oldest_timestamp(project.id, cutoff, after=upper)
+            month = _month_start(oldest) if oldest else None
+        return result
+
+    def reclaim_space(self) -> bool:
+        """Devolve ao sistema o espaço das linhas removidas (SQLite)"""
+        if self.db.engine.dialect.name != "sqlite":
+            return False
+        try:
+            with self.db.engine.connect() as connection:
+                connection.execution_options(isolation_level="AUTOCOMMIT").execute(text("VACUUM"))
+            return True
+        except Exception as e:
+            # Outro processo (Oracle Eye) pode estar escrevendo; tenta de novo no próximo arquivamento
+            logger.warning(f"VACUUM skipped: {e}")
+            return False
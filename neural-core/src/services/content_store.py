@@ -0,0 +1,328 @@
+"""
+Armazenamento do texto das mensagens endereçado por conteúdo
+
+Cada texto distinto vira uma linha de `messagecontent` (chave: hash blake2b do
+texto) e as mensagens apontam para ela por `content_id`: anúncios e spam
+repetidos milhares de vezes ocupam uma linha só, e content_id igual é um sinal
+de duplicata sem custo. O texto é comprimido com zstd, usando o dicionário
+treinado mais recente (`contentdictionary`) quando houver; fica cru quando a
+compressão não ajuda. Linhas antigas com o texto inline em `message.content`
+continuam legíveis.
+"""
+import hashlib
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import bindparam, delete, func, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm.attributes import set_committed_value
+
+from models import ContentDictionary, Message, MessageContent
+
+try:
+    import zstandard
+except ImportError:  # sem zstandard: conteúdo novo gravado sem compressão
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+LOOKUP_CHUNK = 500
+CONTENT_LABELS = [("codec", "content_codec"), ("dictionary_id", "content_dictionary_id"), ("data", "content_data")]
+DICTIONARY_CHECK_INTERVAL = 60.0  # segundos entre verificações de dicionário novo
+MIN_DICTIONARY_SAMPLES = 100
+
+def content_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+def _chunks(items: List, size: int = LOOKUP_CHUNK) -> Iterable[List]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+class ContentStore:
+    """Grava (intern) e lê (messages, with_content) textos de mensagens na tabela de conteúdo"""
+
+    def __init__(self, compression: str = "zstd", level: int = 3, cache_size: int = 50000):
+        self.compression = compression if zstandard else "none"
+        self.level = level
+        self.cache_size = cache_size
+        self._cache: Dict[int, str] = {}
+        self._dictionary_id: Optional[int] = None
+        self._compressor = None
+        self._checked_at = 0.0
+        self._decompressors: Dict[Optional[int], object] = {}
+
+    # Escrita
+    def _current_compressor(self, connection):
+        """Compressor com o dicionário mais recente (reconsultado a cada DICTIONARY_CHECK_INTERVAL)"""
+        if self.compression != "zstd":
+            return None, None
+        now = time.monotonic()
+        if self._compressor is None or now - self._checked_at >= DICTIONARY_CHECK_INTERVAL:
+            self._checked_at = now
+            latest = connection.execute(select(func.max(ContentDictionary.__table__.c.id))).scalar()
+            if self._compressor is None or latest != self._dictionary_id:
+                dictionary = self._load_dictionary(connection, latest) if latest else None
+                self._compressor = zstandard.ZstdCompressor(level=self.level, dict_data=dictionary)
+                self._dictionary_id = latest
+        return self._compressor, self._dictionary_id
+
+    def current_dictionary_id(self, connection) -> Optional[int]:
+        return self._current_compressor(connection)[1]
+
+    def reload_dictionary(self):
+        """Usa o dicionário mais recente já na próxima gravação"""
+        self._compressor = None
+
+    def encode(self, text: str, connection) -> dict:
+        """Linha de `messagecontent` para um texto (comprimido só quando fica menor)"""
+        raw = text.encode("utf-8")
+        row = {"content_hash": content_hash(text), "codec": "raw", "dictionary_id": None,
+               "data": raw, "char_count": len(text)}
+        compressor, dictionary_id = self._current_compressor(connection)
+        if compressor is not None:
+            packed = compressor.compress(raw)
+            if len(packed) < len(raw):
+                row.update(codec="zstd-dict" if dictionary_id else "zstd", dictionary_id=dictionary_id, data=packed)
+        return row
+
+    def _lookup(self, connection, hashes: List[str]) -> Dict[str, int]:
+        table = MessageContent.__table__
+        found = {}
+        for chunk in _chunks(hashes):
+            statement = select(table.c.content_hash, table.c.id).where(table.c.content_hash.in_(chunk))
+            found.update(dict(connection.execute(statement).all()))
+        return found
+
+    def intern(self, connection, texts: Iterable[str]) -> Dict[str, int]:
+        """content_id de cada texto, gravando os que ainda não existem (na transação de `connection`)"""
+        by_hash = {content_hash(text): text for text in texts}
+        ids = self._lookup(connection, list(by_hash))
+        missing = [self.encode(text, connection) for digest, text in by_hash.items() if digest not in ids]
+        if missing:
+            table = MessageContent.__table__
+            insert = postgresql_insert if connection.dialect.name == "postgresql" else sqlite_insert
+            # Outro processo pode gravar o mesmo texto ao mesmo tempo: o hash único resolve
+            connection.execute(insert(table).on_conflict_do_nothing(index_elements=["content_hash"]), missing)
+            ids.update(self._lookup(connection, [row["content_hash"] for row in missing]))
+        return {text: ids[digest] for digest, text in by_hash.items()}
+
+    # Leitura
+    def _load_dictionary(self, connection, dictionary_id: int):
+        data = connection.execute(
+            select(ContentDictionary.__table__.c.data).where(ContentDictionary.__table__.c.id == dictionary_id)
+        ).scalar()
+        return zstandard.ZstdCompressionDict(data)
+
+    def _decompressor(self, connection, dictionary_id: Optional[int]):
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read compressed message content (pip install zstandard)")
+        if dictionary_id not in self._decompressors:
+            dictionary = self._load_dictionary(connection, dictionary_id) if dictionary_id else None
+            self._decompressors[dictionary_id] = zstandard.ZstdDecompressor(dict_data=dictionary)
+        return self._decompressors[dictionary_id]
+
+    def decode(self, connection, codec: str, dictionary_id: Optional[int], data: bytes) -> str:
+        if codec != "raw":
+            data = self._decompressor(connection, dictionary_id).decompress(data)
+        return bytes(data).decode("utf-8")
+
+    def with_content(self, statement, message_table=None):
+        """Acrescenta ao SELECT de mensagens o texto gravado (LEFT JOIN em messagecontent)"""
+        content = MessageContent.__table__
+        message_table = message_table if message_table is not None else Message.__table__
+        return statement.add_columns(*[content.c[name].label(label) for name, label in CONTENT_LABELS]).outerjoin(
+            content, content.c.id == message_table.c.content_id
+        )
+
+    def _text(self, connection, content_id: int, codec: str, dictionary_id: Optional[int], data: bytes) -> str:
+        """Texto de um conteúdo (textos repetidos são descomprimidos uma vez, via cache)"""
+        text = self._cache.get(content_id)
+        if text is None:
+            text = self.decode(connection, codec, dictionary_id, data)
+            if len(self._cache) >= self.cache_size:
+                self._cache.clear()
+            self._cache[content_id] = text
+        return text
+
+    def messages(self, session, statement) -> List:
+        """Executa um SELECT de Message e preenche `content` com o texto da tabela de conteúdo
+
+        Os conteúdos vêm numa consulta só (id IN subconsulta com os mesmos filtros), sem
+        JOIN por linha no ORM.
+        """
+        messages = list(session.exec(statement))
+        if not any(message.content_id for message in messages):
+            return messages
+        content = MessageContent.__table__
+        content_ids = statement.with_only_columns(Message.content_id).order_by(None)
+        texts = {
+            content_id: self._text(session, content_id, codec, dictionary_id, data)
+            for content_id, codec, dictionary_id, data in session.execute(
+                select(content.c.id, content.c.codec, content.c.dictionary_id, content.c.data)
+                .where(content.c.id.in_(content_ids))
+            )
+        }
+        for message in messages:
+            if message.content_id is not None:
+                # Sem marcar o objeto como alterado: o texto nunca volta para message.content
+                set_committed_value(message, "content", texts[message.content_id])
+        return messages
+
+    def rows(self, connection, rows) -> List[dict]:
+        """Dicts de linhas (mappings) de `with_content`, com `content` preenchido"""
+        result = []
+        for row in rows:
+            row = dict(row)
+            codec, dictionary_id, data = (row.pop(label, None) for _, label in CONTENT_LABELS)
+            if codec is not None:
+                row["content"] = self._text(connection, row["content_id"], codec, dictionary_id, data)
+            result.append(row)
+        return result
+
+@dataclass
+class ContentCompaction:
+    """Resultado de `ContentCompactor.compact`"""
+    messages_moved: int = 0
+    dictionary_id: Optional[int] = None
+    contents_recompressed: int = 0
+    orphans_removed: int = 0
+
+@dataclass
+class ContentStats:
+    messages: int
+    inline_messages: int  # texto ainda em message.content (linhas antigas)
+    distinct_contents: int
+    text_chars: int  # tamanho do texto de cada conteúdo distinto
+    stored_bytes: int
+
+    @property
+    def duplicate_share(self) -> float:
+        stored = self.messages - self.inline_messages
+        return 1 - self.distinct_contents / stored if stored else 0.0
+
+class ContentCompactor:
+    """Manutenção da tabela de conteúdo: migra texto inline, treina o dicionário e recomprime"""
+
+    def __init__(self, db, batch_size: int = 5000):
+        self.db = db
+        self.config = db.config
+        self.store = db.content_store
+        self.batch_size = batch_size
+
+    def move_inline(self) -> int:
+        """Passa o texto de mensagens antigas (message.content) para a tabela de conteúdo"""
+        table = Message.__table__
+        moved = 0
+        while True:
+            with self.db.engine.begin() as connection:
+                rows = connection.execute(
+                    select(table.c.id, table.c.content).where(table.c.content_id.is_(None))
+                    .order_by(table.c.id).limit(self.batch_size)
+                ).all()
+                if not rows:
+                    return moved
+                content_ids = self.store.intern(connection, [content for _, content in rows])
+                connection.execute(
+                    table.update().where(table.c.id == bindparam("message_id")).values(content_id=bindparam("new_content_id"), content=""),
+                    [{"message_id": message_id, "new_content_id": content_ids[content]} for message_id, content in rows]
+                )
+            moved += len(rows)
+
+    def train_dictionary(self, samples: Optional[int] = None, dict_size: Optional[int] = None) -> Optional[int]:
+        """Treina um dicionário zstd com os textos distintos mais recentes; retorna seu id"""
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to train a content dictionary (pip install zstandard)")
+        samples = samples or self.config.CONTENT_DICT_SAMPLES
+        dict_size = dict_size or self.config.CONTENT_DICT_SIZE
+        table = MessageContent.__table__
+        with self.db.engine.connect() as connection:
+            rows = connection.execute(
+                select(table.c.id, table.c.codec, table.c.dictionary_id, table.c.data)
+                .order_by(table.c.id.desc()).limit(samples)
+            ).all()
+            texts = [self.store.decode(connection, codec, dictionary_id, data).encode("utf-8")
+                     for _, codec, dictionary_id, data in rows]
+        if len(texts) < MIN_DICTIONARY_SAMPLES:
+            logger.warning(f"Only {len(texts)} distinct messages; need {MIN_DICTIONARY_SAMPLES} to train a dictionary")
+            return None
+        try:
+            dictionary = zstandard.train_dictionary(dict_size, texts, level=self.store.level)
+        except zstandard.ZstdError as e:
+            logger.warning(f"Content dictionary training failed: {e}")
+            return None
+        with self.db.engine.begin() as connection:
+            dictionary_id = connection.execute(
+                ContentDictionary.__table__.insert().values(
+                    data=dictionary.as_bytes(), sample_count=len(texts), created_at=datetime.utcnow()
+                )
+            ).inserted_primary_key[0]
+        self.store.reload_dictionary()
+        logger.info(f"Trained content dictionary #{dictionary_id} ({len(dictionary.as_bytes()):,} bytes, {len(texts):,} samples)")
+        return dictionary_id
+
+    def recompress(self) -> int:
+        """Regrava com o dicionário atual os conteúdos comprimidos com outro (ou sem) dicionário"""
+        table = MessageContent.__table__
+        rewritten, last_id = 0, 0
+        while True:
+            with self.db.engine.begin() as connection:
+                current = self.store.current_dictionary_id(connection)
+                if current is None:
+                    return rewritten
+                rows = connection.execute(
+                    select(table.c.id, table.c.codec, table.c.dictionary_id, table.c.data)
+                    .where(table.c.id > last_id).order_by(table.c.id).limit(self.batch_size)
+                ).all()
+                if not rows:
+                    return rewritten
+                last_id = rows[-1][0]
+                updates = []
+                for content_id, codec, dictionary_id, data in rows:
+                    if dictionary_id == current:
+                        continue
+                    encoded = self.store.encode(self.store.decode(connection, codec, dictionary_id, data), connection)
+                    if len(encoded["data"]) < len(data):
+                        updates.append({"row_id": content_id, "new_codec": encoded["codec"],
+                                        "new_dictionary_id": encoded["dictionary_id"], "new_data": encoded["data"]})
+                if updates:
+                    connection.execute(
+                        table.update().where(table.c.id == bindparam("row_id")).values(
+                            codec=bindparam("new_codec"), dictionary_id=bindparam("new_dictionary_id"),
+                            data=bindparam("new_data")),
+                        updates
+                    )
+                    rewritten += len(updates)
+
+    def remove_orphans(self) -> int:
+        """Apaga conteúdos sem mensagens (ex.: arquivadas); rodar com o Oracle Eye parado"""
+        table = MessageContent.__table__
+        referenced = select(Message.__table__.c.content_id).where(Message.__table__.c.content_id.is_not(None))
+        with self.db.engine.begin() as connection:
+            return connection.execute(delete(table).where(table.c.id.not_in(referenced))).rowcount
+
+    def compact(self, train: bool = True, recompress: bool = True, prune: bool = False) -> ContentCompaction:
+        result = ContentCompaction(messages_moved=self.move_inline())
+        if train:
+            result.dictionary_id = self.train_dictionary()
+        if recompress:
+            result.contents_recompressed = self.recompress()
+        if prune:
+            result.orphans_removed = self.remove_orphans()
+        return result
+
+    def stats(self) -> ContentStats:
+        message_table = Message.__table__
+        content_table = MessageContent.__table__
+        with self.db.engine.connect() as connection:
+            messages, inline = connection.execute(select(
+                func.count(), func.count().filter(message_table.c.content_id.is_(None))
+            ).select_from(message_table)).one()
+            distinct, text_chars, stored_bytes = connection.execute(select(
+                func.count(), func.coalesce(func.sum(content_table.c.char_count), 0),
+                func.coalesce(func.sum(func.length(content_table.c.data)), 0)
+            )).one()
+        return ContentStats(messages, inline, distinct, text_chars, stored_bytes)
@@ -1,28 +1,123 @@
 import logging
-from typing import List, Optional
-from datetime import datetime
-from sqlmodel import SQLModel, create_engine, Session, select
-from models import Project, Message, Summary
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+from datetime import datetime, timedelta
+from sqlalchemy import DateTime, Integer, cast, func, inspect, literal, select as sa_select, text
+from sqlmodel import SQLModel, Session, select
+from models import Project, Message, Summary, ActivityRollup, Author, AuthorRollup, MessageContent, LlmUsage
+from services.archive import MessageArchive
+from services.author_store import AuthorStore
+from services.content_store import ContentStore
+from services.rollups import hour_bucket
 from utils.config import Config
+from utils.db_engine import create_database_engine
+from utils.json_codec import decode_json, encode_json
 
 logger = logging.getLogger(__name__)
 
+@dataclass
+class SummaryHeader:
+    """Campos leves de um resumo para listagem"""
+    id: int
+    project_id: int
+    project_name: str
+    date_range_start: datetime
+    date_range_end: datetime
+    created_at: datetime
+    message_count: int
+    high_relevance_count: int
+    cost_estimate: float
+    actual_cost: float
+    content_chars: int
+
+@dataclass
+class SpendRow:
+    """Gasto com o LLM agregado por grupo (projeto, modelo, operação ou dia)"""
+    group: str
+    calls: int
+    prompt_tokens: int
+    completion_tokens: int
+    estimated_cost: float
+    cost: float
+    latency_seconds: float  # média
+
+def count_duplicate_keys(connection, table, columns) -> int:
+    """Valores repetidos da chave `columns` (chaves com NULL não conflitam num índice único)"""
+    repeated = sa_select(*columns).where(*[column.is_not(None) for column in columns]).group_by(*columns).having(
+        func.count() > 1
+    ).subquery()
+    return connection.execute(sa_select(func.count()).select_from(repeated)).scalar()
+
 class DatabaseManager:
     def __init__(self, db_url: Optional[str] = None):
         self.config = Config()
         self.db_url = db_url or self.config.DATABASE_URL
-        self.engine = create_engine(self.db_url, echo=False)
+        self.engine = create_database_engine(self.db_url, self.config)
+        self.archive = MessageArchive()
+        self.content_store = ContentStore(self.config.CONTENT_COMPRESSION, self.config.CONTENT_ZSTD_LEVEL,
+                                          self.config.CONTENT_CACHE_SIZE)
+        self.author_store = AuthorStore()
         self._create_tables()
     
     def _create_tables(self):
         """Cria as tabelas no banco de dados"""
         try:
             SQLModel.metadata.create_all(self.engine)
+            self._add_missing_columns()
+            self._add_missing_indexes()
             logger.info("✅ Database tables created successfully")
         except Exception as e:
             logger.error(f"❌ Error creating database tables: {e}")
             raise
     
+    def _add_missing_columns(self):
+        """Adiciona às tabelas existentes as colunas novas dos modelos (create_all não altera tabelas)"""
+        inspector = inspect(self.engine)
+        existing_tables = set(inspector.get_table_names())
+        with self.engine.begin() as connection:
+            for table in SQLModel.metadata.sorted_tables:
+                if table.name not in existing_tables:
+                    continue
+                existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+                for column in table.columns:
+                    if column.name in existing_columns:
+                        continue
+                    ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=self.engine.dialect)}"
+                    default = column.default.arg if column.default is not None and column.default.is_scalar else None
+                    if isinstance(default, bool):
+                        ddl += f" DEFAULT {'TRUE' if default else 'FALSE'}"
+                    elif isinstance(default, (int, float)):
+                        ddl += f" DEFAULT {default}"
+                    elif isinstance(default, str):
+                        ddl += " DEFAULT '" + default.replace("'", "''") + "'"
+                    connection.execute(text(ddl))
+                    logger.info(f"Added column {table.name}.{column.name}")
+    
+    def _add_missing_indexes(self):
+        """Cria nas tabelas existentes os índices novos dos modelos
+
+        Um índice único só é criado se a chave não tem duplicatas; senão fica para o
+        comando `dedupe-db` do Neural Core, que remove as linhas repetidas explicitamente.
+        """
+        inspector = inspect(self.engine)
+        existing_tables = set(inspector.get_table_names())
+        for table in SQLModel.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name in existing_indexes:
+                    continue
+                with self.engine.begin() as connection:
+                    if index.unique:
+                        duplicates = count_duplicate_keys(connection, table, list(index.columns))
+                        if duplicates:
+                            logger.error(f"Not creating unique index {index.name}: {duplicates} duplicate keys "
+                                         f"in {table.name}. Run `python src/main.py dedupe-db` (Neural Core) to remove them")
+                            continue
+                    index.create(connection)
+                logger.info(f"Created index {index.name}")
+    
     def get_session(self) -> Session:
         """Retorna uma sessão do banco de dados"""
         return Session(self.engine)
@@ -34,7 +129,8 @@ class DatabaseManager:
             project = Project(
                 name=name,
                 telegram_group=telegram_group,
-                is_active=is_active
+                is_active=is_active,
+                rollups_complete_at=datetime.utcnow()  # Projeto novo: rollups completos desde o início
             )
             session.add(project)
             session.commit()
@@ -72,10 +168,20 @@ class DatabaseManager:
             return project
     
     # Métodos para Message
+    def _archive_range(self, session: Session, project_id: int,
+                       start_date: Optional[datetime],
+                       end_date: Optional[datetime]) -> Optional[tuple]:
+        """Parte do período que está no arquivo Parquet (None se não alcança o arquivo)"""
+        project = session.get(Project, project_id)
+        archived_before = project.archived_before if project else None
+        if not archived_before or (start_date and start_date >= archived_before):
+            return None
+        return start_date, min(end_date, archived_before) if end_date else archived_before
+    
     def get_messages_by_project(self, project_id: int, 
                                start_date: Optional[datetime] = None,
                                end_date: Optional[datetime] = None) -> List[Message]:
-        """Busca mensagens de um projeto em um período"""
+        """Busca mensagens de um projeto em um período (inclui as arquivadas)"""
         with self.get_session() as session:
             statement = select(Message).where(Message.project_id == project_id)
             
@@ -85,12 +191,23 @@ class DatabaseManager:
                 statement = statement.where(Message.timestamp <= end_date)
             
             statement = statement.order_by(Message.timestamp.desc())
-            return list(session.exec(statement))
+            messages = self.author_store.fill(session, self.content_store.messages(session, statement))
+            archive_range = self._archive_range(session, project_id, start_date, end_date)
+        
+        if archive_range:
+            # Linhas ainda no banco prevalecem (arquivamento interrompido antes do delete)
+            live_ids = {message.telegram_message_id for message in messages}
+            archived = [m for m in self.archive.read_messages(project_id, *archive_range)
+                        if m.telegram_message_id not in live_ids]
+            if archived:
+                messages.extend(archived)
+                messages.sort(key=lambda m: m.timestamp, reverse=True)
+        return messages
     
     def count_messages_by_project(self, project_id: int,
                                  start_date: Optional[datetime] = None,
                                  end_date: Optional[datetime] = None) -> int:
-        """Conta mensagens de um projeto em um período"""
+        """Conta mensagens de um projeto em um período (inclui as arquivadas)"""
         with self.get_session() as session:
             statement = select(Message).where(Message.project_id == project_id)
             
@@ -99,14 +216,212 @@ class DatabaseManager:
             if end_date:
                 statement = statement.where(Message.timestamp <= end_date)
             
-            return len(list(session.exec(statement)))
+            count = len(list(session.exec(statement)))
+            archive_range = self._archive_range(session, project_id, start_date, end_date)
+        
+        if archive_range:
+            count += self.archive.count_messages(project_id, *archive_range)
+        return count
+    
+    def message_rows(self, rows) -> List[dict]:
+        """Dicts de linhas de mensagens com o texto (`content_store.with_content`) e o nome do autor (author_id)"""
+        with self.engine.connect() as connection:
+            return self.author_store.fill(connection, self.content_store.rows(connection, rows))
+
+    def search_messages(self, project_id: int, query: str,
+                        start_date: Optional[datetime] = None,
+                        end_date: Optional[datetime] = None,
+                        limit: int = 20, batch_size: int = 5000) -> List[dict]:
+        """Mensagens com todos os termos de `query` (sem diferenciar maiúsculas), mais recentes primeiro
+
+        O texto fica comprimido na tabela de conteúdo: o período é percorrido em lotes
+        (keyset por timestamp, id) e filtrado em Python, com os textos repetidos vindo do
+        cache do ContentStore. Mensagens já arquivadas em Parquet ficam de fora.
+        """
+        terms = [term.casefold() for term in query.split()]
+        table = Message.__table__
+        found, last = [], None
+        with self.engine.connect() as connection:
+            while len(found) < limit:
+                statement = self.content_store.with_content(sa_select(
+                    table.c.id, table.c.telegram_message_id, table.c.timestamp,
+                    table.c.content, table.c.content_id, table.c.author, table.c.author_id
+                )).where(table.c.project_id == project_id)
+                if start_date:
+                    statement = statement.where(table.c.timestamp >= start_date)
+                if end_date:
+                    statement = statement.where(table.c.timestamp <= end_date)
+                if last:
+                    statement = statement.where((table.c.timestamp < last[0]) |
+                                                ((table.c.timestamp == last[0]) & (table.c.id < last[1])))
+                statement = statement.order_by(table.c.timestamp.desc(), table.c.id.desc()).limit(batch_size)
+                rows = self.content_store.rows(connection, connection.execute(statement).mappings())
+                found.extend(row for row in rows
+                             if all(term in (row["content"] or "").casefold() for term in terms))
+                if len(rows) < batch_size:
+                    break
+                last = (rows[-1]["timestamp"], rows[-1]["id"])
+            return self.author_store.fill(connection, found[:limit])
+
+    # Métodos para rollups de atividade
+    def get_activity_rollups(self, project_id: int,
+                             start_date: Optional[datetime] = None,
+                             end_date: Optional[datetime] = None) -> List[ActivityRollup]:
+        """Rollups horários do projeto cujas horas intersectam o período"""
+        with self.get_session() as session:
+            statement = select(ActivityRollup).where(ActivityRollup.project_id == project_id)
+            if start_date:
+                statement = statement.where(ActivityRollup.bucket_start >= hour_bucket(start_date))
+            if end_date:
+                statement = statement.where(ActivityRollup.bucket_start <= end_date)
+            return list(session.exec(statement.order_by(ActivityRollup.bucket_start)))
+    
+    def get_top_authors(self, project_id: int, start_date: Optional[datetime] = None,
+                        end_date: Optional[datetime] = None, limit: int = 10) -> List[tuple]:
+        """Autores com mais mensagens no período: [(autor, mensagens)]"""
+        total = func.sum(AuthorRollup.message_count)
+        with self.get_session() as session:
+            statement = select(AuthorRollup.author, total).where(AuthorRollup.project_id == project_id)
+            if start_date:
+                statement = statement.where(AuthorRollup.bucket_start >= hour_bucket(start_date))
+            if end_date:
+                statement = statement.where(AuthorRollup.bucket_start <= end_date)
+            statement = statement.group_by(AuthorRollup.author).order_by(total.desc()).limit(limit)
+            return [(author, count) for author, count in session.exec(statement)]
+    
+    def count_distinct_authors(self, project_id: int, start_date: Optional[datetime] = None,
+                               end_date: Optional[datetime] = None) -> int:
+        """Autores distintos no período (a partir dos rollups por autor)"""
+        with self.get_session() as session:
+            statement = select(func.count(func.distinct(AuthorRollup.author))).where(AuthorRollup.project_id == project_id)
+            if start_date:
+                statement = statement.where(AuthorRollup.bucket_start >= hour_bucket(start_date))
+            if end_date:
+                statement = statement.where(AuthorRollup.bucket_start <= end_date)
+            return session.exec(statement).one()
+    
+    def get_author_activity(self, project_id: int, start_date: Optional[datetime] = None,
+                            end_date: Optional[datetime] = None, limit: int = 20,
+                            admins_only: bool = False) -> List[tuple]:
+        """Autores com mais mensagens no projeto/período: [(Author, mensagens)]
+
+        GROUP BY em message.author_id (índice project_id, author_id); mensagens antigas
+        sem author_id só entram depois do compact-authors.
+        """
+        total = func.count(Message.id)
+        with self.get_session() as session:
+            statement = select(Author, total).join(Author, Author.id == Message.author_id).where(
+                Message.project_id == project_id
+            )
+            if start_date:
+                statement = statement.where(Message.timestamp >= start_date)
+            if end_date:
+                statement = statement.where(Message.timestamp <= end_date)
+            if admins_only:
+                statement = statement.where(Author.is_admin == True)
+            statement = statement.group_by(Author.id).order_by(total.desc()).limit(limit)
+            return [(author, count) for author, count in session.exec(statement)]
+    
+    def get_activity_totals(self, project_id: int, start_date: datetime,
+                            end_date: datetime) -> Optional[tuple]:
+        """(mensagens, caracteres) no período via rollups; None se os rollups estão incompletos
+
+        Horas inteiras vêm dos rollups; as frações de hora nas pontas, da tabela Message
+        e, antes de `archived_before`, do arquivo Parquet.
+        """
+        with self.get_session() as session:
+            project = session.get(Project, project_id)
+            if not project or not project.rollups_complete_at:
+                return None
+            
+            first_full = hour_bucket(start_date)
+            if first_full < start_date:
+                first_full += timedelta(hours=1)
+            last_edge = hour_bucket(end_date)
+            
+            messages, chars = 0, 0
+            if first_full < last_edge:
+                rollup_totals = select(func.sum(ActivityRollup.message_count), func.sum(ActivityRollup.char_count)).where(
+                    ActivityRollup.project_id == project_id,
+                    ActivityRollup.bucket_start >= first_full,
+                    ActivityRollup.bucket_start < last_edge
+                )
+                count, total_chars = session.exec(rollup_totals).one()
+                messages, chars = count or 0, total_chars or 0
+                edges = [(start_date, first_full, False), (last_edge, end_date, True)]
+            else:
+                edges = [(start_date, end_date, True)]
+            
+            # Tamanho do texto: char_count da tabela de conteúdo, ou do texto inline (linhas antigas)
+            char_count = func.coalesce(MessageContent.char_count, func.length(Message.content))
+            for lower, upper, inclusive in edges:
+                edge_totals = select(func.count(Message.id), func.sum(char_count)).outerjoin(
+                    MessageContent, MessageContent.id == Message.content_id
+                ).where(
+                    Message.project_id == project_id,
+                    Message.timestamp >= lower,
+                    Message.timestamp <= upper if inclusive else Message.timestamp < upper
+                )
+                count, total_chars = session.exec(edge_totals).one()
+                messages += count or 0
+                chars += total_chars or 0
+                # Frações de hora antes de archived_before: as mensagens estão no Parquet
+                if project.archived_before and lower < project.archived_before:
+                    count, total_chars = self.archive.totals(project_id, lower, upper, inclusive)
+                    messages += count
+                    chars += total_chars
+            return messages, chars
+    
+    def _days_before(self, column, now: datetime):
+        """Dias inteiros entre `column` e `now` (0 = últimas 24h)"""
+        if self.engine.dialect.name == "postgresql":
+            return cast(func.floor(func.extract("epoch", literal(now, DateTime) - column) / 86400), Integer)
+        return cast(func.julianday(literal(now, DateTime)) - func.julianday(column), Integer)
+    
+    def get_daily_totals(self, projects: List[Project], days: int, now: datetime) -> Dict[int, List[tuple]]:
+        """{project_id: [(mensagens, caracteres) de cada dia, do mais recente]} dos últimos `days` dias
+
+        Uma consulta agrupada por (projeto, dia) nos rollups horários dos projetos com rollups
+        completos e outra na tabela Message para os demais (sem as mensagens arquivadas).
+        """
+        totals = {project.id: [(0, 0)] * days for project in projects}
+        since = now - timedelta(days=days)
+        complete = [project.id for project in projects if project.rollups_complete_at]
+        incomplete = [project.id for project in projects if not project.rollups_complete_at]
+        statements = []
+        if complete:
+            rollup = ActivityRollup.__table__
+            day = self._days_before(rollup.c.bucket_start, now).label("day")
+            statements.append(sa_select(
+                rollup.c.project_id, day, func.sum(rollup.c.message_count), func.sum(rollup.c.char_count)
+            ).where(
+                rollup.c.project_id.in_(complete), rollup.c.bucket_start >= since, rollup.c.bucket_start <= now
+            ).group_by(rollup.c.project_id, day))
+        if incomplete:
+            message = Message.__table__
+            day = self._days_before(message.c.timestamp, now).label("day")
+            char_count = func.coalesce(MessageContent.__table__.c.char_count, func.length(message.c.content))
+            statements.append(sa_select(
+                message.c.project_id, day, func.count(message.c.id), func.sum(char_count)
+            ).select_from(message.outerjoin(
+                MessageContent.__table__, MessageContent.__table__.c.id == message.c.content_id
+            )).where(
+                message.c.project_id.in_(incomplete), message.c.timestamp >= since, message.c.timestamp <= now
+            ).group_by(message.c.project_id, day))
+        with self.engine.connect() as connection:
+            for statement in statements:
+                for project_id, day, count, chars in connection.execute(statement):
+                    if 0 <= day < days:
+                        totals[project_id][day] = (count or 0, chars or 0)
+        return totals
     
     # Métodos para Summary
     def create_summary(self, project_id: int, content: str,
                       date_range_start: datetime, date_range_end: datetime,
                       cost_estimate: float = 0.0, actual_cost: float = 0.0,
                       message_count: int = 0, summary_metadata: str = None, 
-                      citations: str = None, high_relevance_count: int = 0) -> Summary:
+                      citations: str = None, high_relevance_count: int = 0,
+                      digest_period: Optional[str] = None) -> Summary:
         """Cria um novo resumo"""
         with self.get_session() as session:
             summary = Summary(
@@ -119,7 +434,8 @@ class DatabaseManager:
                 message_count=message_count,
                 summary_metadata=summary_metadata,
                 citations=citations,
-                high_relevance_count=high_relevance_count
+                high_relevance_count=high_relevance_count,
+                digest_period=digest_period
             )
             session.add(summary)
             session.commit()
@@ -127,6 +443,93 @@ class DatabaseManager:
             logger.info(f"✅ Summary created for project {project_id}")
             return summary
     
+    def update_summary(self, summary_id: int, **kwargs) -> Optional[Summary]:
+        """Atualiza um resumo"""
+        with self.get_session() as session:
+            summary = session.get(Summary, summary_id)
+            if not summary:
+                return None
+            
+            for key, value in kwargs.items():
+                if hasattr(summary, key):
+                    setattr(summary, key, value)
+            
+            session.add(summary)
+            session.commit()
+            session.refresh(summary)
+            return summary
+    
+    def get_summary(self, summary_id: int) -> Optional[Summary]:
+        """Busca um resumo completo (conteúdo, metadata e citações)"""
+        with self.get_session() as session:
+            return session.get(Summary, summary_id)
+    
+    def get_summary_headers(self, project_id: Optional[int] = None, limit: int = 20,
+                            before_id: Optional[int] = None) -> List[SummaryHeader]:
+        """Página de cabeçalhos de resumos (mais novos primeiro) sem ler as colunas grandes"""
+        table = Summary.__table__
+        statement = sa_select(
+            table.c.id, table.c.project_id, Project.__table__.c.name,
+            table.c.date_range_start, table.c.date_range_end, table.c.created_at,
+            table.c.message_count, table.c.high_relevance_count,
+            table.c.cost_estimate, table.c.actual_cost,
+            func.length(table.c.content)
+        ).join(Project.__table__, Project.__table__.c.id == table.c.project_id)
+        if project_id is not None:
+            statement = statement.where(table.c.project_id == project_id)
+        if before_id is not None:
+            # Paginação por chave: estável e sem OFFSET
+            statement = statement.where(table.c.id < before_id)
+        statement = statement.order_by(table.c.id.desc()).limit(limit)
+        with self.engine.connect() as connection:
+            return [SummaryHeader(*row) for row in connection.execute(statement)]
+    
+    def get_latest_digest(self, project_id: int, period: str) -> Optional[Summary]:
+        """Digest pré-calculado mais recente do projeto para o período (daily/weekly)"""
+        with self.get_session() as session:
+            statement = select(Summary).where(
+                Summary.project_id == project_id, Summary.digest_period == period
+            ).order_by(Summary.date_range_end.desc(), Summary.id.desc()).limit(1)
+            return session.exec(statement).first()
+    
+    def get_digest_spend(self, since: datetime) -> float:
+        """Custo somado dos digests criados desde `since` (orçamento do digest worker)"""
+        table = Summary.__table__
+        with self.engine.connect() as connection:
+            return connection.execute(
+                sa_select(func.coalesce(func.sum(table.c.actual_cost), 0.0))
+                .where(table.c.digest_period.is_not(None), table.c.created_at >= since)
+            ).scalar() or 0.0
+    
+    def compact_summaries(self, batch_size: int = 100) -> tuple:
+        """Regrava metadata/citações antigas no formato compacto: (resumos, bytes antes, bytes depois)"""
+        table = Summary.__table__
+        rewritten, before, after = 0, 0, 0
+        last_id = 0
+        while True:
+            with self.engine.begin() as connection:
+                rows = connection.execute(
+                    sa_select(table.c.id, table.c.summary_metadata, table.c.citations)
+                    .where(table.c.id > last_id).order_by(table.c.id).limit(batch_size)
+                ).all()
+                if not rows:
+                    return rewritten, before, after
+                for summary_id, metadata, citations in rows:
+                    last_id = summary_id
+                    values = {}
+                    for column, blob in (("summary_metadata", metadata), ("citations", citations)):
+                        if not blob:
+                            continue
+                        compact = encode_json(decode_json(blob), self.config.SUMMARY_JSON_COMPRESSION,
+                                              self.config.SUMMARY_JSON_COMPRESS_MIN_BYTES)
+                        before += len(blob)
+                        after += len(compact)
+                        if compact != blob:
+                            values[column] = compact
+                    if values:
+                        connection.execute(table.update().where(table.c.id == summary_id).values(**values))
+                        rewritten += 1
+    
     def get_summaries_by_project(self, project_id: int) -> List[Summary]:
         """Busca resumos de um projeto"""
         with self.get_session() as session:
@@ -134,3 +537,61 @@ class DatabaseManager:
                 Summary.project_id == project_id
             ).order_by(Summary.created_at.desc())
             return list(session.exec(statement))
+    
+    # Métodos para LlmUsage
+    def record_llm_usage(self, **fields) -> LlmUsage:
+        """Grava uma chamada ao LLM no registro de uso"""
+        with self.get_session() as session:
+            usage = LlmUsage(**fields)
+            session.add(usage)
+            session.commit()
+            session.refresh(usage)
+            return usage
+    
+    def link_llm_usage(self, usage_id: int, summary_id: int):
+        """Liga a chamada ao resumo gravado com ela"""
+        table = LlmUsage.__table__
+        with self.engine.begin() as connection:
+            connection.execute(table.update().where(table.c.id == usage_id).values(summary_id=summary_id))
+    
+    def get_llm_usage_samples(self, model: str, project_id: Optional[int] = None, limit: int = 50,
+                              exclude_operation: Optional[str] = None) -> List[tuple]:
+        """Chamadas recentes com uso informado pelo modelo (calibração):
+        [(estimated_prompt_chars, prompt_chars, prompt_tokens, completion_tokens)]"""
+        table = LlmUsage.__table__
+        statement = sa_select(
+            table.c.estimated_prompt_chars, table.c.prompt_chars, table.c.prompt_tokens, table.c.completion_tokens
+        ).where(table.c.model == model, table.c.usage_reported == True, table.c.prompt_tokens > 0)
+        if project_id is not None:
+            statement = statement.where(table.c.project_id == project_id)
+        if exclude_operation:
+            statement = statement.where(table.c.operation != exclude_operation)
+        statement = statement.order_by(table.c.id.desc()).limit(limit)
+        with self.engine.connect() as connection:
+            return [tuple(row) for row in connection.execute(statement)]
+    
+    def get_llm_spend(self, since: datetime, project_id: Optional[int] = None,
+                      group_by: str = "project") -> List[SpendRow]:
+        """Gasto do registro de uso desde `since`, agrupado por project, model, operation ou day"""
+        table = LlmUsage.__table__
+        groups = {
+            "project": Project.__table__.c.name,
+            "model": table.c.model,
+            "operation": table.c.operation,
+            "day": func.date(table.c.created_at),
+        }
+        if group_by not in groups:
+            raise ValueError(f"Unknown grouping '{group_by}' (use {', '.join(groups)})")
+        group = groups[group_by]
+        statement = sa_select(
+            group, func.count(table.c.id), func.sum(table.c.prompt_tokens), func.sum(table.c.completion_tokens),
+            func.sum(table.c.estimated_cost), func.sum(table.c.cost), func.avg(table.c.latency_seconds)
+        ).join(Project.__table__, Project.__table__.c.id == table.c.project_id).where(table.c.created_at >= since)
+        if project_id is not None:
+            statement = statement.where(table.c.project_id == project_id)
+        statement = statement.group_by(group).order_by(group)
+        with self.engine.connect() as connection:
+            return [SpendRow(str(name), calls, prompt_tokens or 0, completion_tokens or 0,
+                             estimated_cost or 0.0, cost or 0.0, latency or 0.0)
+                    for name, calls, prompt_tokens, completion_tokens, estimated_cost, cost, latency
+                    in connection.execute(statement)]
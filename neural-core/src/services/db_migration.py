@@ -0,0 +1,166 @@
+"""
+Migração do banco compartilhado entre backends (ex.: SQLite -> PostgreSQL)
+
+As tabelas são copiadas na ordem das chaves estrangeiras, em páginas por id,
+mantendo os ids. Num destino PostgreSQL as linhas entram via COPY e as sequências
+de id são ajustadas no fim; nos demais, via INSERT em lote (executemany).
+
+`deduplicate_unique_keys` (comando dedupe-db) remove as linhas repetidas que
+impedem a criação de um índice único novo dos modelos: fica a de menor id, e as
+referências às removidas passam para ela.
+"""
+import logging
+import time
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+from sqlalchemy import and_, bindparam, func, inspect, select, text
+from sqlmodel import SQLModel
+
+from services.database import count_duplicate_keys
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class TableMigration:
+    """Resultado da cópia de uma tabela"""
+    table: str
+    rows: int
+    seconds: float
+
+@dataclass
+class KeyDeduplication:
+    """Linhas repetidas na chave de um índice único ainda não criado"""
+    table: str
+    index: str
+    duplicate_keys: int
+    removed: int = 0
+    repointed: int = 0  # referências movidas para a linha mantida (ou removidas, em relações 1:1)
+
+DEDUP_CHUNK = 5000  # ids por DELETE ... IN (limite de variáveis do SQLite)
+
+def _references(table):
+    """Colunas de outras tabelas com chave estrangeira para `table.id`: [(coluna, única na tabela dela)]"""
+    references = []
+    for other in SQLModel.metadata.sorted_tables:
+        for column in other.columns:
+            if any(key.column is table.c.id for key in column.foreign_keys):
+                one_to_one = any(index.unique and list(index.columns) == [column] for index in other.indexes)
+                references.append((column, one_to_one))
+    return references
+
+def _deduplicate(connection, table, columns) -> tuple:
+    """Remove as repetidas (mantém o menor id); retorna (removidas, referências ajustadas)"""
+    kept = select(*columns, func.min(table.c.id).label("kept_id")).where(
+        *[column.is_not(None) for column in columns]
+    ).group_by(*columns).subquery()
+    pairs = connection.execute(
+        select(table.c.id, kept.c.kept_id).join(kept, and_(*[column == kept.c[column.name] for column in columns]))
+        .where(table.c.id != kept.c.kept_id)
+    ).all()
+    repointed = 0
+    for column, one_to_one in _references(table):
+        reference = column.table
+        if one_to_one:
+            # Uma linha por referência (ex.: relevância da mensagem): a da linha mantida já existe
+            for start in range(0, len(pairs), DEDUP_CHUNK):
+                ids = [duplicate_id for duplicate_id, _ in pairs[start:start + DEDUP_CHUNK]]
+                repointed += connection.execute(reference.delete().where(column.in_(ids))).rowcount
+        elif pairs:
+            repointed += connection.execute(
+                reference.update().where(column == bindparam("duplicate_id")).values({column.name: bindparam("kept_id")}),
+                [{"duplicate_id": duplicate_id, "kept_id": kept_id} for duplicate_id, kept_id in pairs]
+            ).rowcount
+    removed = 0
+    for start in range(0, len(pairs), DEDUP_CHUNK):
+        ids = [duplicate_id for duplicate_id, _ in pairs[start:start + DEDUP_CHUNK]]
+        removed += connection.execute(table.delete().where(table.c.id.in_(ids))).rowcount
+    return removed, repointed
+
+def deduplicate_unique_keys(db, dry_run: bool = False) -> List[KeyDeduplication]:
+    """Remove as duplicatas que impedem os índices únicos ausentes e cria os índices
+
+    Chaves com NULL ficam como estão (não conflitam num índice único). Cada índice
+    é tratado numa transação: remoção, ajuste das referências e criação do índice.
+    """
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    results = []
+    for table in SQLModel.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if not index.unique or index.name in existing_indexes:
+                continue
+            columns = list(index.columns)
+            with db.engine.begin() as connection:
+                result = KeyDeduplication(table.name, index.name, count_duplicate_keys(connection, table, columns))
+                if not dry_run:
+                    if result.duplicate_keys:
+                        result.removed, result.repointed = _deduplicate(connection, table, columns)
+                    index.create(connection)
+            if result.removed:
+                logger.warning(f"Removed {result.removed} duplicate rows from {table.name} and created {index.name}")
+            results.append(result)
+    return results
+
+def _copy_rows(connection, table, rows: List[tuple]):
+    if connection.dialect.name != "postgresql":
+        names = [column.name for column in table.columns]
+        connection.execute(table.insert(), [dict(zip(names, row)) for row in rows])
+        return
+    quote = connection.dialect.identifier_preparer.quote
+    columns = ", ".join(quote(column.name) for column in table.columns)
+    with connection.connection.driver_connection.cursor() as cursor:
+        with cursor.copy(f"COPY {quote(table.name)} ({columns}) FROM STDIN") as copy:
+            for row in rows:
+                copy.write_row(row)
+
+def _reset_sequence(connection, table):
+    """Próximo id gerado = maior id copiado + 1 (ids explícitos não avançam a sequência)"""
+    if connection.dialect.name != "postgresql":
+        return
+    connection.execute(text(
+        f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), COALESCE(MAX(id), 1), MAX(id) IS NOT NULL) "
+        f"FROM {connection.dialect.identifier_preparer.quote(table.name)}"
+    ))
+
+def migrate_database(source, target, batch_size: int = 10000, truncate: bool = False,
+                     progress: Optional[Callable[[str, int], None]] = None) -> List[TableMigration]:
+    """Copia todas as tabelas dos modelos de `source` para `target` (DatabaseManagers)
+
+    O destino precisa estar vazio, salvo com `truncate=True`.
+    """
+    tables = SQLModel.metadata.sorted_tables
+    with target.engine.begin() as connection:
+        filled = [table.name for table in tables
+                  if connection.execute(select(func.count()).select_from(table)).scalar()]
+        if filled and not truncate:
+            raise ValueError(f"Target database is not empty ({', '.join(filled)}); use truncate to overwrite it")
+        for table in reversed(tables):
+            connection.execute(table.delete())
+
+    results = []
+    for table in tables:
+        started = time.perf_counter()
+        copied, last_id = 0, None
+        while True:
+            statement = select(*table.columns).order_by(table.c.id).limit(batch_size)
+            if last_id is not None:
+                statement = statement.where(table.c.id > last_id)
+            with source.engine.connect() as connection:
+                rows = [tuple(row) for row in connection.execute(statement)]
+            if not rows:
+                break
+            with target.engine.begin() as connection:
+                _copy_rows(connection, table, rows)
+            last_id = rows[-1][list(table.columns).index(table.c.id)]
+            copied += len(rows)
+            if progress:
+                progress(table.name, copied)
+        with target.engine.begin() as connection:
+            _reset_sequence(connection, table)
+        results.append(TableMigration(table.name, copied, time.perf_counter() - started))
+        logger.info(f"Migrated {copied:,} rows of {table.name}")
+    return results
@@ -0,0 +1,190 @@
+"""
+Pré-cálculo de digests (resumos diários/semanais) após as coletas do Oracle Eye
+
+O worker observa `Project.last_collected_at`; quando há coleta nova depois do último
+digest de um período e ele já não termina perto de agora, gera um novo (terminando
+agora) em segundo plano, com no máximo
+DIGEST_CONCURRENCY gerações simultâneas e dentro do orçamento DIGEST_DAILY_BUDGET.
+`generate-summary` reaproveita o digest enquanto ele estiver fresco.
+"""
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+from models import Project, Summary
+
+logger = logging.getLogger(__name__)
+
+DIGEST_PERIODS = {"daily": 1, "weekly": 7}
+
+def parse_digest_periods(value: Optional[str]) -> List[str]:
+    """'daily,weekly' -> ['daily', 'weekly'] (rejeita períodos desconhecidos)"""
+    periods = [item.strip().lower() for item in (value or "").split(",") if item.strip()]
+    unknown = [period for period in periods if period not in DIGEST_PERIODS]
+    if unknown:
+        raise ValueError(f"Unknown digest period(s): {', '.join(unknown)} (use {', '.join(DIGEST_PERIODS)})")
+    return periods
+
+def period_for_days(days: int) -> Optional[str]:
+    for period, period_days in DIGEST_PERIODS.items():
+        if period_days == days:
+            return period
+    return None
+
+def is_fresh(digest: Summary, project: Project, staleness: float, now: Optional[datetime] = None) -> bool:
+    """Fresco enquanto a janela do digest terminar a menos de `staleness` do período antes de agora
+
+    Sem coleta registrada no projeto nada é fresco: o digest não tem com o que ser comparado.
+    """
+    if not project.last_collected_at:
+        return False
+    now = now or datetime.utcnow()
+    window = timedelta(days=DIGEST_PERIODS[digest.digest_period])
+    return now - digest.date_range_end <= window * staleness
+
+def find_fresh_digest(db, project: Project, days: int) -> Optional[Summary]:
+    """Digest pré-calculado que cobre os últimos `days` dias e ainda está fresco"""
+    period = period_for_days(days)
+    if not period:
+        return None
+    digest = db.get_latest_digest(project.id, period)
+    if digest and is_fresh(digest, project, db.config.DIGEST_STALENESS):
+        return digest
+    return None
+
+@dataclass
+class DigestJob:
+    """Um digest a gerar"""
+    project: Project
+    period: str
+    start: datetime
+    end: datetime
+    estimated_cost: float = 0.0
+    max_cost: Optional[float] = None  # orçamento do plano: o menor entre MAX_COST_PER_SUMMARY e o restante do dia
+
+    @property
+    def key(self) -> Tuple[int, str]:
+        return self.project.id, self.period
+
+class DigestWorker:
+    """Gera os digests configurados de cada projeto, com concorrência e custo limitados"""
+
+    def __init__(self, db, ai_processor, concurrency: Optional[int] = None, daily_budget: Optional[float] = None):
+        self.db = db
+        self.ai_processor = ai_processor
+        self.config = db.config
+        self.concurrency = concurrency or self.config.DIGEST_CONCURRENCY
+        self.daily_budget = self.config.DIGEST_DAILY_BUDGET if daily_budget is None else daily_budget
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._in_flight: Dict[Tuple[int, str], float] = {}  # job -> custo reservado
+        self._tasks: Set[asyncio.Task] = set()
+        # Janela sem mensagens ou com erro: só tenta de novo após uma nova coleta
+        self._skipped: Dict[Tuple[int, str], Optional[datetime]] = {}
+        self.generated = 0
+
+    def digest_periods(self, project: Project) -> List[str]:
+        if project.digest_periods is not None:
+            return parse_digest_periods(project.digest_periods)
+        return parse_digest_periods(self.config.DIGEST_PERIODS)
+
+    def due_jobs(self) -> List[DigestJob]:
+        """Digests ausentes ou vencidos com coleta nova depois deles (mais atrasados primeiro)
+
+        A janela de cada digest termina agora, a mesma que `generate-summary --days N` pede.
+        """
+        now = datetime.utcnow()
+        due = []
+        for project in self.db.get_all_projects():
+            if not project.is_active or not project.last_collected_at:
+                continue
+            for period in self.digest_periods(project):
+                key = (project.id, period)
+                if key in self._in_flight or self._skipped.get(key) == project.last_collected_at:
+                    continue
+                latest = self.db.get_latest_digest(project.id, period)
+                if latest and (is_fresh(latest, project, self.config.DIGEST_STALENESS, now)
+                               or project.last_collected_at <= latest.date_range_end):
+                    continue
+                covered_until = latest.date_range_end if latest else datetime.min
+                due.append((covered_until, DigestJob(project, period, now - timedelta(days=DIGEST_PERIODS[period]), now)))
+        due.sort(key=lambda item: item[0])
+        return [job for _, job in due]
+
+    def remaining_budget(self) -> Optional[float]:
+        """Orçamento das últimas 24h menos o gasto e as reservas em andamento (None = ilimitado)"""
+        if self.daily_budget <= 0:
+            return None
+        spent = self.db.get_digest_spend(datetime.utcnow() - timedelta(days=1))
+        return self.daily_budget - spent - sum(self._in_flight.values())
+
+    def schedule(self) -> List[DigestJob]:
+        """Dispara as tarefas dos digests pendentes que cabem no orçamento"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        started = []
+        for job in self.due_jobs():
+            remaining = self.remaining_budget()
+            if remaining is not None:
+                # O roteador reduz o modelo/contexto para caber no que sobra do orçamento do dia
+                job.max_cost = min(self.config.MAX_COST_PER_SUMMARY, max(remaining, 0.0))
+            try:
+                estimate = self.ai_processor.estimate_cost(job.project, job.start, job.end, job.max_cost)
+            except Exception as e:
+                logger.error(f"Error estimating {job.period} digest for {job.project.name}: {e}")
+                continue
+            job.estimated_cost = estimate.total_cost
+            if estimate.plan and not estimate.plan.fits:
+                logger.warning(f"Digest budget exhausted: skipping {job.period} digest for {job.project.name} "
+                               f"({estimate.plan.notes[-1]})")
+                continue
+            self._in_flight[job.key] = job.estimated_cost
+            task = asyncio.create_task(self._run_job(job))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            started.append(job)
+        return started
+
+    async def _run_job(self, job: DigestJob):
+        try:
+            async with self._semaphore:
+                summary = await asyncio.to_thread(
+                    self.ai_processor.generate_summary, job.project, job.start, job.end, digest_period=job.period,
+                    max_cost=job.max_cost
+                )
+            self.generated += 1
+            logger.info(f"✅ {job.period.capitalize()} digest #{summary.id} for {job.project.name} "
+                        f"({summary.message_count} messages, ${summary.actual_cost:.2f})")
+        except Exception as e:
+            self._skipped[job.key] = job.project.last_collected_at
+            logger.error(f"❌ Error generating {job.period} digest for {job.project.name}: {e}")
+        finally:
+            self._in_flight.pop(job.key, None)
+
+    async def run_once(self) -> int:
+        """Uma passada: gera os digests pendentes e espera todos terminarem"""
+        started = self.schedule()
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks))
+        return len(started)
+
+    async def run(self, stop: Optional[asyncio.Event] = None):
+        """Loop contínuo: verifica coletas concluídas a cada DIGEST_POLL_INTERVAL segundos"""
+        stop = stop or asyncio.Event()
+        logger.info(f"Digest worker started (concurrency {self.concurrency}, "
+                    f"budget {'unlimited' if self.daily_budget <= 0 else f'${self.daily_budget:.2f}/day'})")
+        try:
+            while not stop.is_set():
+                try:
+                    self.schedule()
+                except Exception as e:
+                    logger.error(f"❌ Error in digest worker: {e}")
+                try:
+                    await asyncio.wait_for(stop.wait(), timeout=self.config.DIGEST_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            if self._tasks:
+                logger.info(f"Waiting for {len(self._tasks)} digest(s) in progress...")
+                await asyncio.gather(*list(self._tasks), return_exceptions=True)
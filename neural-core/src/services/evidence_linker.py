@@ -0,0 +1,140 @@
+"""
+Ligação entre afirmações do resumo e as mensagens que as sustentam (BM25)
+"""
+import logging
+import re
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from models import Message
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"[^\W_]+", re.UNICODE)
+DOCUMENT_SEPARATOR = "\x00"
+CORPUS_TOKEN_PATTERN = re.compile(r"[^\W_]+|\x00", re.UNICODE)
+BULLET_PATTERN = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s+(.*\S)\s*$")
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?])\s+")
+
+STOPWORDS = frozenset("""
+a an and are as at be been but by for from has have in is it its of on or that the their this to was were will with
+we you they our your i he she them there here what when where which who why how not no so if then than about into
+o os a as de do da dos das e em um uma para com por que no na nos nas ao se
+""".split())
+
+def tokenize(text: str) -> List[str]:
+    """Termos normalizados (minúsculas, sem stopwords e tokens de 1 caractere)"""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if len(token) > 1 and token not in STOPWORDS]
+
+def extract_statements(summary_content: str) -> List[str]:
+    """Bullets do resumo; sem bullets, as frases dos parágrafos (títulos ignorados)"""
+    statements = []
+    for line in summary_content.splitlines():
+        match = BULLET_PATTERN.match(line)
+        if match:
+            statements.append(match.group(1).strip("*_ "))
+    if statements:
+        return statements
+    for line in summary_content.splitlines():
+        if line.strip() and not line.lstrip().startswith("#"):
+            statements.extend(s.strip() for s in SENTENCE_PATTERN.split(line.strip()) if s.strip())
+    return statements
+
+def corpus_terms(documents: Sequence[str]) -> Tuple[Dict[str, int], np.ndarray, np.ndarray]:
+    """Tokeniza o corpus inteiro em uma chamada: (vocabulário, documento de cada ocorrência, id do termo)"""
+    # NUL separa os documentos; stopwords e tokens de 1 caractere viram -1, o separador -2
+    corpus = DOCUMENT_SEPARATOR.join(text.replace(DOCUMENT_SEPARATOR, " ") for text in documents)
+    tokens = CORPUS_TOKEN_PATTERN.findall(corpus.lower())
+
+    vocabulary: Dict[str, int] = {}
+    token_ids = {DOCUMENT_SEPARATOR: -2}
+    for token in dict.fromkeys(tokens):  # ordem de primeira ocorrência: ids determinísticos
+        if token == DOCUMENT_SEPARATOR:
+            continue
+        if len(token) > 1 and token not in STOPWORDS:
+            token_ids[token] = vocabulary.setdefault(token, len(vocabulary))
+        else:
+            token_ids[token] = -1
+    ids = np.fromiter(map(token_ids.__getitem__, tokens), dtype=np.int64, count=len(tokens))
+    doc_of_token = np.cumsum(ids == -2)
+    keep = ids >= 0
+    return vocabulary, doc_of_token[keep], ids[keep]
+
+class BM25Index:
+    """Índice invertido BM25 em matriz esparsa (documentos × termos)"""
+
+    def __init__(self, documents: Sequence[str], k1: float = 1.5, b: float = 0.75):
+        self.vocabulary, rows, cols = corpus_terms(documents)
+
+        shape = (len(documents), len(self.vocabulary))
+        tf = csr_matrix((np.ones(len(cols), dtype=np.float32), (rows, cols)), shape=shape)  # duplicatas somadas
+        tf.sum_duplicates()
+        doc_lengths = np.bincount(rows, minlength=shape[0]).astype(np.float32)
+        document_frequency = np.bincount(tf.indices, minlength=shape[1])
+        idf = np.log1p((shape[0] - document_frequency + 0.5) / (document_frequency + 0.5)).astype(np.float32)
+
+        # Pesos BM25 pré-calculados por (documento, termo); a consulta vira uma soma de colunas
+        average_length = float(doc_lengths.mean()) if shape[0] and doc_lengths.mean() > 0 else 1.0
+        length_norm = k1 * (1 - b + b * doc_lengths / average_length)
+        row_of_entry = np.repeat(np.arange(shape[0]), np.diff(tf.indptr))
+        tf.data = tf.data * (k1 + 1) / (tf.data + length_norm[row_of_entry]) * idf[tf.indices]
+        self.weights = tf.tocsc()
+
+    def __len__(self) -> int:
+        return self.weights.shape[0]
+
+    def score(self, query: str) -> np.ndarray:
+        """Score BM25 de todos os documentos para a consulta"""
+        term_ids = sorted({self.vocabulary[term] for term in tokenize(query) if term in self.vocabulary})
+        if not term_ids:
+            return np.zeros(len(self), dtype=np.float32)
+        return np.asarray(self.weights[:, term_ids].sum(axis=1)).ravel()
+
+    def top(self, query: str, k: int) -> List[tuple]:
+        """[(índice do documento, score)] dos k melhores com score positivo"""
+        scores = self.score(query)
+        if not len(scores):
+            return []
+        k = min(k, len(scores))
+        candidates = np.argpartition(-scores, k - 1)[:k]
+        ranked = candidates[np.argsort(-scores[candidates])]
+        return [(int(index), float(scores[index])) for index in ranked if scores[index] > 0]
+
+class EvidenceLinker:
+    """Liga cada afirmação do resumo às mensagens de melhor evidência"""
+
+    def __init__(self, per_statement: int = 3):
+        self.per_statement = per_statement
+
+    def link(self, summary_content: str, messages: List[Message],
+             relevance_scores: Optional[List] = None) -> List[Dict[str, Any]]:
+        statements = extract_statements(summary_content)
+        if not statements or not messages:
+            return []
+
+        index = BM25Index([message.content for message in messages])
+        score_map = {score.message_id: score for score in relevance_scores or []}
+
+        citations = []
+        for statement_index, statement in enumerate(statements):
+            for position, evidence_score in index.top(statement, self.per_statement):
+                message = messages[position]
+                citation = {
+                    "statement": statement,
+                    "statement_index": statement_index,
+                    "evidence_score": round(evidence_score, 3),
+                    "message_id": message.id,
+                    "telegram_message_id": message.telegram_message_id,
+                    "author": message.author,
+                    "timestamp": message.timestamp.isoformat(),
+                    "content_preview": message.content[:200] + "..." if len(message.content) > 200 else message.content,
+                }
+                relevance = score_map.get(message.id)
+                if relevance:
+                    citation.update(relevance_score=relevance.score, category=relevance.category)
+                citations.append(citation)
+
+        logger.info(f"Linked {len(statements)} summary statements to {len(citations)} source messages")
+        return citations
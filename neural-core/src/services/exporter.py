@@ -0,0 +1,250 @@
+import json
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List, Optional
+
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+from sqlalchemy import select
+
+from models import Message, MessageRelevance, Project, Summary
+from services.archive import arrow_schema
+from services.relevance_analyzer import RelevanceAnalyzer
+from utils.json_codec import decode_json
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = {"parquet": ".parquet", "arrow": ".arrow", "jsonl": ".jsonl"}
+EXPORT_DATASETS = ("messages", "relevance", "summaries")
+
+# Colunas do dataset de relevância além das da mensagem
+RELEVANCE_FIELDS = [
+    ("score", pa.float64()),
+    ("category", pa.string()),
+    ("confidence", pa.float64()),
+    ("keywords", pa.list_(pa.string())),
+    ("reasoning", pa.string()),
+]
+RELEVANCE_MESSAGE_COLUMNS = ["id", "telegram_message_id", "timestamp", "author", "content"]
+RELEVANCE_DEFAULT_COLUMNS = ["id", "telegram_message_id", "timestamp", "author",
+                             "score", "category", "confidence", "keywords", "reasoning"]
+STORED_SCORE_CHUNK = 500
+
+SUMMARY_JSON_COLUMNS = ("summary_metadata", "citations")
+
+def _plain_json(text: Optional[str]) -> Optional[str]:
+    value = decode_json(text)
+    return None if value is None else json.dumps(value, ensure_ascii=False)
+
+def detect_format(output: str, export_format: Optional[str] = None) -> str:
+    """Formato explícito ou inferido pela extensão do arquivo"""
+    if export_format:
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown format '{export_format}' (use {', '.join(EXPORT_FORMATS)})")
+        return export_format
+    suffix = Path(output).suffix.lower()
+    for name, extension in EXPORT_FORMATS.items():
+        if suffix == extension or (name == "arrow" and suffix in (".ipc", ".feather")):
+            return name
+    raise ValueError(f"Cannot infer export format from '{output}' (use --format)")
+
+@dataclass
+class ExportResult:
+    """Resultado de uma exportação"""
+    dataset: str
+    path: Path
+    export_format: str
+    rows: int
+    bytes_written: int
+
+class _TableWriter:
+    """Escreve tabelas Arrow incrementalmente em Parquet, Arrow IPC ou JSONL"""
+
+    def __init__(self, path: Path, schema: pa.Schema, export_format: str, compression: str):
+        self.export_format = export_format
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if export_format == "parquet":
+            self._writer = pq.ParquetWriter(path, schema, compression=compression)
+        elif export_format == "arrow":
+            options = ipc.IpcWriteOptions(compression=compression if compression in ("zstd", "lz4") else None)
+            self._writer = ipc.new_file(str(path), schema, options=options)
+        else:
+            self._file = open(path, 'w', encoding='utf-8')
+
+    def write(self, table: pa.Table):
+        if self.export_format == "jsonl":
+            for row in table.to_pylist():
+                self._file.write(json.dumps(row, ensure_ascii=False, default=lambda v: v.isoformat()) + "\n")
+        else:
+            self._writer.write_table(table)
+
+    def close(self):
+        if self.export_format == "jsonl":
+            self._file.close()
+        else:
+            self._writer.close()
+
+class DataExporter:
+    """Exporta mensagens, relevância e resumos em lotes, sem materializar o projeto inteiro"""
+
+    def __init__(self, db, batch_size: Optional[int] = None):
+        self.db = db
+        self.config = db.config
+        self.batch_size = batch_size or self.config.EXPORT_BATCH_SIZE
+        self.relevance_analyzer = RelevanceAnalyzer()
+        self._has_stored_scores: Optional[bool] = None
+
+    def available_columns(self, dataset: str) -> List[str]:
+        if dataset == "messages":
+            return [column.name for column in Message.__table__.columns]
+        if dataset == "relevance":
+            return RELEVANCE_MESSAGE_COLUMNS + [name for name, _ in RELEVANCE_FIELDS]
+        if dataset == "summaries":
+            return [column.name for column in Summary.__table__.columns]
+        raise ValueError(f"Unknown dataset '{dataset}' (use {', '.join(EXPORT_DATASETS)})")
+
+    def _select_columns(self, dataset: str, columns: Optional[List[str]]) -> List[str]:
+        available = self.available_columns(dataset)
+        if not columns:
+            return RELEVANCE_DEFAULT_COLUMNS if dataset == "relevance" else available
+        unknown = [name for name in columns if name not in available]
+        if unknown:
+            raise ValueError(f"Unknown columns for {dataset}: {', '.join(unknown)} (available: {', '.join(available)})")
+        return columns
+
+    def _schema(self, dataset: str, columns: List[str]) -> pa.Schema:
+        if dataset == "summaries":
+            return arrow_schema([Summary.__table__.c[name] for name in columns])
+        message_columns = RELEVANCE_MESSAGE_COLUMNS if dataset == "relevance" else columns
+        full = arrow_schema([Message.__table__.c[name] for name in message_columns])
+        if dataset == "relevance":
+            full = pa.schema(list(full) + [pa.field(name, kind) for name, kind in RELEVANCE_FIELDS])
+        return pa.schema([full.field(name) for name in columns])
+
+    def _stream_rows(self, statement) -> Iterator[List[Dict[str, Any]]]:
+        """Cursor em lotes de EXPORT_BATCH_SIZE linhas (sem objetos ORM)"""
+        with self.db.engine.connect() as connection:
+            result = connection.execution_options(stream_results=True).execute(statement)
+            while True:
+                rows = result.mappings().fetchmany(self.batch_size)
+                if not rows:
+                    return
+                yield [dict(row) for row in rows]
+
+    def _message_tables(self, project: Project, columns: List[str], start: Optional[datetime],
+                        end: Optional[datetime]) -> Iterator[pa.Table]:
+        """Mensagens em ordem cronológica: primeiro as arquivadas, depois as do banco"""
+        table = Message.__table__
+        schema = self._schema("messages", columns)
+
+        archived_before = project.archived_before
+        if archived_before and (not start or start < archived_before):
+            archive_end = min(end, archived_before) if end else archived_before
+            yield from self.db.archive.iter_batches(project.id, start, archive_end, columns, self.batch_size)
+
+        statement = select(*[table.c[name] for name in columns]).where(table.c.project_id == project.id)
+        if "content" in columns:
+            if "content_id" not in columns:
+                statement = statement.add_columns(table.c.content_id)
+            statement = self.db.content_store.with_content(statement)
+        if "author" in columns and "author_id" not in columns:
+            statement = statement.add_columns(table.c.author_id)
+        if start:
+            statement = statement.where(table.c.timestamp >= start)
+        if end:
+            statement = statement.where(table.c.timestamp <= end)
+        statement = statement.order_by(table.c.timestamp)
+        for rows in self._stream_rows(statement):
+            if "content" in columns or "author" in columns:
+                rows = self.db.message_rows(rows)
+            yield pa.Table.from_pylist(rows, schema=schema)
+
+    def _stored_scores(self, project: Project, message_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """Scores gravados pelo `rescore` com as regras atuais ({} se o projeto não tem nenhum)"""
+        table = MessageRelevance.__table__
+        current = (table.c.project_id == project.id) & (table.c.rules_version == self.relevance_analyzer.rules_version)
+        stored = {}
+        with self.db.engine.connect() as connection:
+            if self._has_stored_scores is None:
+                self._has_stored_scores = connection.execute(select(table.c.id).where(current).limit(1)).first() is not None
+            if not self._has_stored_scores:
+                return stored
+            for start in range(0, len(message_ids), STORED_SCORE_CHUNK):
+                statement = select(table.c.message_id, table.c.score, table.c.category, table.c.confidence,
+                                   table.c.keywords, table.c.reasoning).where(
+                    current, table.c.message_id.in_(message_ids[start:start + STORED_SCORE_CHUNK]))
+                for row in connection.execute(statement).mappings():
+                    stored[row["message_id"]] = {**row, "keywords": row["keywords"].split(",") if row["keywords"] else []}
+        return stored
+
+    def _relevance_tables(self, project: Project, columns: List[str], start: Optional[datetime],
+                          end: Optional[datetime]) -> Iterator[pa.Table]:
+        schema = self._schema("relevance", RELEVANCE_MESSAGE_COLUMNS + [name for name, _ in RELEVANCE_FIELDS])
+        self._has_stored_scores = None
+        for chunk in self._message_tables(project, RELEVANCE_MESSAGE_COLUMNS, start, end):
+            rows = chunk.to_pylist()
+            # Scores do último rescore quando estão em dia com as regras; o resto é pontuado aqui
+            stored = self._stored_scores(project, [row["id"] for row in rows])
+            missing = [row for row in rows if row["id"] not in stored]
+            scores = self.relevance_analyzer.analyze_messages_batch([SimpleNamespace(**row) for row in missing])
+            for row, score in zip(missing, scores):
+                row.update(score=score.score, category=score.category, confidence=score.confidence,
+                           keywords=score.keywords, reasoning=score.reasoning)
+            for row in rows:
+                if row["id"] in stored:
+                    row.update({name: stored[row["id"]][name] for name, _ in RELEVANCE_FIELDS})
+            yield pa.Table.from_pylist(rows, schema=schema).select(columns)
+
+    def _summary_tables(self, project: Project, columns: List[str], start: Optional[datetime],
+                        end: Optional[datetime]) -> Iterator[pa.Table]:
+        table = Summary.__table__
+        schema = self._schema("summaries", columns)
+        statement = select(*[table.c[name] for name in columns]).where(table.c.project_id == project.id)
+        # Resumos cujo período intersecta o intervalo pedido
+        if start:
+            statement = statement.where(table.c.date_range_end >= start)
+        if end:
+            statement = statement.where(table.c.date_range_start <= end)
+        json_columns = [name for name in SUMMARY_JSON_COLUMNS if name in columns]
+        for rows in self._stream_rows(statement.order_by(table.c.created_at)):
+            if json_columns:
+                # Blobs "z:<base64>" (encode_json) saem como JSON legível
+                for row in rows:
+                    for name in json_columns:
+                        row[name] = _plain_json(row[name])
+            yield pa.Table.from_pylist(rows, schema=schema)
+
+    def export(self, project: Project, dataset: str, output: str, export_format: Optional[str] = None,
+               columns: Optional[List[str]] = None, start: Optional[datetime] = None,
+               end: Optional[datetime] = None, compression: str = "zstd") -> ExportResult:
+        """Exporta um dataset do projeto para `output`, lote a lote"""
+        export_format = detect_format(output, export_format)
+        columns = self._select_columns(dataset, columns)
+        tables = {
+            "messages": self._message_tables,
+            "relevance": self._relevance_tables,
+            "summaries": self._summary_tables,
+        }[dataset](project, columns, start, end)
+
+        path = Path(output)
+        writer = None
+        rows = 0
+        try:
+            for table in tables:
+                if writer is None:
+                    writer = _TableWriter(path, table.schema, export_format, compression)
+                writer.write(table)
+                rows += table.num_rows
+            if writer is None:
+                # Nenhuma linha: ainda assim gera um arquivo válido com o schema
+                writer = _TableWriter(path, self._schema(dataset, columns), export_format, compression)
+        finally:
+            if writer:
+                writer.close()
+
+        logger.info(f"Exported {rows} {dataset} rows of {project.name} to {path}")
+        return ExportResult(dataset, path, export_format, rows, path.stat().st_size)
@@ -0,0 +1,153 @@
+"""
+Roteamento de modelos dentro do orçamento de um resumo
+
+Um resumo tem até dois estágios:
+- `topic_notes` (em lote): quando o período não cabe em PROMPT_TOKEN_BUDGET, o modelo
+  barato BULK_MODEL resume, por tópico, as mensagens que ficaram fora da amostra;
+- `synthesis`: o modelo principal escreve o resumo com a amostra de cada tópico e as notas.
+
+O plano usa o modelo de síntese mais forte de SUMMARY_MODELS cujo custo cabe em
+MAX_COST_PER_SUMMARY (e a latência em SUMMARY_MAX_SECONDS, quando configurado).
+Se nenhum cabe, descarta as notas e depois corta o contexto da síntese pela metade
+até caber, parando em MIN_PROMPT_TOKENS. Tokens vêm da calibração do registro de uso.
+"""
+import math
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from services.usage_ledger import Calibration, UsageLedger, model_value, parse_model_values
+
+# Cabeçalho de cada mensagem no prompt ("[2024-01-01 12:00] autor: ") e separador
+MESSAGE_OVERHEAD_CHARS = 40
+# Instruções e cabeçalho do tópico em cada chamada do estágio em lote
+NOTES_PROMPT_TOKENS = 80
+DEFAULT_SECONDS_PER_1K_OUTPUT = 20.0
+
+@dataclass
+class PlanStep:
+    """Um estágio do plano"""
+    stage: str  # topic_notes ou synthesis
+    model: str
+    calls: int
+    prompt_tokens: int
+    output_tokens: int
+    cost: float
+    seconds: float
+    prompt_chars: int = 0  # síntese: tamanho previsto do prompt (calibração)
+
+@dataclass
+class SummaryPlan:
+    """Modelos, tokens e custo previstos de um resumo"""
+    steps: List[PlanStep]
+    prompt_token_budget: int  # tokens de mensagens na síntese (0 = sem limite)
+    max_cost: float
+    fits: bool = True
+    notes: List[str] = field(default_factory=list)
+
+    @property
+    def synthesis(self) -> PlanStep:
+        return self.steps[-1]
+
+    @property
+    def bulk(self) -> Optional[PlanStep]:
+        return self.steps[0] if len(self.steps) > 1 else None
+
+    @property
+    def total_cost(self) -> float:
+        return sum(step.cost for step in self.steps)
+
+    @property
+    def seconds(self) -> float:
+        return sum(step.seconds for step in self.steps)
+
+class ModelRouter:
+    """Monta o plano de um resumo a partir dos totais do período"""
+
+    def __init__(self, config, usage_ledger: UsageLedger):
+        self.config = config
+        self.usage_ledger = usage_ledger
+        self.synthesis_models = [model.strip() for model in config.SUMMARY_MODELS.split(",") if model.strip()] \
+            or [config.DEFAULT_MODEL]
+        self.bulk_model = config.BULK_MODEL.strip()
+        self.latency = parse_model_values(config.MODEL_LATENCY)
+
+    def seconds(self, model: str, output_tokens: int) -> float:
+        """Latência prevista: MODEL_LATENCY em segundos por 1K tokens gerados"""
+        return output_tokens / 1000 * model_value(self.latency, model, DEFAULT_SECONDS_PER_1K_OUTPUT)
+
+    def plan(self, project_id: int, message_count: int, message_chars: int, template_chars: int,
+             max_cost: Optional[float] = None, calibrations: Optional[Dict[str, Calibration]] = None) -> SummaryPlan:
+        """Plano mais forte que cabe no orçamento; `fits=False` se nem o menor contexto cabe
+
+        `calibrations` (modelo -> Calibration do projeto) pode ser compartilhado entre planos do mesmo projeto.
+        """
+        max_cost = self.config.MAX_COST_PER_SUMMARY if max_cost is None else max_cost
+        max_seconds = self.config.SUMMARY_MAX_SECONDS
+        formatted_chars = message_chars + message_count * MESSAGE_OVERHEAD_CHARS
+        calibrations = {} if calibrations is None else calibrations
+
+        def calibration(model: str) -> Calibration:
+            if model not in calibrations:
+                calibrations[model] = self.usage_ledger.calibration(project_id, model)
+            return calibrations[model]
+
+        def build(model: str, budget: int, with_notes: bool) -> SummaryPlan:
+            steps = []
+            messages_chars = min(formatted_chars, budget * 4) if budget > 0 else formatted_chars
+            leftover_chars = formatted_chars - messages_chars
+            notes_tokens = 0
+            if with_notes and self.bulk_model and leftover_chars > 0:
+                bulk = calibration(self.bulk_model)
+                tokens = round(leftover_chars / bulk.chars_per_token)
+                calls = math.ceil(tokens / self.config.BULK_CHUNK_TOKENS)
+                prompt_tokens = tokens + calls * NOTES_PROMPT_TOKENS
+                notes_tokens = calls * self.config.BULK_NOTE_TOKENS
+                rounds = math.ceil(calls / max(1, self.config.BULK_CONCURRENCY))
+                steps.append(PlanStep(
+                    "topic_notes", self.bulk_model, calls, prompt_tokens, notes_tokens,
+                    self.usage_ledger.cost(self.bulk_model, prompt_tokens, notes_tokens),
+                    rounds * self.seconds(self.bulk_model, self.config.BULK_NOTE_TOKENS)
+                ))
+            synthesis = calibration(model)
+            prompt_chars = messages_chars + template_chars + notes_tokens * 4
+            prompt_tokens = round(prompt_chars * synthesis.prompt_scale / synthesis.chars_per_token)
+            output_tokens = synthesis.output_tokens
+            steps.append(PlanStep(
+                "synthesis", model, 1, prompt_tokens, output_tokens,
+                self.usage_ledger.cost(model, prompt_tokens, output_tokens),
+                self.seconds(model, output_tokens), prompt_chars
+            ))
+            return SummaryPlan(steps, budget, max_cost)
+
+        budget = self.config.PROMPT_TOKEN_BUDGET
+        preferred = self.synthesis_models[0]
+        cheapest = self.synthesis_models[-1]
+        candidates = [(model, True) for model in self.synthesis_models] + [(cheapest, False)]
+        for check_latency in ([True, False] if max_seconds > 0 else [False]):
+            for model, with_notes in candidates:
+                plan = build(model, budget, with_notes)
+                if plan.total_cost > max_cost or (check_latency and plan.seconds > max_seconds):
+                    continue
+                limit = "the cost and latency budget" if check_latency else "the budget"
+                if model != preferred:
+                    plan.notes.append(f"synthesis downgraded {preferred} → {model} to fit {limit}")
+                if not with_notes and self.bulk_model and formatted_chars > budget * 4 > 0:
+                    plan.notes.append(f"topic notes skipped to fit {limit}")
+                if max_seconds > 0 and not check_latency:
+                    plan.notes.append(f"no plan finishes within {max_seconds:.0f}s; chose by cost only")
+                return plan
+
+        # Nenhum modelo cabe com o contexto inteiro: reduz o contexto da síntese
+        budget = budget if budget > 0 else math.ceil(formatted_chars / 4)
+        while budget > self.config.MIN_PROMPT_TOKENS:
+            budget = max(budget // 2, self.config.MIN_PROMPT_TOKENS)
+            plan = build(cheapest, budget, False)
+            if plan.total_cost <= max_cost:
+                if cheapest != preferred:
+                    plan.notes.append(f"synthesis downgraded {preferred} → {cheapest} to fit the budget")
+                plan.notes.append(f"context shrunk to {budget:,} message tokens to fit the budget")
+                return plan
+        plan = build(cheapest, budget, False)
+        plan.fits = False
+        plan.notes.append(f"exceeds ${max_cost:,.4f} even with {cheapest} and {budget:,} message tokens")
+        return plan
@@ -1,9 +1,10 @@
 """
 Serviço para análise de relevância de mensagens
 """
+import hashlib
 import json
 import logging
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
 from dataclasses import dataclass
 
@@ -24,6 +25,9 @@ class RelevanceScore:
 class RelevanceAnalyzer:
     """Analisador de relevância de mensagens"""
     
+    # Incrementar ao mudar pesos/regras de analyze_message_relevance (as listas entram no hash sozinhas)
+    SCORING_REVISION = 1
+    
     def __init__(self):
         self.high_relevance_keywords = [
             # Anúncios oficiais
@@ -48,12 +52,30 @@ class RelevanceAnalyzer:
             "admin", "moderator", "official", "team", "founder", "ceo",
             "developer", "core team", "taraxa", "project"
         ]
+        self._admin_authors: Dict[str, bool] = {}  # Autores já classificados (poucos, repetem muito)
+
+    @property
+    def rules_version(self) -> str:
+        """Hash das regras atuais: scores gravados com outra versão estão desatualizados"""
+        rules = json.dumps([self.SCORING_REVISION, self.high_relevance_keywords,
+                            self.spam_keywords, self.admin_indicators])
+        return hashlib.blake2b(rules.encode("utf-8"), digest_size=6).hexdigest()
+
+    def is_admin_author(self, author: Optional[str]) -> bool:
+        """Autor admin/oficial pelos indicadores no nome (uma varredura por autor distinto)"""
+        if not author:
+            return False
+        is_admin = self._admin_authors.get(author)
+        if is_admin is None:
+            lowered = author.lower()
+            is_admin = any(indicator in lowered for indicator in self.admin_indicators)
+            self._admin_authors[author] = is_admin
+        return is_admin
 
     def analyze_message_relevance(self, message: Message) -> RelevanceScore:
         """Analisa a relevância de uma mensagem individual"""
         
         content = message.content.lower()
-        author = message.author.lower() if message.author else ""
         
         # Score base
         score = 50.0
@@ -63,8 +85,7 @@ class RelevanceAnalyzer:
         reasoning_parts = []
         
         # Verificar se é admin/official
-        is_admin = any(indicator in author for indicator in self.admin_indicators)
-        if is_admin:
+        if self.is_admin_author(message.author):
             score += 30
             category = "announcement"
             confidence += 0.3
@@ -0,0 +1,95 @@
+"""
+Threads de respostas: a conversa como unidade do prompt
+
+O Oracle Eye grava em cada mensagem `reply_to_message_id` e `thread_id` (a raiz da
+thread, resolvida na ingestão). As mensagens de um período viram threads:
+- threads sem nenhuma mensagem com conteúdo ("gm" / "gm" / "lol") são descartadas;
+- threads longas mostram o início e o fim, e as respostas do meio ficam para as notas;
+- cada thread fica inteira em um tópico e entra (ou não) inteira no orçamento de tokens.
+"""
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+from models import Message
+from services.topic_clustering import OTHER_TOPIC_LABEL, Topic
+
+@dataclass
+class Thread:
+    """Mensagens de uma thread em ordem cronológica; `shown` vai para o prompt"""
+    root_id: int
+    messages: List[Message]
+    shown: List[Message] = field(default_factory=list)
+    head: int = 0  # mensagens de `shown` antes das omitidas
+
+    @property
+    def message_count(self) -> int:
+        return len(self.messages)
+
+    @property
+    def omitted(self) -> List[Message]:
+        return self.messages[self.head:self.message_count - (len(self.shown) - self.head)]
+
+    def collapse(self, max_messages: int) -> "Thread":
+        """Mostra as primeiras e as últimas mensagens de uma thread com mais de `max_messages`"""
+        if max_messages <= 0 or self.message_count <= max_messages:
+            self.shown, self.head = list(self.messages), self.message_count
+            return self
+        self.head = (max_messages + 1) // 2
+        self.shown = self.messages[:self.head] + self.messages[self.message_count - (max_messages - self.head):]
+        return self
+
+    def goes_nowhere(self, min_chars: int) -> bool:
+        """Respostas sem nenhuma mensagem com pelo menos `min_chars` caracteres"""
+        return self.message_count > 1 and max(len(message.content.strip()) for message in self.messages) < min_chars
+
+def thread_key(message: Message) -> int:
+    """Raiz da thread (linhas anteriores ao thread_id: a mensagem respondida ou a própria)"""
+    if message.thread_id is not None:
+        return message.thread_id
+    return message.reply_to_message_id or message.telegram_message_id
+
+def build_threads(messages: List[Message], max_messages: int = 0) -> List[Thread]:
+    """Threads das mensagens, em ordem da primeira mensagem de cada uma"""
+    grouped: Dict[int, List[Message]] = {}
+    for message in messages:
+        grouped.setdefault(thread_key(message), []).append(message)
+    threads = [
+        Thread(root_id, sorted(members, key=lambda m: (m.timestamp, m.telegram_message_id))).collapse(max_messages)
+        for root_id, members in grouped.items()
+    ]
+    threads.sort(key=lambda thread: thread.messages[0].timestamp)
+    return threads
+
+def assign_threads(topics: List[Topic], threads: List[Thread]) -> List[Topic]:
+    """Põe cada thread inteira no tópico com mais mensagens dela (empate: onde ela é mais representativa)
+
+    As threads de um tópico seguem a posição da sua mensagem mais representativa e
+    `topic.messages` passa a ser a concatenação delas. Tópicos que ficam vazios saem.
+    """
+    position = {}
+    for index, topic in enumerate(topics):
+        for rank, message in enumerate(topic.messages):
+            position[id(message)] = (index, rank)
+    assigned: List[List[tuple]] = [[] for _ in topics]
+    for thread in threads:
+        places = [position[id(message)] for message in thread.messages if id(message) in position]
+        if not places:
+            continue
+        counts = Counter(index for index, _ in places)
+        best = {}
+        for index, rank in places:
+            best[index] = min(rank, best.get(index, rank))
+        index = max(counts, key=lambda i: (counts[i], -best[i]))
+        assigned[index].append((best[index], thread))
+
+    result = []
+    for topic, members in zip(topics, assigned):
+        if not members:
+            continue
+        members.sort(key=lambda item: item[0])
+        topic.threads = [thread for _, thread in members]
+        topic.messages = [message for thread in topic.threads for message in thread.messages]
+        result.append(topic)
+    result.sort(key=lambda topic: (topic.label == OTHER_TOPIC_LABEL, -topic.message_count))
+    return result
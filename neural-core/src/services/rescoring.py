@@ -0,0 +1,176 @@
+"""
+Rescore de relevância em paralelo
+
+As mensagens do projeto são divididas em faixas de id (`rescorerange`); cada
+faixa é pontuada por um processo de um ProcessPoolExecutor, que lê as mensagens
+direto do banco e grava os scores em `messagerelevance` em lotes. A faixa é
+marcada como concluída na transação do último lote: uma execução interrompida
+retoma das faixas pendentes da mesma versão das regras (RelevanceAnalyzer.rules_version).
+Mensagens já arquivadas em Parquet ficam de fora (são pontuadas na exportação).
+"""
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from models import Message, MessageRelevance, Project, RescoreRange
+from services.relevance_analyzer import RelevanceAnalyzer
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class RescoreResult:
+    """Resultado de `RelevanceRescorer.run`"""
+    rules_version: str
+    workers: int
+    ranges: int = 0  # pontuadas nesta execução
+    ranges_skipped: int = 0  # já concluídas numa execução anterior
+    messages: int = 0
+    seconds: float = 0.0
+
+    @property
+    def messages_per_second(self) -> float:
+        return self.messages / self.seconds if self.seconds else 0.0
+
+def score_range(db, range_id: int, project_id: int, first_id: int, last_id: int, batch_size: int) -> int:
+    """Pontua as mensagens de uma faixa de ids; retorna quantas foram gravadas"""
+    analyzer = RelevanceAnalyzer()
+    rules_version = analyzer.rules_version
+    table = Message.__table__
+    relevance = MessageRelevance.__table__
+    insert = postgresql_insert if db.engine.dialect.name == "postgresql" else sqlite_insert
+    scored, after = 0, first_id - 1
+    while True:
+        statement = db.content_store.with_content(
+            select(table.c.id, table.c.content, table.c.content_id, table.c.author, table.c.author_id)
+        ).where(
+            table.c.project_id == project_id, table.c.id > after, table.c.id <= last_id
+        ).order_by(table.c.id).limit(batch_size)
+        with db.engine.connect() as connection:
+            rows = db.message_rows(connection.execute(statement).mappings().all())
+        now = datetime.utcnow()
+        values = []
+        for row in rows:
+            score = analyzer.analyze_message_relevance(SimpleNamespace(**row))
+            values.append({"message_id": row["id"], "project_id": project_id, "rules_version": rules_version,
+                           "score": score.score, "category": score.category, "confidence": score.confidence,
+                           "keywords": ",".join(score.keywords), "reasoning": score.reasoning, "scored_at": now})
+        done = len(rows) < batch_size
+        with db.engine.begin() as connection:
+            if values:
+                upsert = insert(relevance)
+                connection.execute(upsert.on_conflict_do_update(
+                    index_elements=["message_id"],
+                    set_={name: upsert.excluded[name] for name in
+                          ("rules_version", "score", "category", "confidence", "keywords", "reasoning", "scored_at")}
+                ), values)
+            scored += len(values)
+            if done:
+                connection.execute(RescoreRange.__table__.update().where(RescoreRange.__table__.c.id == range_id)
+                                   .values(scored=scored, completed_at=now))
+                return scored
+        after = rows[-1]["id"]
+
+# Estado de cada processo do pool: um DatabaseManager (engine e caches próprios) por worker
+_worker_db = None
+
+def _init_worker(db_url: str):
+    global _worker_db
+    from services.database import DatabaseManager
+    _worker_db = DatabaseManager(db_url)
+
+def _score_range_in_worker(*args) -> int:
+    return score_range(_worker_db, *args)
+
+class RelevanceRescorer:
+    """Planeja as faixas de um projeto e as pontua em paralelo"""
+
+    def __init__(self, db, workers: Optional[int] = None, range_size: Optional[int] = None,
+                 batch_size: Optional[int] = None):
+        self.db = db
+        config = db.config
+        self.workers = workers or config.RESCORE_WORKERS or os.cpu_count() or 1
+        self.range_size = range_size or config.RESCORE_RANGE_SIZE
+        self.batch_size = batch_size or config.RESCORE_BATCH_SIZE
+
+    def _range_starts(self, connection, project_id: int, after: int) -> List[int]:
+        """Primeiro id de cada bloco de `range_size` mensagens com id > after"""
+        table = Message.__table__
+        numbered = select(table.c.id, func.row_number().over(order_by=table.c.id).label("position")).where(
+            table.c.project_id == project_id, table.c.id > after
+        ).subquery()
+        return list(connection.execute(
+            select(numbered.c.id).where((numbered.c.position - 1) % self.range_size == 0).order_by(numbered.c.id)
+        ).scalars())
+
+    def plan(self, project: Project, rules_version: str, restart: bool = False) -> Tuple[List[tuple], int]:
+        """Faixas pendentes [(id, first_id, last_id)] e quantas já estavam concluídas
+
+        Mensagens novas desde a última execução (id acima da última faixa) ganham faixas novas.
+        """
+        ranges = RescoreRange.__table__
+        message_table = Message.__table__
+        with self.db.engine.begin() as connection:
+            of_run = (ranges.c.project_id == project.id) & (ranges.c.rules_version == rules_version)
+            if restart:
+                connection.execute(delete(ranges).where(of_run))
+            planned_until = connection.execute(select(func.max(ranges.c.last_id)).where(of_run)).scalar() or 0
+            last_message = connection.execute(
+                select(func.max(message_table.c.id)).where(message_table.c.project_id == project.id)
+            ).scalar() or 0
+            if last_message > planned_until:
+                starts = self._range_starts(connection, project.id, planned_until)
+                ends = [start - 1 for start in starts[1:]] + [last_message]
+                connection.execute(ranges.insert(), [
+                    {"project_id": project.id, "rules_version": rules_version, "first_id": first_id,
+                     "last_id": last_id, "scored": 0, "created_at": datetime.utcnow()}
+                    for first_id, last_id in zip(starts, ends)
+                ])
+            pending = [tuple(row) for row in connection.execute(
+                select(ranges.c.id, ranges.c.first_id, ranges.c.last_id)
+                .where(of_run, ranges.c.completed_at.is_(None)).order_by(ranges.c.first_id)
+            )]
+            completed = connection.execute(
+                select(func.count()).select_from(ranges).where(of_run, ranges.c.completed_at.is_not(None))
+            ).scalar()
+        return pending, completed
+
+    def run(self, project: Project, restart: bool = False,
+            progress: Optional[Callable[[int, int, int], None]] = None) -> RescoreResult:
+        """Pontua as faixas pendentes; `progress(faixas_feitas, faixas_total, mensagens)` a cada faixa"""
+        rules_version = RelevanceAnalyzer().rules_version
+        pending, completed = self.plan(project, rules_version, restart)
+        workers = max(1, min(self.workers, len(pending)))
+        result = RescoreResult(rules_version=rules_version, workers=workers, ranges_skipped=completed)
+        started = time.perf_counter()
+
+        def finished(scored: int):
+            result.ranges += 1
+            result.messages += scored
+            if progress:
+                progress(result.ranges, len(pending), result.messages)
+
+        if workers == 1:
+            for range_id, first_id, last_id in pending:
+                finished(score_range(self.db, range_id, project.id, first_id, last_id, self.batch_size))
+        else:
+            # spawn: processos limpos (sem conexões herdadas do pai), igual em Linux e Windows
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                     initializer=_init_worker, initargs=(self.db.db_url,)) as pool:
+                futures = [pool.submit(_score_range_in_worker, range_id, project.id, first_id, last_id, self.batch_size)
+                           for range_id, first_id, last_id in pending]
+                for future in as_completed(futures):
+                    finished(future.result())
+        result.seconds = time.perf_counter() - started
+        logger.info(f"Rescored {result.messages:,} messages of {project.name} in {result.ranges} ranges "
+                    f"({workers} workers, {result.messages_per_second:,.0f} messages/s)")
+        return result
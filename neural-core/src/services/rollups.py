@@ -0,0 +1,181 @@
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import bindparam, delete, func, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import select
+
+from models import ActivityRollup, AuthorRollup, Message
+from services.author_store import AuthorActivity, record_activity
+from services.relevance_analyzer import RelevanceAnalyzer
+
+logger = logging.getLogger(__name__)
+
+HIGH_RELEVANCE_THRESHOLD = 80.0
+
+def hour_bucket(timestamp: datetime) -> datetime:
+    """Início da hora (UTC, sem timezone) de um timestamp"""
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+@dataclass
+class HourlyActivity:
+    message_count: int = 0
+    link_count: int = 0
+    char_count: int = 0
+    spam_count: int = 0
+    high_relevance_count: int = 0
+
+class RollupAccumulator:
+    """Acumula deltas de atividade por hora/autor e os aplica em uma única transação"""
+
+    def __init__(self, project_id: int, relevance_analyzer: Optional[RelevanceAnalyzer] = None,
+                 count_authors: bool = True):
+        self.project_id = project_id
+        self.relevance_analyzer = relevance_analyzer or RelevanceAnalyzer()
+        self.count_authors = count_authors  # Totais globais em `author` (só na ingestão, não no rebuild)
+        self.hours: Dict[datetime, HourlyActivity] = {}
+        self.authors: Dict[Tuple[datetime, str], int] = {}
+        self.author_totals: Dict[int, AuthorActivity] = {}
+
+    def __len__(self) -> int:
+        return sum(activity.message_count for activity in self.hours.values())
+
+    def add(self, message):
+        """Conta uma mensagem (qualquer objeto com id, content, author, timestamp, message_type)"""
+        bucket = hour_bucket(message.timestamp)
+        activity = self.hours.setdefault(bucket, HourlyActivity())
+        score = self.relevance_analyzer.analyze_message_relevance(message)
+        activity.message_count += 1
+        activity.char_count += len(message.content)
+        if message.message_type == "link":
+            activity.link_count += 1
+        if score.category == "spam":
+            activity.spam_count += 1
+        if score.score >= HIGH_RELEVANCE_THRESHOLD:
+            activity.high_relevance_count += 1
+        if message.author:
+            key = (bucket, message.author)
+            self.authors[key] = self.authors.get(key, 0) + 1
+        author_id = getattr(message, "author_id", None)
+        if self.count_authors and author_id:
+            totals = self.author_totals.setdefault(author_id, AuthorActivity())
+            totals.message_count += 1
+            if score.category == "spam":
+                totals.spam_count += 1
+            if totals.last_seen_at is None or message.timestamp > totals.last_seen_at:
+                totals.last_seen_at = message.timestamp
+
+    def flush(self, connection):
+        """Soma os deltas nas tabelas de rollup e limpa o acumulador
+
+        Incrementos atômicos (INSERT ... ON CONFLICT DO UPDATE col = col + excluded.col):
+        escritores concorrentes (ingestão e `stats --rebuild`) não perdem deltas. Roda na
+        transação de `connection` (a mesma do INSERT das mensagens, na ingestão).
+        """
+        if not self.hours:
+            return
+        insert = postgresql_insert if connection.dialect.name == "postgresql" else sqlite_insert
+
+        # Autores novos na hora: só quem de fato inseriu a linha conta em distinct_authors
+        new_authors: Dict[datetime, int] = {}
+        if self.authors:
+            author_table = AuthorRollup.__table__
+            keys = sorted(self.authors)
+            created = connection.execute(
+                insert(author_table).on_conflict_do_nothing(
+                    index_elements=["project_id", "bucket_start", "author"]
+                ).returning(author_table.c.bucket_start),
+                [{"project_id": self.project_id, "bucket_start": bucket, "author": author, "message_count": 0}
+                 for bucket, author in keys]
+            )
+            for bucket in created.scalars():
+                new_authors[bucket] = new_authors.get(bucket, 0) + 1
+            connection.execute(
+                update(author_table).where(
+                    author_table.c.project_id == self.project_id,
+                    author_table.c.bucket_start == bindparam("bucket"),
+                    author_table.c.author == bindparam("author_name")
+                ).values(message_count=author_table.c.message_count + bindparam("messages")),
+                [{"bucket": bucket, "author_name": author, "messages": self.authors[(bucket, author)]}
+                 for bucket, author in keys]
+            )
+
+        activity_table = ActivityRollup.__table__
+        statement = insert(activity_table)
+        counters = ["message_count", "distinct_authors", "link_count", "char_count", "spam_count",
+                    "high_relevance_count"]
+        connection.execute(
+            statement.on_conflict_do_update(
+                index_elements=["project_id", "bucket_start"],
+                set_={name: activity_table.c[name] + statement.excluded[name] for name in counters}
+            ),
+            [{"project_id": self.project_id, "bucket_start": bucket,
+              "message_count": activity.message_count, "distinct_authors": new_authors.get(bucket, 0),
+              "link_count": activity.link_count, "char_count": activity.char_count,
+              "spam_count": activity.spam_count, "high_relevance_count": activity.high_relevance_count}
+             for bucket, activity in sorted(self.hours.items())]
+        )
+
+        record_activity(connection, self.author_totals)
+
+        self.hours.clear()
+        self.authors.clear()
+        self.author_totals.clear()
+
+def rebuild_rollups(db, project, flush_every: int = 50000, page_size: int = 10000) -> int:
+    """Recalcula os rollups do projeto a partir das mensagens (arquivo Parquet + banco)
+
+    Mensagens inseridas pelo Oracle Eye durante o rebuild (id acima do snapshot)
+    ficam com os deltas da própria ingestão.
+    """
+    message_table = Message.__table__
+    columns = ["id", "content", "content_id", "author", "author_id", "timestamp", "message_type"]
+    with db.engine.begin() as connection:
+        connection.execute(delete(ActivityRollup.__table__).where(ActivityRollup.__table__.c.project_id == project.id))
+        connection.execute(delete(AuthorRollup.__table__).where(AuthorRollup.__table__.c.project_id == project.id))
+        snapshot_id = connection.execute(
+            select(func.max(message_table.c.id)).where(message_table.c.project_id == project.id)
+        ).scalar() or 0
+
+    def archived_rows():
+        if project.archived_before:
+            for table in db.archive.iter_batches(project.id, None, project.archived_before, columns):
+                yield from table.to_pylist()
+
+    def live_rows():
+        # Páginas por id: nenhum cursor fica aberto durante os flushes (SQLite bloquearia o commit)
+        last_id = 0
+        while True:
+            statement = db.content_store.with_content(select(*[message_table.c[name] for name in columns])).where(
+                message_table.c.project_id == project.id,
+                message_table.c.id > last_id, message_table.c.id <= snapshot_id
+            ).order_by(message_table.c.id).limit(page_size)
+            with db.engine.connect() as connection:
+                rows = connection.execute(statement).mappings().all()
+            if not rows:
+                return
+            last_id = rows[-1]["id"]
+            yield from db.message_rows(rows)
+
+    accumulator = RollupAccumulator(project.id, count_authors=False)
+    total = 0
+    for rows in (archived_rows(), live_rows()):
+        for row in rows:
+            accumulator.add(SimpleNamespace(**row))
+            total += 1
+            # Limita a memória e o tamanho dos IN (...) do upsert
+            if total % flush_every == 0 or len(accumulator.hours) >= 500:
+                with db.engine.begin() as connection:
+                    accumulator.flush(connection)
+    with db.engine.begin() as connection:
+        accumulator.flush(connection)
+
+    db.update_project(project.id, rollups_complete_at=datetime.utcnow())
+    logger.info(f"Rebuilt activity rollups for project {project.id} from {total} messages")
+    return total
@@ -0,0 +1,443 @@
+"""
+Modo serviço do Neural Core: API HTTP local
+
+`serve` mantém um processo com o AIProcessor (LangChain/ChatOpenAI), o engine do
+banco e os caches (textos descomprimidos, autores, regras de relevância) já
+carregados, e responde em JSON a status, estimate, search e summarize num endereço
+local: http://127.0.0.1:porta ou unix:///caminho.sock. Com SERVICE_URL configurado,
+os comandos da CLI viram clientes finos desse processo.
+
+    GET  /status
+    POST /estimate   {"project", "days"}
+    POST /search     {"project", "query", "days", "limit"}
+    POST /summarize  {"project", "days", "fresh", "stream"}  -> eventos NDJSON
+
+Respostas de estimate e search ficam em memória por SERVICE_CACHE_TTL segundos,
+invalidadas quando o projeto recebe uma coleta nova (Project.last_collected_at).
+
+Toda requisição leva `Authorization: Bearer <token>` (SERVICE_TOKEN, ou o token que
+o serve gera e grava ao lado do socket / em SERVICE_TOKEN_FILE) e os POSTs exigem
+`Content-Type: application/json`. Sem SERVICE_TOKEN o serviço só escuta em loopback.
+"""
+import hmac
+import http.client
+import ipaddress
+import json
+import logging
+import os
+import secrets
+import socket
+import socketserver
+import threading
+import time
+from dataclasses import asdict
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from models import Project, Summary
+from services.digest_worker import find_fresh_digest
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SERVICE_URL = "http://127.0.0.1:8765"
+SUMMARY_DATETIME_FIELDS = ("date_range_start", "date_range_end", "created_at")
+
+class ServiceError(Exception):
+    """Erro de uma operação da API (vira a resposta HTTP com `status`)"""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+class ServiceUnavailable(Exception):
+    """Nenhum serviço escutando no endereço configurado"""
+
+def _encode(value: Any) -> bytes:
+    return json.dumps(value, ensure_ascii=False,
+                      default=lambda v: v.isoformat() if isinstance(v, datetime) else str(v)).encode("utf-8")
+
+def _parse_address(url: str) -> Tuple[Optional[str], Optional[Tuple[str, int]]]:
+    """(caminho do socket Unix, None) ou (None, (host, porta))"""
+    if url.startswith("unix://"):
+        return url[len("unix://"):], None
+    parsed = urlparse(url if "://" in url else f"http://{url}")
+    return None, (parsed.hostname or "127.0.0.1", parsed.port or 80)
+
+def _is_loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+def token_path(url: str, config) -> Path:
+    """Arquivo do token gerado pelo serve: ao lado do socket Unix, ou SERVICE_TOKEN_FILE"""
+    path, _ = _parse_address(url)
+    return Path(f"{path}.token") if path else Path(config.SERVICE_TOKEN_FILE)
+
+def read_token(url: str, config) -> Optional[str]:
+    """Token do serviço em `url`: SERVICE_TOKEN ou o arquivo gravado pelo serve"""
+    if config.SERVICE_TOKEN:
+        return config.SERVICE_TOKEN
+    try:
+        return token_path(url, config).read_text().strip() or None
+    except OSError:
+        return None
+
+def _write_token(path: Path, token: str):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    os.fchmod(fd, 0o600)  # arquivo de uma execução anterior pode ter outro modo
+    with os.fdopen(fd, "w") as f:
+        f.write(token)
+
+class NeuralCoreService:
+    """Estado residente do serviço e as operações expostas pela API"""
+
+    def __init__(self, db, ai_processor, cache_ttl: Optional[float] = None):
+        self.db = db
+        self.ai_processor = ai_processor
+        self.cache_ttl = db.config.SERVICE_CACHE_TTL if cache_ttl is None else cache_ttl
+        self.started_at = time.time()
+        self.requests = 0
+        self.cache_hits = 0
+        self._cache: Dict[tuple, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+
+    def project(self, name: str) -> Project:
+        project = self.db.get_project_by_name(name)
+        if not project:
+            raise ServiceError(f"Project '{name}' not found", 404)
+        return project
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def _cached(self, key: tuple, project: Project, compute: Callable[[], Any]) -> Any:
+        """Resposta em memória enquanto dentro do TTL e sem coleta nova no projeto"""
+        if self.cache_ttl <= 0:
+            return compute()
+        key = key + (project.last_collected_at, project.archived_before)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached and now - cached[0] < self.cache_ttl:
+                self.cache_hits += 1
+                return cached[1]
+        value = compute()
+        with self._lock:
+            # Entradas vencidas saem a cada gravação: o cache fica do tamanho das consultas recentes
+            self._cache = {k: v for k, v in self._cache.items() if now - v[0] < self.cache_ttl}
+            self._cache[key] = (now, value)
+        return value
+
+    def status(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "started_at": datetime.utcfromtimestamp(self.started_at),
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+            "database": self.db.engine.url.render_as_string(hide_password=True),
+            "model": self.ai_processor.config.DEFAULT_MODEL,
+            "requests": self.requests,
+            "cache_hits": self.cache_hits,
+            "cached_responses": len(self._cache),
+        }
+
+    def estimate(self, project_name: str, days: int) -> dict:
+        project = self.project(project_name)
+
+        def compute():
+            end_date = datetime.utcnow()
+            return asdict(self.ai_processor.estimate_cost(project, end_date - timedelta(days=days), end_date))
+        return self._cached(("estimate", project.id, days), project, compute)
+
+    def search(self, project_name: str, query: str, days: Optional[int] = None, limit: int = 20) -> List[dict]:
+        if not query.strip():
+            raise ServiceError("Empty search query")
+        project = self.project(project_name)
+
+        def compute():
+            start_date = datetime.utcnow() - timedelta(days=days) if days else None
+            return [{key: row[key] for key in ("id", "telegram_message_id", "timestamp", "author", "content")}
+                    for row in self.db.search_messages(project.id, query, start_date, limit=limit)]
+        return self._cached(("search", project.id, query, days, limit), project, compute)
+
+    def summarize(self, project: Project, days: int, fresh: bool = False,
+                  emit: Callable[[dict], None] = lambda event: None, stream: bool = False) -> Summary:
+        """Reaproveita o digest fresco ou gera um resumo; `emit` recebe os eventos (start, plan, token)"""
+        digest = None if fresh else find_fresh_digest(self.db, project, days)
+        emit({"event": "start", "digest": summary_fields(digest) if digest else None})
+        if digest:
+            if stream:
+                emit({"event": "token", "text": digest.content})
+            return digest
+        on_token = (lambda text: emit({"event": "token", "text": text})) if stream else None
+        end_date = datetime.utcnow()
+        return self.ai_processor.generate_summary(project, end_date - timedelta(days=days), end_date,
+                                                  on_token=on_token,
+                                                  on_plan=lambda estimate: emit({"event": "plan", "estimate": asdict(estimate)}))
+
+def summary_fields(summary: Summary) -> dict:
+    """Colunas de um Summary (metadata e citações no formato gravado, lidas com decode_json)"""
+    return {column.name: getattr(summary, column.name) for column in Summary.__table__.columns}
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "NeuralCore"
+
+    @property
+    def service(self) -> NeuralCoreService:
+        return self.server.service
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.requestline} - {format % args}")
+
+    def _send_json(self, status: int, value: Any):
+        payload = _encode(value)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _authorized(self) -> bool:
+        return hmac.compare_digest(self.headers.get("Authorization", "").encode(),
+                                   f"Bearer {self.server.token}".encode())
+
+    def _body(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            raise ServiceError("Request body must be JSON")
+        if not isinstance(body, dict) or not body.get("project"):
+            raise ServiceError("Missing 'project'")
+        return body
+
+    def _dispatch(self, handle: Callable[[], Any]):
+        self.service.count_request()
+        try:
+            result = handle()
+        except ServiceError as e:
+            self._send_json(e.status, {"error": str(e)})
+        except Exception as e:
+            logger.error(f"Error handling {self.path}: {e}")
+            self._send_json(500, {"error": str(e)})
+        else:
+            if result is not None:
+                self._send_json(200, result)
+
+    def do_GET(self):
+        if not self._authorized():
+            self._send_json(401, {"error": "Missing or invalid service token"})
+        elif self.path.rstrip("/") == "/status":
+            self._dispatch(self.service.status)
+        else:
+            self._send_json(404, {"error": "Not found"})
+
+    def do_POST(self):
+        path = self.path.rstrip("/")
+        if not self._authorized():
+            self._send_json(401, {"error": "Missing or invalid service token"})
+        elif self.headers.get_content_type() != "application/json":
+            self._send_json(415, {"error": "Content-Type must be application/json"})
+        elif path == "/estimate":
+            self._dispatch(lambda: self._estimate(self._body()))
+        elif path == "/search":
+            self._dispatch(lambda: self._search(self._body()))
+        elif path == "/summarize":
+            self._dispatch(lambda: self._summarize(self._body()))
+        else:
+            self._send_json(404, {"error": "Not found"})
+
+    def _estimate(self, body: dict) -> dict:
+        return self.service.estimate(body["project"], int(body.get("days", 7)))
+
+    def _search(self, body: dict) -> dict:
+        days = body.get("days")
+        return {"results": self.service.search(body["project"], str(body.get("query", "")),
+                                               int(days) if days else None, int(body.get("limit", 20)))}
+
+    def _summarize(self, body: dict) -> None:
+        """Resposta em NDJSON (start, plan, token..., summary | error), escrita à medida que a geração avança"""
+        project = self.service.project(body["project"])
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        connected = True
+
+        def emit(event: dict):
+            nonlocal connected
+            if not connected:
+                return
+            try:
+                self.wfile.write(_encode(event) + b"\n")
+                self.wfile.flush()
+            except OSError:
+                # Cliente desconectou: a geração continua e o resumo é gravado mesmo assim
+                connected = False
+
+        try:
+            summary = self.service.summarize(project, int(body.get("days", 7)), bool(body.get("fresh")),
+                                             emit, bool(body.get("stream")))
+            emit({"event": "summary", "summary": summary_fields(summary)})
+        except Exception as e:
+            logger.error(f"Error generating summary via service: {e}")
+            emit({"event": "error", "error": str(e)})
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+def create_server(service: NeuralCoreService, url: str):
+    """Servidor HTTP (uma thread por requisição) no endereço `url`; rode com serve_forever()
+
+    Sem SERVICE_TOKEN, gera um token para esta execução e o grava (0600) em token_path().
+    """
+    config = service.db.config
+    path, address = _parse_address(url)
+    if address and not _is_loopback(address[0]) and not config.SERVICE_TOKEN:
+        raise ServiceError(f"Refusing to listen on non-loopback address {address[0]} without SERVICE_TOKEN")
+    if path:
+        if os.path.exists(path):
+            if ServiceClient(url, timeout=1).is_available():
+                raise ServiceError(f"Another service is already listening on {url}")
+            os.unlink(path)  # socket de um processo que não terminou limpo
+        server = _UnixHTTPServer(path, _Handler)
+        os.chmod(path, 0o600)
+    else:
+        server = ThreadingHTTPServer(address, _Handler)
+        server.daemon_threads = True
+    server.service = service
+    server.token = config.SERVICE_TOKEN or secrets.token_urlsafe(32)
+    if not config.SERVICE_TOKEN:
+        _write_token(token_path(url, config), server.token)
+    logger.info(f"Neural Core service listening on {url}")
+    return server
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: Optional[float] = None):
+        super().__init__("localhost", timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+class ServiceClient:
+    """Cliente da API local: as mesmas operações, com respostas no formato que a CLI exibe"""
+
+    def __init__(self, url: str, timeout: float = 300.0, token: Optional[str] = None):
+        self.url = url
+        self.timeout = timeout
+        self.token = token
+        self._path, self._address = _parse_address(url)
+
+    def _connection(self, timeout: Optional[float] = None) -> http.client.HTTPConnection:
+        timeout = timeout or self.timeout
+        if self._path:
+            return _UnixHTTPConnection(self._path, timeout)
+        return http.client.HTTPConnection(*self._address, timeout=timeout)
+
+    def _request(self, method: str, path: str, payload: Optional[dict] = None,
+                 timeout: Optional[float] = None) -> Tuple[http.client.HTTPConnection, http.client.HTTPResponse]:
+        connection = self._connection(timeout)
+        try:
+            body = _encode(payload) if payload is not None else None
+            headers = {"Content-Type": "application/json"}
+            if self.token:
+                headers["Authorization"] = f"Bearer {self.token}"
+            connection.request(method, path, body=body, headers=headers)
+        except (ConnectionRefusedError, FileNotFoundError, socket.timeout) as e:
+            connection.close()
+            raise ServiceUnavailable(f"No Neural Core service at {self.url} ({e})")
+        response = connection.getresponse()
+        if response.status != 200:
+            try:
+                message = json.loads(response.read()).get("error")
+            except ValueError:
+                message = None
+            connection.close()
+            raise ServiceError(message or f"HTTP {response.status}", response.status)
+        return connection, response
+
+    def _json(self, method: str, path: str, payload: Optional[dict] = None,
+              timeout: Optional[float] = None) -> Any:
+        connection, response = self._request(method, path, payload, timeout)
+        try:
+            return json.loads(response.read())
+        finally:
+            connection.close()
+
+    def is_available(self) -> bool:
+        try:
+            self._json("GET", "/status", timeout=2)
+            return True
+        except ServiceError as e:
+            return e.status == 401  # há um serviço escutando; o token errado aparece no próximo comando
+        except (ServiceUnavailable, OSError):
+            return False
+
+    def status(self) -> dict:
+        return self._json("GET", "/status")
+
+    def estimate(self, project_name: str, days: int) -> SimpleNamespace:
+        """Mesmos campos de CostEstimate"""
+        return _estimate(self._json("POST", "/estimate", {"project": project_name, "days": days}))
+
+    def search(self, project_name: str, query: str, days: Optional[int] = None, limit: int = 20) -> List[dict]:
+        results = self._json("POST", "/search", {"project": project_name, "query": query,
+                                                 "days": days, "limit": limit})["results"]
+        for row in results:
+            row["timestamp"] = datetime.fromisoformat(row["timestamp"])
+        return results
+
+    def summarize(self, project_name: str, days: int, fresh: bool = False,
+                  on_start: Optional[Callable[[Optional[SimpleNamespace]], None]] = None,
+                  on_token: Optional[Callable[[str], None]] = None,
+                  on_plan: Optional[Callable[[SimpleNamespace], None]] = None) -> SimpleNamespace:
+        """Resumo (campos de Summary); `on_start` recebe o digest reaproveitado (ou None) antes da geração
+        e `on_plan` a estimativa com o plano de modelos"""
+        connection, response = self._request("POST", "/summarize", {
+            "project": project_name, "days": days, "fresh": fresh, "stream": on_token is not None
+        })
+        try:
+            for line in response:
+                event = json.loads(line)
+                kind = event["event"]
+                if kind == "start" and on_start:
+                    on_start(_summary(event["digest"]) if event["digest"] else None)
+                elif kind == "plan" and on_plan:
+                    on_plan(_estimate(event["estimate"]))
+                elif kind == "token" and on_token:
+                    on_token(event["text"])
+                elif kind == "summary":
+                    return _summary(event["summary"])
+                elif kind == "error":
+                    raise ServiceError(event["error"], 500)
+        finally:
+            connection.close()
+        raise ServiceError("Service closed the connection before the summary was ready", 502)
+
+def _estimate(fields: dict) -> SimpleNamespace:
+    if fields.get("plan"):
+        plan = fields["plan"]
+        plan["steps"] = [SimpleNamespace(**step) for step in plan["steps"]]
+        fields["plan"] = SimpleNamespace(**plan)
+    return SimpleNamespace(**fields)
+
+def _summary(fields: dict) -> SimpleNamespace:
+    for name in SUMMARY_DATETIME_FIELDS:
+        if fields.get(name):
+            fields[name] = datetime.fromisoformat(fields[name])
+    return SimpleNamespace(**fields)
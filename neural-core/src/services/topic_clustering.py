@@ -0,0 +1,220 @@
+"""
+Agrupamento local das mensagens em tópicos antes da sumarização
+
+TF-IDF com hashing de termos (dimensão fixa) + k-means esférico em mini-batches,
+seguido de fusão aglomerativa dos centróides parecidos, tudo vetorizado com NumPy/SciPy. Os tópicos são ordenados por tamanho, rotulados
+pelos termos dominantes e recebem uma fatia proporcional do orçamento de tokens.
+"""
+import logging
+import math
+import zlib
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Sequence
+
+import numpy as np
+from scipy.cluster.hierarchy import fcluster, linkage
+from scipy.sparse import csr_matrix, diags
+
+from models import Message
+from services.evidence_linker import corpus_terms
+
+if TYPE_CHECKING:
+    from services.reply_threads import Thread
+
+logger = logging.getLogger(__name__)
+
+OTHER_TOPIC_LABEL = "Other messages"
+
+@dataclass
+class Topic:
+    """Um tópico: mensagens em ordem de representatividade (mais próximas do centróide primeiro)"""
+    label: str
+    keywords: List[str]
+    messages: List[Message]
+    token_budget: int = 0
+    selected: List[Message] = field(default_factory=list)
+    threads: List["Thread"] = field(default_factory=list)  # vazio: mensagens soltas
+
+    @property
+    def message_count(self) -> int:
+        return len(self.messages)
+
+    def as_metadata(self, sample_size: int = 5) -> Dict[str, Any]:
+        return {
+            "label": self.label,
+            "keywords": self.keywords,
+            "message_count": self.message_count,
+            "included_count": len(self.selected),
+            "token_budget": self.token_budget,
+            "representative_message_ids": [message.telegram_message_id for message in self.messages[:sample_size]],
+        }
+
+def _normalize_rows(matrix: csr_matrix) -> csr_matrix:
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return diags(1.0 / norms) @ matrix
+
+class TopicClusterer:
+    """Agrupa mensagens em tópicos (TF-IDF com hashing + k-means esférico em mini-batches)"""
+
+    def __init__(self, max_clusters: int = 12, min_messages: int = 100, n_features: int = 2 ** 15,
+                 batch_size: int = 1024, iterations: int = 50, merge_similarity: float = 0.7,
+                 keywords_per_topic: int = 3, seed: int = 0):
+        self.max_clusters = max_clusters
+        self.min_messages = min_messages
+        self.n_features = n_features
+        self.batch_size = batch_size
+        self.iterations = iterations
+        self.merge_similarity = merge_similarity
+        self.keywords_per_topic = keywords_per_topic
+        self.seed = seed
+
+    def cluster_count(self, message_count: int) -> int:
+        if message_count < self.min_messages or self.max_clusters < 2:
+            return 1
+        return max(2, min(self.max_clusters, int(math.sqrt(message_count / 10))))
+
+    def _vectorize(self, documents: Sequence[str]):
+        """(TF-IDF com hashing normalizado, TF-IDF por termo do vocabulário, termos)"""
+        vocabulary, rows, cols = corpus_terms(documents)
+        terms = np.array(list(vocabulary), dtype=object)
+        tf = csr_matrix((np.ones(len(cols), dtype=np.float32), (rows, cols)),
+                        shape=(len(documents), len(vocabulary)))
+        tf.sum_duplicates()
+        tf.data = 1.0 + np.log(tf.data)  # tf sublinear
+        document_frequency = np.bincount(tf.indices, minlength=len(vocabulary))
+        idf = (np.log((1 + len(documents)) / (1 + document_frequency)) + 1.0).astype(np.float32)
+        weighted = tf @ diags(idf)
+
+        # Hash estável (crc32) de cada termo do vocabulário -> coluna de dimensão fixa
+        buckets = np.fromiter((zlib.crc32(term.encode("utf-8")) % self.n_features for term in terms),
+                              dtype=np.int64, count=len(terms))
+        hashed = csr_matrix((weighted.data, buckets[weighted.indices], weighted.indptr),
+                            shape=(len(documents), self.n_features))
+        hashed.sum_duplicates()
+        return _normalize_rows(hashed).tocsr(), weighted.tocsr(), terms
+
+    def _init_centers(self, vectors: csr_matrix, k: int, rng: np.random.Generator) -> np.ndarray:
+        """k-means++ (distância de cosseno) sobre uma amostra"""
+        sample = vectors[rng.choice(vectors.shape[0], min(vectors.shape[0], 20 * k), replace=False)]
+        centers = [sample[rng.integers(sample.shape[0])].toarray().ravel()]
+        closest = 1.0 - (sample @ centers[0])
+        for _ in range(1, k):
+            weights = np.clip(closest, 0, None) ** 2
+            total = weights.sum()
+            index = rng.choice(sample.shape[0], p=weights / total) if total > 0 else rng.integers(sample.shape[0])
+            centers.append(sample[index].toarray().ravel())
+            closest = np.minimum(closest, 1.0 - (sample @ centers[-1]))
+        return np.vstack(centers).astype(np.float32)
+
+    def _fit(self, vectors: csr_matrix, k: int) -> np.ndarray:
+        """Centróides unitários via mini-batch k-means (taxa de aprendizado por centro)"""
+        rng = np.random.default_rng(self.seed)
+        centers = self._init_centers(vectors, k, rng)
+        counts = np.zeros(k, dtype=np.float64)
+        batch_size = min(self.batch_size, vectors.shape[0])
+        for _ in range(self.iterations):
+            batch = vectors[rng.choice(vectors.shape[0], batch_size, replace=False)]
+            labels = np.asarray((batch @ centers.T).argmax(axis=1)).ravel()
+            assignment = csr_matrix((np.ones(batch_size), (labels, np.arange(batch_size))), shape=(k, batch_size))
+            sizes = np.bincount(labels, minlength=k).astype(np.float64)
+            sums = (assignment @ batch).toarray()
+            counts += sizes
+            # c <- (1 - n/N) c + (n/N) média  ==  c * (1 - n/N) + soma / N  (em lugar)
+            rate = np.divide(sizes, counts, out=np.zeros(k), where=counts > 0).astype(np.float32)
+            centers *= (1 - rate)[:, None]
+            centers += sums.astype(np.float32) / np.where(counts > 0, counts, 1.0).astype(np.float32)[:, None]
+            norms = np.sqrt(np.einsum("ij,ij->i", centers, centers))
+            centers /= np.where(norms == 0, 1.0, norms)[:, None]
+        return centers
+
+    def _merge(self, vectors: csr_matrix, centers: np.ndarray) -> np.ndarray:
+        """Funde centróides com similaridade de cosseno média >= merge_similarity (ligação média)"""
+        if len(centers) < 2 or self.merge_similarity >= 1:
+            return centers
+        groups = fcluster(linkage(centers, method="average", metric="cosine"),
+                          t=1 - self.merge_similarity, criterion="distance")
+        if groups.max() == len(centers):
+            return centers
+        sizes = np.bincount(np.asarray((vectors @ centers.T).argmax(axis=1)).ravel(), minlength=len(centers))
+        merged = np.zeros((groups.max(), centers.shape[1]), dtype=centers.dtype)
+        np.add.at(merged, groups - 1, centers * sizes[:, None])
+        merged = merged[merged.any(axis=1)]
+        return merged / np.linalg.norm(merged, axis=1, keepdims=True)
+
+    def cluster(self, messages: List[Message]) -> List[Topic]:
+        """Tópicos ordenados por tamanho; mensagens sem termos úteis vão para 'Other messages'"""
+        if not messages:
+            return []
+        vectors, weighted, terms = self._vectorize([message.content for message in messages])
+        has_terms = np.diff(vectors.indptr) > 0
+        usable = np.flatnonzero(has_terms)
+        k = min(self.cluster_count(len(messages)), len(usable))
+
+        if k >= 2:
+            centers = self._merge(vectors[usable], self._fit(vectors[usable], k))
+            k = len(centers)
+            similarity = np.asarray(vectors[usable] @ centers.T)
+            labels = similarity.argmax(axis=1)
+            closeness = similarity[np.arange(len(usable)), labels]
+            # Sem nenhum termo em comum com os centróides: vai para 'Other messages'
+            has_terms[usable[closeness <= 0]] = False
+            usable, labels, closeness = usable[closeness > 0], labels[closeness > 0], closeness[closeness > 0]
+        else:
+            k = 1 if len(usable) else 0
+            labels = np.zeros(len(usable), dtype=np.int64)
+            closeness = np.zeros(len(usable))
+
+        # Termos característicos de cada cluster: TF-IDF médio dos membros acima da média geral
+        membership = csr_matrix((np.ones(len(usable)), (labels, usable)), shape=(max(k, 1), len(messages)))
+        sizes = np.maximum(np.bincount(labels, minlength=max(k, 1)), 1)[:, None]
+        overall = np.asarray(weighted.sum(axis=0)) / max(len(usable), 1)
+        term_weights = (membership @ weighted).toarray() / sizes - overall
+        term_weights[:, [term.isdigit() for term in terms]] = 0  # números não rotulam tópicos
+
+        topics = []
+        for cluster in range(k):
+            members = usable[labels == cluster]
+            if not len(members):
+                continue
+            ranked = members[np.argsort(-closeness[labels == cluster], kind="stable")]
+            top_terms = np.argsort(-term_weights[cluster])[:self.keywords_per_topic]
+            keywords = [str(terms[index]) for index in top_terms if term_weights[cluster, index] > 0]
+            label = ", ".join(keywords) or "General"
+            topics.append(Topic(label=label, keywords=keywords, messages=[messages[i] for i in ranked]))
+        topics.sort(key=lambda topic: topic.message_count, reverse=True)
+
+        leftovers = np.flatnonzero(~has_terms)
+        if len(leftovers):
+            topics.append(Topic(label=OTHER_TOPIC_LABEL, keywords=[],
+                                messages=[messages[i] for i in leftovers]))
+        logger.info(f"Grouped {len(messages)} messages into {len(topics)} topics")
+        return topics
+
+def allocate_token_budget(topics: List[Topic], budget: int, cost: Callable[[Message], int]) -> List[Topic]:
+    """Preenche `selected` de cada tópico dentro de uma fatia do orçamento proporcional ao seu tamanho
+
+    Os tópicos menores são atendidos primeiro; a fatia que não usam passa para os maiores.
+    Todo tópico entra com ao menos uma mensagem. Tópicos com `threads` são preenchidos
+    thread a thread (as mensagens de `thread.shown`).
+    `budget <= 0` inclui todas as mensagens.
+    """
+    remaining_budget = budget
+    remaining_messages = sum(topic.message_count for topic in topics)
+    for topic in sorted(topics, key=lambda t: t.message_count):
+        if budget <= 0:
+            share = None
+        else:
+            share = remaining_budget * topic.message_count // remaining_messages if remaining_messages else 0
+        topic.selected, used = [], 0
+        units = [thread.shown for thread in topic.threads] if topic.threads else [[message] for message in topic.messages]
+        for unit in units:
+            tokens = sum(cost(message) for message in unit)
+            if share is not None and used + tokens > share and topic.selected:
+                break
+            topic.selected.extend(unit)
+            used += tokens
+        topic.token_budget = used if share is None else share
+        remaining_budget -= used
+        remaining_messages -= topic.message_count
+    return topics
@@ -0,0 +1,150 @@
+"""
+Registro de uso do LLM e calibração do estimador de custo
+
+Cada chamada ao LLM grava em `llmusage` os tokens informados pelo modelo
+(`usage_metadata` do LangChain), a latência e o custo pelos preços de MODEL_PRICES.
+O `estimate_cost` usa as chamadas recentes do mesmo projeto e modelo (ou do modelo,
+com poucas amostras no projeto) para calibrar a previsão:
+
+- `prompt_scale`: tamanho real do prompt / tamanho previsto a partir dos totais do período
+- `chars_per_token`: caracteres do prompt por token de entrada
+- `output_tokens`: média de tokens de saída
+"""
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from models import LlmUsage
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHARS_PER_TOKEN = 4.0
+DEFAULT_OUTPUT_TOKENS = 500
+BULK_OPERATION = "topic_notes"  # chamadas do estágio em lote (fora da calibração dos resumos)
+
+def parse_model_prices(value: Optional[str]) -> Dict[str, Tuple[float, float]]:
+    """'gpt-4o=0.0025/0.01,gpt-4o-mini=0.00015/0.0006' -> {modelo: (entrada, saída) por 1K tokens}"""
+    prices = {}
+    for item in (value or "").split(","):
+        if not item.strip():
+            continue
+        try:
+            model, price = item.split("=", 1)
+            input_price, output_price = price.split("/", 1)
+            prices[model.strip()] = (float(input_price), float(output_price))
+        except ValueError:
+            raise ValueError(f"Invalid model price '{item.strip()}' (use model=input/output per 1K tokens)")
+    return prices
+
+def parse_model_values(value: Optional[str]) -> Dict[str, float]:
+    """'gpt-4o=12,gpt-4o-mini=10' -> {modelo: valor}"""
+    values = {}
+    for item in (value or "").split(","):
+        if not item.strip():
+            continue
+        try:
+            model, number = item.split("=", 1)
+            values[model.strip()] = float(number)
+        except ValueError:
+            raise ValueError(f"Invalid model setting '{item.strip()}' (use model=value)")
+    return values
+
+def model_value(table: Dict[str, Any], model: str, default: Any) -> Any:
+    """Valor do modelo na tabela: nome exato, maior prefixo (versões datadas) ou o padrão"""
+    if model in table:
+        return table[model]
+    prefixes = [name for name in table if model.startswith(name)]
+    if prefixes:
+        return table[max(prefixes, key=len)]
+    return default
+
+def reported_usage(message: Any) -> Optional[Tuple[int, int]]:
+    """(tokens de entrada, tokens de saída) informados na resposta do LLM, se houver"""
+    usage = getattr(message, "usage_metadata", None)
+    if usage:
+        return usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+    token_usage = (getattr(message, "response_metadata", None) or {}).get("token_usage")
+    if token_usage:
+        return token_usage.get("prompt_tokens", 0), token_usage.get("completion_tokens", 0)
+    return None
+
+@dataclass
+class Calibration:
+    """Fatores do estimador para um projeto e modelo"""
+    chars_per_token: float = DEFAULT_CHARS_PER_TOKEN
+    prompt_scale: float = 1.0
+    output_tokens: int = DEFAULT_OUTPUT_TOKENS
+    samples: int = 0
+    scope: str = "default"  # project, model ou default (sem histórico)
+
+    @classmethod
+    def fit(cls, samples: List[tuple], scope: str) -> "Calibration":
+        """Razões entre somas (amostras grandes pesam mais) e média da saída"""
+        estimated_chars = sum(sample[0] for sample in samples)
+        prompt_chars = sum(sample[1] for sample in samples)
+        prompt_tokens = sum(sample[2] for sample in samples)
+        completion_tokens = sum(sample[3] for sample in samples)
+        return cls(
+            chars_per_token=prompt_chars / prompt_tokens if prompt_chars and prompt_tokens else DEFAULT_CHARS_PER_TOKEN,
+            prompt_scale=prompt_chars / estimated_chars if prompt_chars and estimated_chars else 1.0,
+            output_tokens=round(completion_tokens / len(samples)) or DEFAULT_OUTPUT_TOKENS,
+            samples=len(samples),
+            scope=scope,
+        )
+
+class UsageLedger:
+    """Preços por modelo, gravação das chamadas e calibração a partir do histórico"""
+
+    def __init__(self, db):
+        self.db = db
+        config = db.config
+        self.prices = parse_model_prices(config.MODEL_PRICES)
+        self.default_price = config.DEFAULT_COST_PER_1K_TOKENS
+        self.window = config.CALIBRATION_WINDOW
+        self.min_samples = config.CALIBRATION_MIN_SAMPLES
+
+    def price(self, model: str) -> Tuple[float, float]:
+        """Preço por 1K tokens (entrada, saída)"""
+        return model_value(self.prices, model, (self.default_price, self.default_price))
+
+    def cost(self, model: str, prompt_tokens: int, completion_tokens: int) -> float:
+        input_price, output_price = self.price(model)
+        return prompt_tokens / 1000 * input_price + completion_tokens / 1000 * output_price
+
+    def calibration(self, project_id: int, model: str) -> Calibration:
+        """Calibração do projeto para resumos; com menos de CALIBRATION_MIN_SAMPLES chamadas, a do modelo"""
+        if self.window <= 0:
+            return Calibration()
+        samples = self.db.get_llm_usage_samples(model, project_id, self.window, exclude_operation=BULK_OPERATION)
+        if len(samples) >= self.min_samples:
+            return Calibration.fit(samples, "project")
+        samples = self.db.get_llm_usage_samples(model, limit=self.window, exclude_operation=BULK_OPERATION)
+        if len(samples) >= self.min_samples:
+            return Calibration.fit(samples, "model")
+        return Calibration()
+
+    def record(self, project_id: int, model: str, operation: str, prompt_chars: int, completion: str,
+               usage: Optional[Tuple[int, int]], latency: float, message_count: int = 0,
+               estimated_prompt_chars: int = 0, estimated_cost: float = 0.0) -> LlmUsage:
+        """Grava a chamada; sem uso informado pelo modelo, os tokens vêm da calibração atual
+
+        Retorna o LlmUsage (sem id se a gravação falhar: o custo continua valendo para o resumo).
+        """
+        if usage:
+            prompt_tokens, completion_tokens = usage
+        else:
+            chars_per_token = self.calibration(project_id, model).chars_per_token
+            prompt_tokens = round(prompt_chars / chars_per_token)
+            completion_tokens = round(len(completion) / chars_per_token)
+        fields = dict(
+            project_id=project_id, operation=operation, model=model, message_count=message_count,
+            estimated_prompt_chars=estimated_prompt_chars, prompt_chars=prompt_chars,
+            prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, usage_reported=usage is not None,
+            estimated_cost=estimated_cost, cost=self.cost(model, prompt_tokens, completion_tokens),
+            latency_seconds=latency,
+        )
+        try:
+            return self.db.record_llm_usage(**fields)
+        except Exception as e:
+            logger.error(f"Error recording LLM usage: {e}")
+            return LlmUsage(**fields)
@@ -0,0 +1,33 @@
+"""
+Codificação compacta dos blobs JSON dos resumos (summary_metadata, citations)
+
+JSON sem indentação; acima de SUMMARY_JSON_COMPRESS_MIN_BYTES é comprimido com
+zlib e gravado como texto "z:<base64>". JSON válido nunca começa com "z", então
+linhas antigas (indent=2) continuam legíveis por `decode_json`.
+"""
+import base64
+import json
+import zlib
+from typing import Any, Optional
+
+COMPRESSED_PREFIX = "z:"
+
+def encode_json(value: Any, compression: str = "zlib", min_bytes: int = 1024) -> Optional[str]:
+    """Serializa `value` de forma compacta, comprimindo blobs grandes"""
+    if value is None:
+        return None
+    text = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+    raw = text.encode("utf-8")
+    if compression == "zlib" and len(raw) >= min_bytes:
+        packed = COMPRESSED_PREFIX + base64.b64encode(zlib.compress(raw, 9)).decode("ascii")
+        if len(packed) < len(text):
+            return packed
+    return text
+
+def decode_json(text: Optional[str]) -> Any:
+    """Lê um blob gravado por `encode_json` (ou JSON puro legado)"""
+    if not text:
+        return None
+    if text.startswith(COMPRESSED_PREFIX):
+        text = zlib.decompress(base64.b64decode(text[len(COMPRESSED_PREFIX):])).decode("utf-8")
+    return json.loads(text)
@@ -0,0 +1,157 @@
+"""
+Profiling por estágio do pipeline de IA (tempo de parede, CPU e pico de memória)
+"""
+import cProfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from typing import Dict, List, Optional, Any
+
+@dataclass
+class StageTiming:
+    """Medições acumuladas de um estágio"""
+    path: str  # caminho do estágio, ex: "generate-summary;llm_call"
+    wall_seconds: float = 0.0
+    cpu_seconds: float = 0.0
+    peak_memory_bytes: int = 0
+    calls: int = 0
+
+    @property
+    def name(self) -> str:
+        return self.path.split(";")[-1]
+
+    @property
+    def depth(self) -> int:
+        return self.path.count(";")
+
+@dataclass
+class _Frame:
+    path: str
+    wall_start: float
+    cpu_start: float
+    saved_peak: int = 0
+    running_peak: int = 0
+
+class StageProfiler:
+    """Mede estágios aninhados com `with profiler.stage("nome"):`"""
+
+    def __init__(self, track_memory: bool = True, use_cprofile: bool = False):
+        self.track_memory = track_memory
+        self.use_cprofile = use_cprofile
+        self.stages: Dict[str, StageTiming] = {}
+        self._stack: List[_Frame] = []
+        self._cprofile: Optional[cProfile.Profile] = None
+        self._started_tracemalloc = False
+        self.started_at: Optional[datetime] = None
+
+    def start(self):
+        """Inicia o rastreamento de memória e, se pedido, o cProfile"""
+        self.started_at = datetime.utcnow()
+        if self.track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        if self.use_cprofile:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+
+    def stop(self):
+        """Encerra o rastreamento iniciado por start()"""
+        if self._cprofile:
+            self._cprofile.disable()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    @contextmanager
+    def stage(self, name: str):
+        """Mede um estágio; estágios abertos dentro dele viram filhos"""
+        path = f"{self._stack[-1].path};{name}" if self._stack else name
+        saved_peak = 0
+        if tracemalloc.is_tracing():
+            saved_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.reset_peak()
+
+        frame = _Frame(path=path, wall_start=time.perf_counter(), cpu_start=time.process_time(),
+                       saved_peak=saved_peak)
+        self._stack.append(frame)
+        try:
+            yield
+        finally:
+            self._stack.pop()
+            wall = time.perf_counter() - frame.wall_start
+            cpu = time.process_time() - frame.cpu_start
+            peak = frame.running_peak
+            if tracemalloc.is_tracing():
+                peak = max(peak, tracemalloc.get_traced_memory()[1])
+                tracemalloc.reset_peak()
+
+            timing = self.stages.setdefault(path, StageTiming(path=path))
+            timing.wall_seconds += wall
+            timing.cpu_seconds += cpu
+            timing.peak_memory_bytes = max(timing.peak_memory_bytes, peak)
+            timing.calls += 1
+
+            # O pico do filho também conta para o pai, assim como o pico anterior ao filho
+            if self._stack:
+                parent = self._stack[-1]
+                parent.running_peak = max(parent.running_peak, frame.saved_peak, peak)
+
+    def _self_seconds(self, timing: StageTiming) -> float:
+        children = sum(
+            t.wall_seconds for t in self.stages.values()
+            if t.path.startswith(timing.path + ";") and t.depth == timing.depth + 1
+        )
+        return max(0.0, timing.wall_seconds - children)
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Retorna os tempos por estágio em formato serializável"""
+        return {
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "memory_tracked": self.track_memory,
+            "stages": [
+                {
+                    **asdict(timing),
+                    "wall_seconds": round(timing.wall_seconds, 6),
+                    "cpu_seconds": round(timing.cpu_seconds, 6),
+                    "self_seconds": round(self._self_seconds(timing), 6)
+                }
+                for timing in self.stages.values()
+            ]
+        }
+
+    def format_report(self) -> str:
+        """Tabela legível com o breakdown por estágio"""
+        lines = [f"{'Stage':<40} {'Wall (s)':>10} {'CPU (s)':>10} {'Peak MB':>10} {'Calls':>6}"]
+        lines.append("-" * len(lines[0]))
+        for path in sorted(self.stages, key=lambda p: self._order_key(p)):
+            timing = self.stages[path]
+            label = "  " * timing.depth + timing.name
+            peak_mb = timing.peak_memory_bytes / (1024 * 1024) if self.track_memory else 0.0
+            lines.append(
+                f"{label:<40} {timing.wall_seconds:>10.3f} {timing.cpu_seconds:>10.3f} "
+                f"{peak_mb:>10.1f} {timing.calls:>6}"
+            )
+        return "\n".join(lines)
+
+    def _order_key(self, path: str) -> List[str]:
+        # Mantém pais antes dos filhos preservando a ordem de primeira execução
+        order = list(self.stages)
+        parts = path.split(";")
+        return [f"{order.index(';'.join(parts[:i + 1])):06d}" for i in range(len(parts))]
+
+    def dump(self, output_path: str):
+        """Grava o perfil: .prof (cProfile/pstats) ou pilhas colapsadas para flamegraph"""
+        if output_path.endswith(".prof"):
+            if not self._cprofile:
+                raise ValueError("cProfile output requires the profiler to run with use_cprofile=True")
+            self._cprofile.dump_stats(output_path)
+            return
+
+        # Formato "folded" (flamegraph.pl, speedscope, inferno): pilha;de;estágios microssegundos
+        with open(output_path, 'w', encoding='utf-8') as f:
+            for timing in self.stages.values():
+                micros = int(self._self_seconds(timing) * 1_000_000)
+                if micros > 0:
+                    f.write(f"{timing.path} {micros}\n")
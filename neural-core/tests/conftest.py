@@ -0,0 +1,17 @@
+"""Fixtures dos testes do Neural Core: src no sys.path e banco/diretórios temporários"""
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    """Cada teste roda em src/ de um diretório temporário (o ../shared da config fica dentro dele)"""
+    src = tmp_path / "src"
+    src.mkdir()
+    monkeypatch.chdir(src)
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'test.db'}")
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    return tmp_path
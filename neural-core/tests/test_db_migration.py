@@ -0,0 +1,75 @@
+"""dedupe-db: duplicatas que impedem um índice único novo"""
+from datetime import datetime
+
+from sqlalchemy import inspect, select, text
+
+from models import Author, Message, MessageRelevance
+from services.database import DatabaseManager
+from services.db_migration import deduplicate_unique_keys
+
+UNIQUE_INDEXES = ("ux_author_telegram_id", "ux_message_project_telegram_id", "ux_messagerelevance_message")
+
+def _legacy_database() -> DatabaseManager:
+    """Banco de antes dos índices únicos, com chaves repetidas e autores antigos sem telegram_id"""
+    db = DatabaseManager()
+    project = db.create_project("Test", "@test_group")
+    now = datetime(2026, 1, 1, 12, 0)
+    with db.engine.begin() as connection:
+        for name in UNIQUE_INDEXES:
+            connection.execute(text(f"DROP INDEX {name}"))
+        connection.execute(Author.__table__.insert(), [
+            {"id": 1, "telegram_id": None, "display_name": "Alice"},
+            {"id": 2, "telegram_id": None, "display_name": "Bob"},
+            {"id": 3, "telegram_id": None, "display_name": "Carol"},
+            {"id": 4, "telegram_id": 42, "display_name": "@dave"},
+            {"id": 5, "telegram_id": 42, "display_name": "@dave"},
+        ])
+        connection.execute(Message.__table__.insert(), [
+            {"id": message_id, "project_id": project.id, "telegram_message_id": telegram_id, "content": "gm",
+             "author_id": author_id, "timestamp": now, "collected_at": now, "message_type": "text"}
+            for message_id, telegram_id, author_id in ((1, 1, 5), (2, 2, 1), (3, 1, 4))
+        ])
+        connection.execute(MessageRelevance.__table__.insert(), [
+            {"message_id": message_id, "project_id": project.id, "rules_version": "v1", "score": 10.0, "confidence": 1.0,
+             "category": "general", "scored_at": now}
+            for message_id in (1, 3)
+        ])
+    return db
+
+def _ids(db, table) -> list:
+    with db.engine.connect() as connection:
+        return sorted(connection.execute(select(table.c.id)).scalars())
+
+def _indexes(db) -> set:
+    inspector = inspect(db.engine)
+    return {index["name"] for table in ("author", "message", "messagerelevance")
+            for index in inspector.get_indexes(table)}
+
+def test_startup_skips_unique_indexes_with_duplicates(workdir):
+    db = _legacy_database()
+    DatabaseManager()
+
+    assert _ids(db, Author.__table__) == [1, 2, 3, 4, 5]
+    assert _ids(db, Message.__table__) == [1, 2, 3]
+    assert not _indexes(db) & {"ux_author_telegram_id", "ux_message_project_telegram_id"}
+    # Sem duplicatas na chave: criado na inicialização
+    assert "ux_messagerelevance_message" in _indexes(db)
+
+def test_dedupe_keeps_null_keys_and_moves_references(workdir):
+    db = _legacy_database()
+
+    report = deduplicate_unique_keys(db, dry_run=True)
+    assert {(result.index, result.duplicate_keys) for result in report} == {
+        ("ux_author_telegram_id", 1), ("ux_message_project_telegram_id", 1), ("ux_messagerelevance_message", 0)
+    }
+    assert _ids(db, Author.__table__) == [1, 2, 3, 4, 5]
+
+    deduplicate_unique_keys(db)
+    assert _ids(db, Author.__table__) == [1, 2, 3, 4]
+    assert _ids(db, Message.__table__) == [1, 2]
+    assert _ids(db, MessageRelevance.__table__) == [1]
+    with db.engine.connect() as connection:
+        author_ids = dict(connection.execute(select(Message.__table__.c.id, Message.__table__.c.author_id)).all())
+    assert author_ids == {1: 4, 2: 1}
+    assert set(UNIQUE_INDEXES) <= _indexes(db)
+    assert deduplicate_unique_keys(db) == []
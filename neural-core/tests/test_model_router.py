@@ -0,0 +1,79 @@
+"""Roteamento de modelos: o plano mais forte que cabe no orçamento"""
+from types import SimpleNamespace
+
+import pytest
+
+from services.model_router import ModelRouter
+from services.usage_ledger import UsageLedger
+from utils.config import Config
+
+# 1.000 mensagens de 200 caracteres: ~60K tokens, 5x o PROMPT_TOKEN_BUDGET
+MESSAGES = 1000
+MESSAGE_CHARS = 200_000
+TEMPLATE_CHARS = 2000
+
+@pytest.fixture
+def router(monkeypatch) -> ModelRouter:
+    monkeypatch.setenv("SUMMARY_MODELS", "gpt-4o,gpt-4o-mini")
+    monkeypatch.setenv("BULK_MODEL", "gpt-4o-mini")
+    monkeypatch.setenv("PROMPT_TOKEN_BUDGET", "12000")
+    monkeypatch.setenv("MIN_PROMPT_TOKENS", "1000")
+    monkeypatch.setenv("CALIBRATION_WINDOW", "0")  # sem histórico: calibração padrão
+    config = Config()
+    return ModelRouter(config, UsageLedger(SimpleNamespace(config=config)))
+
+def _plan(router: ModelRouter, max_cost: float):
+    return router.plan(1, MESSAGES, MESSAGE_CHARS, TEMPLATE_CHARS, max_cost=max_cost)
+
+def test_full_plan_uses_the_strongest_model_with_topic_notes(router):
+    plan = _plan(router, 1.0)
+    assert plan.fits
+    assert [step.stage for step in plan.steps] == ["topic_notes", "synthesis"]
+    assert plan.synthesis.model == "gpt-4o"
+    assert plan.bulk.model == "gpt-4o-mini"
+    assert plan.prompt_token_budget == 12000
+    assert plan.notes == []
+    assert plan.total_cost == pytest.approx(sum(step.cost for step in plan.steps))
+
+def test_downgrades_synthesis_before_dropping_notes(router):
+    plan = _plan(router, 0.03)
+    assert plan.fits
+    assert plan.synthesis.model == "gpt-4o-mini"
+    assert plan.bulk is not None
+    assert plan.total_cost <= 0.03
+    assert plan.notes == ["synthesis downgraded gpt-4o → gpt-4o-mini to fit the budget"]
+
+def test_drops_topic_notes_when_the_cheapest_model_does_not_fit(router):
+    plan = _plan(router, 0.005)
+    assert plan.fits
+    assert plan.bulk is None
+    assert plan.synthesis.model == "gpt-4o-mini"
+    assert plan.prompt_token_budget == 12000
+    assert "topic notes skipped to fit the budget" in plan.notes
+
+def test_shrinks_context_until_it_fits(router):
+    plan = _plan(router, 0.001)
+    assert plan.fits
+    assert plan.bulk is None
+    assert plan.prompt_token_budget == 3000
+    assert plan.total_cost <= 0.001
+    assert plan.notes[-1] == "context shrunk to 3,000 message tokens to fit the budget"
+
+def test_reports_a_plan_that_does_not_fit(router):
+    plan = _plan(router, 0.0001)
+    assert not plan.fits
+    assert plan.prompt_token_budget == 1000
+    assert plan.total_cost > 0.0001
+    assert plan.notes[-1].startswith("exceeds $0.0001")
+
+def test_latency_limit_picks_a_faster_plan(router):
+    router.config.SUMMARY_MAX_SECONDS = 10
+    plan = _plan(router, 1.0)
+    assert plan.synthesis.model == "gpt-4o-mini"
+    assert plan.seconds <= 10
+    assert plan.notes == ["synthesis downgraded gpt-4o → gpt-4o-mini to fit the cost and latency budget"]
+
+def test_small_period_has_a_single_synthesis_step(router):
+    plan = router.plan(1, 50, 5000, TEMPLATE_CHARS, max_cost=1.0)
+    assert [step.stage for step in plan.steps] == ["synthesis"]
+    assert plan.synthesis.model == "gpt-4o"
@@ -0,0 +1,85 @@
+"""Rollups de atividade: o rebuild bate com as agregações das mensagens"""
+from collections import Counter
+from datetime import timedelta
+
+import pytest
+
+from benchmarks.run import _load_messages
+from benchmarks.synthetic import SyntheticProfile
+from services.archive import MessageArchiver
+from services.database import DatabaseManager
+from services.rollups import hour_bucket, rebuild_rollups
+
+MESSAGES = 1500
+
+@pytest.fixture
+def db() -> DatabaseManager:
+    return DatabaseManager()
+
+@pytest.fixture
+def project(db):
+    project = db.create_project("Test", "@test_group")
+    _load_messages(db, project.id, MESSAGES, seed=7, profile=SyntheticProfile(author_count=50))
+    return db.get_project_by_name("Test")
+
+def _expected(messages) -> dict:
+    """Mensagens, links e caracteres por hora, direto das mensagens"""
+    hours = {}
+    for message in messages:
+        counts = hours.setdefault(hour_bucket(message.timestamp), Counter())
+        counts["messages"] += 1
+        counts["links"] += message.message_type == "link"
+        counts["chars"] += len(message.content)
+    return hours
+
+def _rollups(db, project) -> dict:
+    return {rollup.bucket_start: Counter(messages=rollup.message_count, links=rollup.link_count,
+                                         chars=rollup.char_count)
+            for rollup in db.get_activity_rollups(project.id)}
+
+def test_rebuild_matches_message_aggregates(db, project):
+    assert rebuild_rollups(db, project) == MESSAGES
+    messages = db.get_messages_by_project(project.id)
+
+    assert _rollups(db, project) == _expected(messages)
+    assert db.count_distinct_authors(project.id) == len({message.author for message in messages})
+    assert sum(count for _, count in db.get_top_authors(project.id, limit=1000)) == MESSAGES
+
+def test_rebuild_twice_does_not_double_count(db, project):
+    rebuild_rollups(db, project)
+    first = _rollups(db, project)
+    rebuild_rollups(db, db.get_project_by_name("Test"), flush_every=100)
+    assert _rollups(db, project) == first
+
+def test_activity_totals_use_rollups_and_partial_hours(db, project):
+    rebuild_rollups(db, project)
+    messages = db.get_messages_by_project(project.id)
+    start = messages[-1].timestamp + timedelta(minutes=17)
+    end = messages[0].timestamp - timedelta(minutes=23)
+    window = [message for message in messages if start <= message.timestamp <= end]
+
+    assert db.get_activity_totals(project.id, start, end) == (
+        len(window), sum(len(message.content) for message in window)
+    )
+
+def test_activity_totals_count_archived_partial_hours(db, project):
+    rebuild_rollups(db, project)
+    messages = db.get_messages_by_project(project.id)
+    # Arquiva até o meio de uma hora: a ponta inicial da janela fica no Parquet
+    cutoff = hour_bucket(messages[len(messages) // 2].timestamp) + timedelta(minutes=31)
+    result = MessageArchiver(db).archive_project(db.get_project_by_name("Test"), days=1, now=cutoff + timedelta(days=1))
+    assert 0 < result.messages_archived < MESSAGES
+
+    start = cutoff - timedelta(hours=3, minutes=12)
+    end = messages[0].timestamp - timedelta(minutes=23)
+    window = [message for message in messages if start <= message.timestamp <= end]
+    assert db.get_activity_totals(project.id, start, end) == (
+        len(window), sum(len(message.content) for message in window)
+    )
+    # Janela inteira antes de archived_before, dentro de uma hora
+    start, end = cutoff - timedelta(minutes=50), cutoff - timedelta(minutes=35)
+    window = [message for message in messages if start <= message.timestamp <= end]
+    assert window
+    assert db.get_activity_totals(project.id, start, end) == (
+        len(window), sum(len(message.content) for message in window)
+    )
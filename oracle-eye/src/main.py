@@ -2,10 +2,16 @@ import asyncio
 import logging
 import signal
 import sys
+import time
+from datetime import datetime, timedelta
 from pathlib import Path
 from services.telegram_collector import TelegramCollector
 from services.database import DatabaseManager
+from services.client_pool import CollectionDeferred
 from services.command_monitor import CommandMonitor
+from services.metrics import MetricsRegistry, MetricsServer
+from services.interval_policy import AdaptiveIntervalPolicy
+from services.scheduler import CollectionScheduler
 from utils.config import Config
 
 def setup_logging():
@@ -25,11 +31,19 @@ def setup_logging():
 logger = logging.getLogger(__name__)
 
 class OracleEyeService:
-    def __init__(self):
+    def __init__(self, client_factory=None):
         self.config = Config()
+        self.client_factory = client_factory
         self.db = DatabaseManager()
         self.collector = None
         self.command_monitor = CommandMonitor()
+        self.metrics = MetricsRegistry()
+        self.interval_policy = AdaptiveIntervalPolicy(self.config)
+        self.scheduler = CollectionScheduler(self.config)
+        self.watcher_task = None
+        self._commands_pending = True
+        self._reload_pending = False
+        self.metrics_server = None
         self.running = False
 
     async def initialize(self):
@@ -37,11 +51,16 @@ class OracleEyeService:
         logger.info("Testing database connection...")
         projects = self.db.get_active_projects()
         logger.info(f"Database connected. Found {len(projects)} active projects")
+        if self.config.METRICS_ENABLED:
+            self.metrics_server = MetricsServer(self.metrics, self.config.METRICS_HOST, self.config.METRICS_PORT)
+            await self.metrics_server.start()
         logger.info("Initializing Telegram collector...")
         self.collector = TelegramCollector(
             api_id=self.config.TELEGRAM_API_ID,
             api_hash=self.config.TELEGRAM_API_HASH,
-            phone=self.config.TELEGRAM_PHONE_NUMBER
+            phone=self.config.TELEGRAM_PHONE_NUMBER,
+            metrics=self.metrics,
+            client_factory=self.client_factory
         )
         await self.collector.start()
         logger.info("Telegram collector initialized successfully")
@@ -49,38 +68,112 @@ class OracleEyeService:
 
     async def start_collection_loop(self):
         logger.info("Starting continuous collection loop...")
-        while self.running:
-            try:
-                # Check for immediate collection commands first
-                commands = self.command_monitor.check_for_commands()
-                if commands:
-                    logger.info(f"Processing {len(commands)} immediate collection commands")
-                    for command in commands:
-                        await self.process_immediate_command(command)
-                
-                # Check for projects ready for scheduled collection
-                projects_ready = self.db.get_projects_ready_for_collection()
-                if projects_ready:
-                    logger.info(f"Starting scheduled collection for {len(projects_ready)} projects")
-                    for project in projects_ready:
-                        try:
-                            await self.collector.collect_messages(project)
-                            # Schedule next collection after successful collection
-                            self.db.schedule_next_collection(project.id, self.config.COLLECTION_INTERVAL)
-                            await asyncio.sleep(5)  # Small delay between projects
-                        except Exception as e:
-                            logger.error(f"Error collecting from {project.name}: {e}")
-                            continue
-                    
-                    logger.info("Scheduled collection cycle completed successfully")
-                else:
-                    logger.info("No projects ready for collection at this time")
-                
-                # Wait 1 minute before checking again (instead of 24 hours)
-                await asyncio.sleep(60)
-            except Exception as e:
-                logger.error(f"Collection loop error: {e}")
-                await asyncio.sleep(60 * 60)  # Wait 1 hour on error
+        self.scheduler.load(self.db.get_active_projects())
+        self.watcher_task = asyncio.create_task(self.watch_for_changes())
+        try:
+            while self.running:
+                iteration_started = time.perf_counter()
+                try:
+                    await self.run_scheduler_iteration()
+                    self.metrics.observe_loop_iteration(time.perf_counter() - iteration_started)
+                    self.metrics.set_backlog(self.scheduler.overdue_count())
+                    # Dorme até o próximo prazo ou até um comando/mudança de projetos
+                    await self.scheduler.wait()
+                except Exception as e:
+                    logger.error(f"Collection loop error: {e}")
+                    await asyncio.sleep(self.config.LOOP_ERROR_BACKOFF)
+        finally:
+            self.watcher_task.cancel()
+            await asyncio.gather(self.watcher_task, return_exceptions=True)
+    
+    async def run_scheduler_iteration(self):
+        """Processa comandos pendentes e os projetos cujo prazo venceu"""
+        if self._reload_pending:
+            self._reload_pending = False
+            self.scheduler.load(self.db.get_active_projects())
+        if self._commands_pending:
+            self._commands_pending = False
+            if self.command_monitor.consume_reload_request():
+                self.scheduler.load(self.db.get_active_projects())
+            commands = self.command_monitor.check_for_commands()
+            if commands:
+                logger.info(f"Processing {len(commands)} immediate collection commands")
+                for command in commands:
+                    await self.process_immediate_command(command)
+        
+        due = self.scheduler.pop_due()
+        if not due:
+            return
+        logger.info(f"Starting scheduled collection for {len(due)} projects")
+        backlog = len(due)
+        self.metrics.set_backlog(backlog)
+        for project_id in due:
+            # Relê o projeto: pode ter sido desativado ou reconfigurado desde o agendamento
+            project = self.db.get_project(project_id)
+            if project and project.is_active:
+                await self.collect_project(project)
+                await asyncio.sleep(self.config.COLLECTION_PROJECT_DELAY)  # Small delay between projects
+            backlog -= 1
+            self.metrics.set_backlog(backlog)
+        logger.info("Scheduled collection cycle completed")
+    
+    async def collect_project(self, project):
+        """Coleta um projeto agendado, com backoff por projeto em caso de erro"""
+        try:
+            messages_collected = await self.collector.collect_messages(project)
+            self.schedule_after_collection(project, messages_collected)
+        except CollectionDeferred as e:
+            self.defer_collection(project, e)
+        except Exception as e:
+            delay = self.scheduler.record_failure(project.id)
+            logger.error(f"Error collecting from {project.name}: {e} (retrying in {delay}s)")
+            self._persist_schedule(self.db.schedule_next_collection, project.id, delay)
+            self.scheduler.schedule(project.id, datetime.utcnow() + timedelta(seconds=delay))
+    
+    def defer_collection(self, project, deferred: CollectionDeferred):
+        """Reagenda sem contar como falha (sem backoff): sessões bloqueadas por FloodWait"""
+        delay = max(1, int(deferred.retry_after))
+        logger.warning(f"Collection of {project.name} deferred: {deferred} (retrying in {delay}s)")
+        self._persist_schedule(self.db.schedule_next_collection, project.id, delay)
+        self.scheduler.schedule(project.id, datetime.utcnow() + timedelta(seconds=delay))
+    
+    def _persist_schedule(self, write, *args):
+        """Grava o agendamento no projeto sem derrubar a coleta se o banco estiver ocupado
+
+        A fila em memória é quem decide a próxima coleta; o banco só guarda a cópia
+        para o restart e para o Neural Core (as mensagens já estão no spool).
+        """
+        try:
+            write(*args)
+        except Exception as e:
+            logger.warning(f"Could not save collection schedule, keeping it in memory: {getattr(e, 'orig', e)}")
+
+    async def watch_for_changes(self):
+        """Observa o diretório de comandos (só stat) e ressincroniza a fila periodicamente"""
+        signature = None
+        last_resync = time.monotonic()
+        while True:
+            current = self.command_monitor.signature()
+            if current != signature:
+                signature = current
+                self._commands_pending = True
+                self.scheduler.wake()
+            resync = self.config.SCHEDULER_RESYNC_INTERVAL
+            if resync and time.monotonic() - last_resync >= resync:
+                # Rede de segurança para alterações feitas direto no banco
+                last_resync = time.monotonic()
+                self._reload_pending = True
+                self.scheduler.wake()
+            await asyncio.sleep(self.config.COMMAND_POLL_INTERVAL)
+    
+    def schedule_after_collection(self, project, messages_collected: int):
+        """Atualiza a velocidade do projeto e agenda a próxima coleta adaptativamente"""
+        plan = self.interval_policy.plan(project, messages_collected or 0)
+        self._persist_schedule(self.db.record_collection, project.id, plan.interval_seconds, plan.message_velocity)
+        self.scheduler.record_success(project.id)
+        self.scheduler.schedule(project.id, datetime.utcnow() + timedelta(seconds=plan.interval_seconds))
+        self.metrics.record_schedule(project.name, plan.interval_seconds, plan.message_velocity)
+        logger.info(f"{project.name}: next collection in {plan.interval_seconds}s ({plan.reason})")
     
     async def process_immediate_command(self, command):
         """Process an immediate collection command"""
@@ -98,18 +191,19 @@ class OracleEyeService:
                 return
             
             # Collect messages
-            messages_before = self.db.get_message_count(project.id)
-            await self.collector.collect_messages(project)
-            messages_after = self.db.get_message_count(project.id)
-            messages_collected = messages_after - messages_before
+            messages_collected = await self.collector.collect_messages(project)
             
             # Schedule next collection after immediate collection
-            self.db.schedule_next_collection(project.id, self.config.COLLECTION_INTERVAL)
+            self.schedule_after_collection(project, messages_collected)
             
             # Mark as completed
             self.command_monitor.mark_command_completed(project_name, messages_collected)
             logger.info(f"Immediate collection completed for {project_name}: {messages_collected} new messages")
             
+        except CollectionDeferred as e:
+            self.defer_collection(project, e)
+            self.command_monitor.mark_command_failed(
+                project_name, f"{e}; collection rescheduled in {max(1, int(e.retry_after))}s")
         except Exception as e:
             error_msg = f"Error in immediate collection: {e}"
             logger.error(error_msg)
@@ -126,6 +220,8 @@ class OracleEyeService:
         if self.collector:
             await self.collector.disconnect()
             logger.info("Telegram collector stopped")
+        if self.metrics_server:
+            await self.metrics_server.stop()
         logger.info("Oracle Eye Service stopped successfully")
 
     def signal_handler(self, signum, frame):
@@ -1,5 +1,8 @@
 from .project import Project
 from .message import Message
 from .summary import Summary
+from .rollup import ActivityRollup, AuthorRollup
+from .content import MessageContent, ContentDictionary
+from .author import Author
 
-__all__ = ["Project", "Message", "Summary"]
+__all__ = ["Project", "Message", "Summary", "ActivityRollup", "AuthorRollup", "MessageContent", "ContentDictionary", "Author"]
@@ -0,0 +1,24 @@
+from sqlmodel import SQLModel, Field
+from sqlalchemy import BigInteger, Column, Index
+from typing import Optional
+from datetime import datetime
+
+class Author(SQLModel, table=True):
+    """Remetente do Telegram gravado uma vez (mensagens apontam por author_id)"""
+    __table_args__ = (
+        Index("ux_author_telegram_id", "telegram_id", unique=True),
+    )
+    
+    id: Optional[int] = Field(default=None, primary_key=True)
+    telegram_id: Optional[int] = Field(default=None, sa_column=Column(BigInteger))  # None: autor antigo só com nome
+    username: Optional[str] = Field(default=None)
+    display_name: str = Field(index=True)  # "@username" ou "Nome Sobrenome" (o antigo message.author)
+    is_admin: bool = Field(default=False)  # Admin/oficial pelos indicadores no nome (regra do RelevanceAnalyzer)
+    message_count: int = Field(default=0)  # Mantidos na ingestão, somando todos os projetos
+    spam_count: int = Field(default=0)
+    first_seen_at: datetime = Field(default_factory=datetime.utcnow)
+    last_seen_at: Optional[datetime] = Field(default=None)
+    
+    @property
+    def spam_ratio(self) -> float:
+        return self.spam_count / self.message_count if self.message_count else 0.0
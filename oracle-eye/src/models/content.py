@@ -0,0 +1,23 @@
+from sqlmodel import SQLModel, Field
+from sqlalchemy import Column, LargeBinary
+from typing import Optional
+from datetime import datetime
+
+class MessageContent(SQLModel, table=True):
+    """Texto de mensagem endereçado por hash: textos repetidos são gravados uma vez só"""
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    content_hash: str = Field(index=True, unique=True)  # blake2b-128 (hex) do texto UTF-8
+    codec: str = Field(default="raw")  # raw, zstd ou zstd-dict
+    dictionary_id: Optional[int] = Field(default=None, foreign_key="contentdictionary.id")
+    data: bytes = Field(sa_column=Column(LargeBinary, nullable=False))
+    char_count: int = Field(default=0)  # len(texto), sem precisar descomprimir
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class ContentDictionary(SQLModel, table=True):
+    """Dicionário zstd treinado com mensagens reais (imutável: conteúdos apontam para ele)"""
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    data: bytes = Field(sa_column=Column(LargeBinary, nullable=False))
+    sample_count: int = Field(default=0)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
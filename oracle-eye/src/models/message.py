@@ -1,4 +1,5 @@
 from sqlmodel import SQLModel, Field, Relationship
+from sqlalchemy import Index
 from typing import Optional, TYPE_CHECKING
 from datetime import datetime
 
@@ -7,14 +8,27 @@ if TYPE_CHECKING:
 
 class Message(SQLModel, table=True):
     """Modelo para mensagens coletadas do Telegram"""
+    __table_args__ = (
+        # Chave da ingestão em lote (ON CONFLICT DO NOTHING) e das consultas por período
+        Index("ux_message_project_telegram_id", "project_id", "telegram_message_id", unique=True),
+        Index("ix_message_project_timestamp", "project_id", "timestamp"),
+        Index("ix_message_project_author", "project_id", "author_id"),
+        # Conversas de um período: mensagens de cada thread de respostas
+        Index("ix_message_project_thread", "project_id", "thread_id"),
+    )
     
     id: Optional[int] = Field(default=None, primary_key=True)
     project_id: int = Field(foreign_key="project.id", index=True)
     telegram_message_id: int = Field(index=True)
-    content: str
-    author: Optional[str] = Field(default=None)
+    content: str = Field(default="")  # Texto inline (linhas antigas); novas mensagens usam content_id
+    content_id: Optional[int] = Field(default=None, foreign_key="messagecontent.id", index=True)
+    author: Optional[str] = Field(default=None)  # Nome inline (linhas antigas); novas mensagens usam author_id
+    author_id: Optional[int] = Field(default=None, foreign_key="author.id")
     timestamp: datetime = Field(index=True)
     message_type: str = Field(default="text")  # text, link, etc.
+    reply_to_message_id: Optional[int] = Field(default=None)  # telegram_message_id da mensagem respondida
+    thread_id: Optional[int] = Field(default=None)  # telegram_message_id da raiz da thread (a própria, se não é resposta)
+    forward_from: Optional[str] = Field(default=None)  # Origem de uma mensagem encaminhada (@canal, nome)
     collected_at: datetime = Field(default_factory=datetime.utcnow)
     
     # Relacionamento com Project
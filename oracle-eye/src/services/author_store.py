@@ -0,0 +1,174 @@
+"""
+Autores das mensagens: uma linha por remetente do Telegram
+
+As mensagens apontam para `author` por author_id em vez de repetir o nome. A
+tabela guarda username, nome exibido e atributos pré-calculados: admin/oficial
+(mesma regra do RelevanceAnalyzer) e mensagens/spam somados na ingestão. Linhas
+antigas com o nome inline em `message.author` continuam legíveis.
+"""
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import bindparam, case, select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm.attributes import set_committed_value
+
+from models import Author
+from services.relevance_analyzer import RelevanceAnalyzer
+
+logger = logging.getLogger(__name__)
+
+LOOKUP_CHUNK = 500
+
+def _chunks(items: List, size: int = LOOKUP_CHUNK) -> Iterable[List]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+@dataclass
+class AuthorActivity:
+    """Deltas de um autor a somar em `author` (mensagens, spam, última mensagem)"""
+    message_count: int = 0
+    spam_count: int = 0
+    last_seen_at: Optional[datetime] = None
+
+def record_activity(connection, totals: Dict[int, AuthorActivity]):
+    """Soma os deltas por author_id nas colunas pré-calculadas (um UPDATE em lote)"""
+    if not totals:
+        return
+    table = Author.__table__
+    seen = bindparam("seen")
+    connection.execute(
+        update(table).where(table.c.id == bindparam("author_key")).values(
+            message_count=table.c.message_count + bindparam("messages"),
+            spam_count=table.c.spam_count + bindparam("spam"),
+            last_seen_at=case((table.c.last_seen_at.is_(None) | (table.c.last_seen_at < seen), seen),
+                              else_=table.c.last_seen_at)
+        ),
+        [{"author_key": author_id, "messages": activity.message_count, "spam": activity.spam_count,
+          "seen": activity.last_seen_at} for author_id, activity in totals.items()]
+    )
+
+class AuthorStore:
+    """Grava (intern) e resolve (fill) os autores das mensagens"""
+
+    def __init__(self, relevance_analyzer: Optional[RelevanceAnalyzer] = None, cache_size: int = 100000):
+        self.relevance_analyzer = relevance_analyzer or RelevanceAnalyzer()
+        self.cache_size = cache_size
+        self._by_telegram_id: Dict[int, Tuple[int, Optional[str], str]] = {}  # -> (id, username, nome)
+        self._names: Dict[int, str] = {}
+
+    def _remember(self, telegram_id: int, author: Tuple[int, Optional[str], str]):
+        if len(self._by_telegram_id) >= self.cache_size:
+            self._by_telegram_id.clear()
+        self._by_telegram_id[telegram_id] = author
+
+    # Escrita
+    def new_row(self, display_name: str, telegram_id: Optional[int] = None,
+                username: Optional[str] = None) -> dict:
+        return {"telegram_id": telegram_id, "username": username, "display_name": display_name,
+                "is_admin": self.relevance_analyzer.is_admin_author(display_name),
+                "message_count": 0, "spam_count": 0, "first_seen_at": datetime.utcnow()}
+
+    def _lookup(self, connection, telegram_ids: List[int]) -> Dict[int, Tuple[int, Optional[str], str]]:
+        table = Author.__table__
+        found = {}
+        for chunk in _chunks(telegram_ids):
+            statement = select(table.c.telegram_id, table.c.id, table.c.username, table.c.display_name).where(
+                table.c.telegram_id.in_(chunk)
+            )
+            found.update({telegram_id: (author_id, username, name)
+                          for telegram_id, author_id, username, name in connection.execute(statement)})
+        return found
+
+    def intern(self, connection, senders: Iterable[dict]) -> Dict[int, int]:
+        """author_id de cada remetente (dicts com telegram_id, username, display_name)
+
+        Grava os novos na transação de `connection`; nome ou username trocado no
+        Telegram atualiza a linha (e o flag de admin).
+        """
+        by_id = {sender["telegram_id"]: sender for sender in senders}
+        ids, pending = {}, []
+        for telegram_id, sender in by_id.items():
+            cached = self._by_telegram_id.get(telegram_id)
+            if cached and cached[1:] == (sender["username"], sender["display_name"]):
+                ids[telegram_id] = cached[0]
+            else:
+                pending.append(telegram_id)
+        if not pending:
+            return ids
+
+        table = Author.__table__
+        found = self._lookup(connection, pending)
+        renamed = [telegram_id for telegram_id in pending if telegram_id in found
+                   and found[telegram_id][1:] != (by_id[telegram_id]["username"], by_id[telegram_id]["display_name"])]
+        if renamed:
+            connection.execute(
+                update(table).where(table.c.id == bindparam("author_key")).values(
+                    username=bindparam("new_username"), display_name=bindparam("new_display_name"),
+                    is_admin=bindparam("new_is_admin")),
+                [{"author_key": found[telegram_id][0], "new_username": by_id[telegram_id]["username"],
+                  "new_display_name": by_id[telegram_id]["display_name"],
+                  "new_is_admin": self.relevance_analyzer.is_admin_author(by_id[telegram_id]["display_name"])}
+                 for telegram_id in renamed]
+            )
+        missing = [telegram_id for telegram_id in pending if telegram_id not in found]
+        if missing:
+            # Autor antigo só com "@username" (compact-authors) ganha o telegram_id: usernames são únicos
+            claimable = [{"claim_id": telegram_id, "claim_name": by_id[telegram_id]["display_name"]}
+                         for telegram_id in missing if by_id[telegram_id]["username"]]
+            if claimable:
+                connection.execute(
+                    update(table).where(table.c.telegram_id.is_(None), table.c.display_name == bindparam("claim_name"))
+                    .values(telegram_id=bindparam("claim_id")),
+                    claimable
+                )
+            insert = postgresql_insert if connection.dialect.name == "postgresql" else sqlite_insert
+            connection.execute(
+                insert(table).on_conflict_do_nothing(index_elements=["telegram_id"]),
+                [self.new_row(by_id[telegram_id]["display_name"], telegram_id, by_id[telegram_id]["username"])
+                 for telegram_id in missing]
+            )
+            found.update(self._lookup(connection, missing))
+        for telegram_id in pending:
+            author_id = found[telegram_id][0]
+            ids[telegram_id] = author_id
+            self._remember(telegram_id, (author_id, by_id[telegram_id]["username"], by_id[telegram_id]["display_name"]))
+        return ids
+
+    # Leitura
+    def names(self, connection, author_ids: Iterable[Optional[int]]) -> Dict[int, str]:
+        """Nome exibido de cada author_id (cache em memória: poucos autores, muito repetidos)"""
+        wanted = {author_id for author_id in author_ids if author_id is not None}
+        missing = [author_id for author_id in wanted if author_id not in self._names]
+        if len(self._names) + len(missing) > self.cache_size:
+            self._names.clear()
+            missing = list(wanted)
+        table = Author.__table__
+        for chunk in _chunks(missing):
+            self._names.update(connection.execute(
+                select(table.c.id, table.c.display_name).where(table.c.id.in_(chunk))
+            ).all())
+        return {author_id: self._names[author_id] for author_id in wanted if author_id in self._names}
+
+    def fill(self, connection, messages: List) -> List:
+        """Preenche `author` de mensagens (objetos ou dicts) gravadas com author_id"""
+        if not messages:
+            return messages
+        as_dicts = isinstance(messages[0], dict)
+        author_ids = [m.get("author_id") for m in messages] if as_dicts else [m.author_id for m in messages]
+        if not any(author_ids):
+            return messages
+        names = self.names(connection, author_ids)
+        for message, author_id in zip(messages, author_ids):
+            name = names.get(author_id)
+            if name is None:
+                continue
+            if as_dicts:
+                message["author"] = name
+            else:
+                # Sem marcar o objeto como alterado, como o texto em ContentStore
+                set_committed_value(message, "author", name)
+        return messages
@@ -0,0 +1,196 @@
+"""
+Pool de sessões Telegram para a coleta
+
+Cada projeto tem uma sessão preferida, escolhida por rendezvous hashing para
+sobreviver a reinícios sem estado persistido. Um FloodWait bloqueia só a sessão
+que o recebeu: os projetos dela migram para a sessão livre menos carregada (de
+preferência uma que já coletou o projeto) e voltam para a preferida assim que ela
+fica livre; se todas estiverem bloqueadas, a coleta é adiada (CollectionDeferred).
+
+Grupos privados só respondem às contas que são membros: uma sessão que recebe
+ChannelPrivateError deixa de ser candidata para o projeto, que é adiado para
+tentar outra. Quando nenhuma sessão conectada tem acesso, a coleta falha.
+"""
+import logging
+import time
+import zlib
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+class CollectionDeferred(Exception):
+    """Nenhuma sessão disponível agora; tentar de novo em `retry_after` segundos"""
+
+    def __init__(self, retry_after: float, reason: str = ""):
+        self.retry_after = max(0.0, retry_after)
+        super().__init__(reason or f"All Telegram sessions are rate limited (retry in {self.retry_after:.0f}s)")
+
+def parse_sessions(value: str, default_phone: str) -> List[Tuple[str, str]]:
+    """'crypto_insights,collector2:+5511999990000' -> [(nome, telefone)]"""
+    sessions = []
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, phone = item.partition(":")
+        sessions.append((name.strip(), phone.strip() or default_phone))
+    return sessions
+
+@dataclass
+class PooledSession:
+    """Uma sessão (conta) do pool e seu estado de rate limit"""
+    name: str
+    phone: str
+    client: Any = None
+    flood_until: float = 0.0  # time.monotonic() até o fim do FloodWait
+    flood_waits: int = 0
+    projects: Set[int] = field(default_factory=set)
+    collected: Set[int] = field(default_factory=set)  # projetos que esta sessão já coletou (é membro)
+    denied: Set[int] = field(default_factory=set)  # projetos que responderam ChannelPrivateError
+
+    def throttled_for(self, now: Optional[float] = None) -> float:
+        return max(0.0, self.flood_until - (time.monotonic() if now is None else now))
+
+    @property
+    def available(self) -> bool:
+        return self.client is not None and self.throttled_for() == 0
+
+class TelegramClientPool:
+    """Distribui os projetos entre várias sessões/contas do Telegram"""
+
+    def __init__(self, api_id: int, api_hash: str, sessions: List[Tuple[str, str]], sessions_dir: Path,
+                 client_factory: Callable[..., Any], metrics=None):
+        if not sessions:
+            raise ValueError("At least one Telegram session is required")
+        self.api_id = api_id
+        self.api_hash = api_hash
+        self.sessions_dir = sessions_dir
+        self.client_factory = client_factory
+        self.metrics = metrics
+        self.sessions: Dict[str, PooledSession] = {name: PooledSession(name, phone) for name, phone in sessions}
+        self._assignments: Dict[int, str] = {}
+
+    async def start(self):
+        """Conecta todas as sessões; as que falharem ficam fora do pool"""
+        for session in self.sessions.values():
+            try:
+                client = self.client_factory(self.sessions_dir / session.name, self.api_id, self.api_hash)
+                await client.start(phone=session.phone)
+                session.client = client
+                logger.info(f"Telegram session '{session.name}' started")
+            except Exception as e:
+                logger.error(f"Error starting Telegram session '{session.name}': {e}")
+        if not any(session.client for session in self.sessions.values()):
+            raise RuntimeError("No Telegram session could be started")
+
+    async def disconnect(self):
+        for session in self.sessions.values():
+            if session.client:
+                await session.client.disconnect()
+                session.client = None
+
+    def _candidates(self, project_id: int) -> List[PooledSession]:
+        """Sessões conectadas que não receberam ChannelPrivateError do projeto"""
+        connected = [session for session in self.sessions.values() if session.client] or list(self.sessions.values())
+        return [session for session in connected if project_id not in session.denied]
+
+    def _home(self, project_id: int) -> Optional[PooledSession]:
+        """Sessão preferida do projeto (rendezvous hashing entre as candidatas)"""
+        candidates = self._candidates(project_id)
+        if not candidates:
+            return None
+        return max(candidates, key=lambda session: zlib.crc32(f"{session.name}:{project_id}".encode()))
+
+    def _assign(self, project_id: int, session: PooledSession):
+        previous = self._assignments.get(project_id)
+        if previous == session.name:
+            return
+        if previous:
+            self.sessions[previous].projects.discard(project_id)
+        self._assignments[project_id] = session.name
+        session.projects.add(project_id)
+
+    def least_loaded(self, project_id: Optional[int] = None) -> PooledSession:
+        """Sessão livre com menos projetos (CollectionDeferred se todas estiverem bloqueadas)
+
+        Com `project_id`, só as candidatas do projeto, e as que já o coletaram primeiro.
+        """
+        sessions = self._candidates(project_id) if project_id is not None else list(self.sessions.values())
+        free = [session for session in sessions if session.available]
+        if not free:
+            raise CollectionDeferred(self.retry_after(sessions))
+        return min(free, key=lambda session: (project_id not in session.collected, len(session.projects), session.name))
+
+    def session_for(self, project_id: int) -> PooledSession:
+        """Sessão do projeto: a preferida quando livre, senão a livre menos carregada"""
+        name = self._assignments.get(project_id)
+        home = self._home(project_id)
+        if home is None:
+            raise CollectionDeferred(0, f"No connected Telegram session can access project {project_id}")
+        current = self.sessions[name] if name else None
+        if home.available:
+            session = home
+        elif current and current.available:
+            session = current
+        else:
+            session = self.least_loaded(project_id)
+        if name and name != session.name:
+            direction = "back to" if session is home else "to"
+            logger.info(f"Moving project {project_id} from session '{name}' {direction} '{session.name}'")
+        self._assign(project_id, session)
+        self._record(session)
+        return session
+
+    def report_collected(self, session: PooledSession, project_id: int):
+        """A sessão coletou o projeto: é membro do grupo, candidata preferida numa migração"""
+        session.collected.add(project_id)
+
+    def report_private(self, session: PooledSession, project_id: int) -> bool:
+        """ChannelPrivateError: a sessão deixa de ser candidata para o projeto
+
+        Retorna True se outra sessão conectada ainda pode tentar. Sem nenhuma, as
+        marcas do projeto são limpas (a conta pode entrar no grupo depois) e retorna False.
+        """
+        session.denied.add(project_id)
+        session.collected.discard(project_id)
+        session.projects.discard(project_id)
+        self._assignments.pop(project_id, None)
+        self._record(session)
+        if self._candidates(project_id):
+            logger.warning(f"Session '{session.name}' cannot access project {project_id}; trying another session")
+            return True
+        for pooled in self.sessions.values():
+            pooled.denied.discard(project_id)
+        return False
+
+    def report_flood_wait(self, session: PooledSession, seconds: float):
+        """Bloqueia a sessão até o fim do FloodWait (os outros projetos seguem nas demais)"""
+        session.flood_until = max(session.flood_until, time.monotonic() + seconds)
+        session.flood_waits += 1
+        logger.warning(f"Telegram session '{session.name}' rate limited for {seconds}s "
+                       f"({len(session.projects)} projects will move to other sessions)")
+        self._record(session)
+
+    def retry_after(self, sessions: Optional[List[PooledSession]] = None) -> float:
+        """Segundos até alguma sessão (de `sessions`, padrão todas) ficar livre (0 se já houver uma)"""
+        connected = [session for session in (self.sessions.values() if sessions is None else sessions) if session.client]
+        if not connected:
+            return 0.0
+        now = time.monotonic()
+        return min(session.throttled_for(now) for session in connected)
+
+    def status(self) -> List[Dict[str, Any]]:
+        now = time.monotonic()
+        return [{
+            "session": session.name,
+            "connected": session.client is not None,
+            "projects": len(session.projects),
+            "throttled_seconds": round(session.throttled_for(now), 1),
+            "flood_waits": session.flood_waits,
+        } for session in self.sessions.values()]
+
+    def _record(self, session: PooledSession):
+        if self.metrics:
+            self.metrics.record_session(session.name, len(session.projects), session.throttled_for())
@@ -1,5 +1,6 @@
 import json
 import logging
+import os
 from pathlib import Path
 from typing import Optional, Dict, Any
 from datetime import datetime
@@ -34,6 +35,26 @@ class CommandMonitor:
         
         return commands
     
+    def signature(self) -> tuple:
+        """Assinatura barata (só stat) do diretório de comandos para detectar mudanças"""
+        try:
+            entries = [entry.stat().st_mtime_ns for entry in os.scandir(self.commands_dir) if entry.is_file()]
+        except OSError:
+            return (0, 0)
+        return (len(entries), max(entries, default=0))
+    
+    def consume_reload_request(self) -> bool:
+        """Retorna True (uma vez) se o Neural Core sinalizou mudança nos projetos"""
+        signal_file = self.commands_dir / "projects_changed.json"
+        try:
+            if signal_file.exists():
+                signal_file.unlink()
+                logger.info("Project changes signalled, reloading schedule")
+                return True
+        except OSError as e:
+            logger.error(f"Error consuming project change signal: {e}")
+        return False
+    
     def mark_command_processing(self, project_name: str):
         """Mark a command as being processed"""
         command_file = self.commands_dir / f"collect_{project_name.lower()}.json"
@@ -0,0 +1,181 @@
+"""
+Armazenamento do texto das mensagens endereçado por conteúdo
+
+Cada texto distinto vira uma linha de `messagecontent` (chave: hash blake2b do
+texto) e as mensagens apontam para ela por `content_id`: anúncios e spam
+repetidos milhares de vezes ocupam uma linha só, e content_id igual é um sinal
+de duplicata sem custo. O texto é comprimido com zstd, usando o dicionário
+treinado mais recente (`contentdictionary`) quando houver; fica cru quando a
+compressão não ajuda. Linhas antigas com o texto inline em `message.content`
+continuam legíveis.
+"""
+import hashlib
+import logging
+import time
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm.attributes import set_committed_value
+
+from models import ContentDictionary, Message, MessageContent
+
+try:
+    import zstandard
+except ImportError:  # sem zstandard: conteúdo novo gravado sem compressão
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+LOOKUP_CHUNK = 500
+CONTENT_LABELS = [("codec", "content_codec"), ("dictionary_id", "content_dictionary_id"), ("data", "content_data")]
+DICTIONARY_CHECK_INTERVAL = 60.0  # segundos entre verificações de dicionário novo
+
+def content_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+def _chunks(items: List, size: int = LOOKUP_CHUNK) -> Iterable[List]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+class ContentStore:
+    """Grava (intern) e lê (messages, with_content) textos de mensagens na tabela de conteúdo"""
+
+    def __init__(self, compression: str = "zstd", level: int = 3, cache_size: int = 50000):
+        self.compression = compression if zstandard else "none"
+        self.level = level
+        self.cache_size = cache_size
+        self._cache: Dict[int, str] = {}
+        self._dictionary_id: Optional[int] = None
+        self._compressor = None
+        self._checked_at = 0.0
+        self._decompressors: Dict[Optional[int], object] = {}
+
+    # Escrita
+    def _current_compressor(self, connection):
+        """Compressor com o dicionário mais recente (reconsultado a cada DICTIONARY_CHECK_INTERVAL)"""
+        if self.compression != "zstd":
+            return None, None
+        now = time.monotonic()
+        if self._compressor is None or now - self._checked_at >= DICTIONARY_CHECK_INTERVAL:
+            self._checked_at = now
+            latest = connection.execute(select(func.max(ContentDictionary.__table__.c.id))).scalar()
+            if self._compressor is None or latest != self._dictionary_id:
+                dictionary = self._load_dictionary(connection, latest) if latest else None
+                self._compressor = zstandard.ZstdCompressor(level=self.level, dict_data=dictionary)
+                self._dictionary_id = latest
+        return self._compressor, self._dictionary_id
+
+    def current_dictionary_id(self, connection) -> Optional[int]:
+        return self._current_compressor(connection)[1]
+
+    def reload_dictionary(self):
+        """Usa o dicionário mais recente já na próxima gravação"""
+        self._compressor = None
+
+    def encode(self, text: str, connection) -> dict:
+        """Linha de `messagecontent` para um texto (comprimido só quando fica menor)"""
+        raw = text.encode("utf-8")
+        row = {"content_hash": content_hash(text), "codec": "raw", "dictionary_id": None,
+               "data": raw, "char_count": len(text)}
+        compressor, dictionary_id = self._current_compressor(connection)
+        if compressor is not None:
+            packed = compressor.compress(raw)
+            if len(packed) < len(raw):
+                row.update(codec="zstd-dict" if dictionary_id else "zstd", dictionary_id=dictionary_id, data=packed)
+        return row
+
+    def _lookup(self, connection, hashes: List[str]) -> Dict[str, int]:
+        table = MessageContent.__table__
+        found = {}
+        for chunk in _chunks(hashes):
+            statement = select(table.c.content_hash, table.c.id).where(table.c.content_hash.in_(chunk))
+            found.update(dict(connection.execute(statement).all()))
+        return found
+
+    def intern(self, connection, texts: Iterable[str]) -> Dict[str, int]:
+        """content_id de cada texto, gravando os que ainda não existem (na transação de `connection`)"""
+        by_hash = {content_hash(text): text for text in texts}
+        ids = self._lookup(connection, list(by_hash))
+        missing = [self.encode(text, connection) for digest, text in by_hash.items() if digest not in ids]
+        if missing:
+            table = MessageContent.__table__
+            insert = postgresql_insert if connection.dialect.name == "postgresql" else sqlite_insert
+            # Outro processo pode gravar o mesmo texto ao mesmo tempo: o hash único resolve
+            connection.execute(insert(table).on_conflict_do_nothing(index_elements=["content_hash"]), missing)
+            ids.update(self._lookup(connection, [row["content_hash"] for row in missing]))
+        return {text: ids[digest] for digest, text in by_hash.items()}
+
+    # Leitura
+    def _load_dictionary(self, connection, dictionary_id: int):
+        data = connection.execute(
+            select(ContentDictionary.__table__.c.data).where(ContentDictionary.__table__.c.id == dictionary_id)
+        ).scalar()
+        return zstandard.ZstdCompressionDict(data)
+
+    def _decompressor(self, connection, dictionary_id: Optional[int]):
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read compressed message content (pip install zstandard)")
+        if dictionary_id not in self._decompressors:
+            dictionary = self._load_dictionary(connection, dictionary_id) if dictionary_id else None
+            self._decompressors[dictionary_id] = zstandard.ZstdDecompressor(dict_data=dictionary)
+        return self._decompressors[dictionary_id]
+
+    def decode(self, connection, codec: str, dictionary_id: Optional[int], data: bytes) -> str:
+        if codec != "raw":
+            data = self._decompressor(connection, dictionary_id).decompress(data)
+        return bytes(data).decode("utf-8")
+
+    def with_content(self, statement, message_table=None):
+        """Acrescenta ao SELECT de mensagens o texto gravado (LEFT JOIN em messagecontent)"""
+        content = MessageContent.__table__
+        message_table = message_table if message_table is not None else Message.__table__
+        return statement.add_columns(*[content.c[name].label(label) for name, label in CONTENT_LABELS]).outerjoin(
+            content, content.c.id == message_table.c.content_id
+        )
+
+    def _text(self, connection, content_id: int, codec: str, dictionary_id: Optional[int], data: bytes) -> str:
+        """Texto de um conteúdo (textos repetidos são descomprimidos uma vez, via cache)"""
+        text = self._cache.get(content_id)
+        if text is None:
+            text = self.decode(connection, codec, dictionary_id, data)
+            if len(self._cache) >= self.cache_size:
+                self._cache.clear()
+            self._cache[content_id] = text
+        return text
+
+    def messages(self, session, statement) -> List:
+        """Executa um SELECT de Message e preenche `content` com o texto da tabela de conteúdo
+
+        Os conteúdos vêm numa consulta só (id IN subconsulta com os mesmos filtros), sem
+        JOIN por linha no ORM.
+        """
+        messages = list(session.exec(statement))
+        if not any(message.content_id for message in messages):
+            return messages
+        content = MessageContent.__table__
+        content_ids = statement.with_only_columns(Message.content_id).order_by(None)
+        texts = {
+            content_id: self._text(session, content_id, codec, dictionary_id, data)
+            for content_id, codec, dictionary_id, data in session.execute(
+                select(content.c.id, content.c.codec, content.c.dictionary_id, content.c.data)
+                .where(content.c.id.in_(content_ids))
+            )
+        }
+        for message in messages:
+            if message.content_id is not None:
+                # Sem marcar o objeto como alterado: o texto nunca volta para message.content
+                set_committed_value(message, "content", texts[message.content_id])
+        return messages
+
+    def rows(self, connection, rows) -> List[dict]:
+        """Dicts de linhas (mappings) de `with_content`, com `content` preenchido"""
+        result = []
+        for row in rows:
+            row = dict(row)
+            codec, dictionary_id, data = (row.pop(label, None) for _, label in CONTENT_LABELS)
+            if codec is not None:
+                row["content"] = self._text(connection, row["content_id"], codec, dictionary_id, data)
+            result.append(row)
+        return result
@@ -1,28 +1,93 @@
 import logging
 from typing import List, Optional
-from datetime import datetime
-from sqlmodel import SQLModel, create_engine, Session, select
+from datetime import datetime, timezone
+from sqlalchemy import bindparam, func, inspect, select as sa_select, text
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import SQLModel, Session, select
 from models import Project, Message, Summary
+from services.author_store import AuthorStore
+from services.content_store import ContentStore
 from utils.config import Config
+from utils.db_engine import create_database_engine
 
 logger = logging.getLogger(__name__)
 
+def count_duplicate_keys(connection, table, columns) -> int:
+    """Valores repetidos da chave `columns` (chaves com NULL não conflitam num índice único)"""
+    repeated = sa_select(*columns).where(*[column.is_not(None) for column in columns]).group_by(*columns).having(
+        func.count() > 1
+    ).subquery()
+    return connection.execute(sa_select(func.count()).select_from(repeated)).scalar()
+
 class DatabaseManager:
     def __init__(self, db_url: Optional[str] = None):
         self.config = Config()
         self.db_url = db_url or self.config.DATABASE_URL
-        self.engine = create_engine(self.db_url, echo=False)
+        self.engine = create_database_engine(self.db_url, self.config)
+        self.content_store = ContentStore(self.config.CONTENT_COMPRESSION, self.config.CONTENT_ZSTD_LEVEL)
+        self.author_store = AuthorStore()
         self._create_tables()
     
     def _create_tables(self):
         """Cria as tabelas no banco de dados"""
         try:
             SQLModel.metadata.create_all(self.engine)
+            self._add_missing_columns()
+            self._add_missing_indexes()
             logger.info("Database tables created successfully")
         except Exception as e:
             logger.error(f"Error creating database tables: {e}")
             raise
     
+    def _add_missing_columns(self):
+        """Adiciona às tabelas existentes as colunas novas dos modelos (create_all não altera tabelas)"""
+        inspector = inspect(self.engine)
+        existing_tables = set(inspector.get_table_names())
+        with self.engine.begin() as connection:
+            for table in SQLModel.metadata.sorted_tables:
+                if table.name not in existing_tables:
+                    continue
+                existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+                for column in table.columns:
+                    if column.name in existing_columns:
+                        continue
+                    ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=self.engine.dialect)}"
+                    default = column.default.arg if column.default is not None and column.default.is_scalar else None
+                    if isinstance(default, bool):
+                        ddl += f" DEFAULT {'TRUE' if default else 'FALSE'}"
+                    elif isinstance(default, (int, float)):
+                        ddl += f" DEFAULT {default}"
+                    elif isinstance(default, str):
+                        ddl += " DEFAULT '" + default.replace("'", "''") + "'"
+                    connection.execute(text(ddl))
+                    logger.info(f"Added column {table.name}.{column.name}")
+    
+    def _add_missing_indexes(self):
+        """Cria nas tabelas existentes os índices novos dos modelos
+
+        Um índice único só é criado se a chave não tem duplicatas; senão fica para o
+        comando `dedupe-db` do Neural Core, que remove as linhas repetidas explicitamente.
+        """
+        inspector = inspect(self.engine)
+        existing_tables = set(inspector.get_table_names())
+        for table in SQLModel.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name in existing_indexes:
+                    continue
+                with self.engine.begin() as connection:
+                    if index.unique:
+                        duplicates = count_duplicate_keys(connection, table, list(index.columns))
+                        if duplicates:
+                            logger.error(f"Not creating unique index {index.name}: {duplicates} duplicate keys "
+                                         f"in {table.name}. Run `python src/main.py dedupe-db` (Neural Core) to remove them")
+                            continue
+                    index.create(connection)
+                logger.info(f"Created index {index.name}")
+    
     def get_session(self) -> Session:
         """Retorna uma sessão do banco de dados"""
         return Session(self.engine)
@@ -34,7 +99,8 @@ class DatabaseManager:
             project = Project(
                 name=name,
                 telegram_group=telegram_group,
-                is_active=is_active
+                is_active=is_active,
+                rollups_complete_at=datetime.utcnow()  # Projeto novo: rollups completos desde o início
             )
             session.add(project)
             session.commit()
@@ -42,6 +108,11 @@ class DatabaseManager:
             logger.info(f"Project '{name}' created successfully")
             return project
     
+    def get_project(self, project_id: int) -> Optional[Project]:
+        """Busca um projeto pelo ID"""
+        with self.get_session() as session:
+            return session.get(Project, project_id)
+    
     def get_project_by_name(self, name: str) -> Optional[Project]:
         """Busca um projeto pelo nome"""
         with self.get_session() as session:
@@ -86,22 +157,102 @@ class DatabaseManager:
     def create_message(self, project_id: int, telegram_message_id: int, 
                       content: str, author: Optional[str] = None, 
                       timestamp: Optional[datetime] = None,
-                      message_type: str = "text") -> Message:
-        """Cria uma nova mensagem"""
-        with self.get_session() as session:
-            message = Message(
-                project_id=project_id,
-                telegram_message_id=telegram_message_id,
-                content=content,
-                author=author,
-                timestamp=timestamp or datetime.utcnow(),
-                message_type=message_type
-            )
-            session.add(message)
-            session.commit()
-            session.refresh(message)
-            return message
+                      message_type: str = "text") -> Optional[Message]:
+        """Cria uma nova mensagem (None se ela já existe)"""
+        stored = self.create_messages(project_id, [{
+            "telegram_message_id": telegram_message_id,
+            "content": content,
+            "author": author,
+            "timestamp": timestamp,
+            "message_type": message_type
+        }])
+        return stored[0] if stored else None
     
+    def create_messages(self, project_id: int, rows: List[dict], rollups=None) -> List[Message]:
+        """Insere um lote de mensagens ignorando as já existentes; retorna as inseridas
+
+        Um INSERT multi-VALUES com ON CONFLICT DO NOTHING na chave
+        (project_id, telegram_message_id), igual em SQLite e PostgreSQL. O texto vai
+        para a tabela de conteúdo (deduplicado e comprimido) e a mensagem guarda content_id;
+        linhas com `sender` (telegram_id, username, display_name) guardam só author_id.
+        `thread_id` vem de `reply_to_message_id` (ver `_resolve_threads`).
+        Com `rollups` (RollupAccumulator), as inseridas são somadas aos rollups na mesma transação.
+        """
+        if not rows:
+            return []
+        now = datetime.utcnow()
+        values = []
+        for row in rows:
+            timestamp = row.get("timestamp") or now
+            if timestamp.tzinfo is not None:
+                timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+            values.append({"message_type": "text", "author": None, "sender": None,
+                           "reply_to_message_id": None, "forward_from": None, **row,
+                           "project_id": project_id, "timestamp": timestamp, "collected_at": now})
+
+        table = Message.__table__
+        insert = postgresql_insert if self.engine.dialect.name == "postgresql" else sqlite_insert
+        statement = insert(table).on_conflict_do_nothing(
+            index_elements=["project_id", "telegram_message_id"]
+        ).returning(table.c.id, table.c.telegram_message_id)
+        with self.engine.begin() as connection:
+            content_ids = self.content_store.intern(connection, [value["content"] for value in values])
+            author_ids = self.author_store.intern(connection, [value["sender"] for value in values if value["sender"]])
+            for value in values:
+                value["content_id"] = content_ids[value["content"]]
+                sender = value.pop("sender")
+                value["author_id"] = author_ids[sender["telegram_id"]] if sender else None
+            self._resolve_threads(connection, project_id, values)
+            rows = [{**value, "content": "", "author": None if value["author_id"] else value["author"]}
+                    for value in values]
+            inserted = {telegram_id: row_id for row_id, telegram_id in connection.execute(statement, rows)}
+            self._relink_threads(connection, project_id, values)
+            messages = [Message(id=inserted[value["telegram_message_id"]], **value)
+                        for value in values if value["telegram_message_id"] in inserted]
+            if rollups is not None:
+                for message in messages:
+                    rollups.add(message)
+                rollups.flush(connection)
+        return messages
+
+    def _resolve_threads(self, connection, project_id: int, values: List[dict]) -> None:
+        """Preenche `thread_id` (raiz da thread) pelas respostas do lote e das mensagens já gravadas
+
+        Resposta a uma mensagem ainda não coletada fica na thread dessa mensagem;
+        `_relink_threads` corrige quando ela chegar.
+        """
+        table = Message.__table__
+        batch_ids = {value["telegram_message_id"] for value in values}
+        parents = {value["reply_to_message_id"] for value in values if value["reply_to_message_id"]} - batch_ids
+        threads = {}
+        if parents:
+            threads = dict(connection.execute(sa_select(table.c.telegram_message_id, table.c.thread_id).where(
+                table.c.project_id == project_id, table.c.telegram_message_id.in_(parents)
+            )).all())
+        for value in sorted(values, key=lambda v: v["telegram_message_id"]):
+            parent = value["reply_to_message_id"]
+            value["thread_id"] = (threads.get(parent) or parent) if parent else value["telegram_message_id"]
+            threads[value["telegram_message_id"]] = value["thread_id"]
+
+    def _relink_threads(self, connection, project_id: int, values: List[dict]) -> None:
+        """Move para a raiz as respostas gravadas antes das mensagens deste lote (a coleta vem das mais novas)"""
+        moved = [{"project": project_id, "old": value["telegram_message_id"], "new": value["thread_id"]}
+                 for value in values if value["thread_id"] != value["telegram_message_id"]]
+        if moved:
+            table = Message.__table__
+            connection.execute(table.update().where(
+                table.c.project_id == bindparam("project"), table.c.thread_id == bindparam("old")
+            ).values(thread_id=bindparam("new")), moved)
+
+    def advance_collected_message_id(self, project_id: int, message_id: int) -> None:
+        """Avança o checkpoint de coleta do projeto (nunca volta para um id menor)"""
+        table = Project.__table__
+        with self.engine.begin() as connection:
+            connection.execute(table.update().where(
+                table.c.id == project_id,
+                table.c.last_collected_message_id.is_(None) | (table.c.last_collected_message_id < message_id)
+            ).values(last_collected_message_id=message_id))
+
     def get_messages_by_project(self, project_id: int, 
                                start_date: Optional[datetime] = None,
                                end_date: Optional[datetime] = None) -> List[Message]:
@@ -115,7 +266,7 @@ class DatabaseManager:
                 statement = statement.where(Message.timestamp <= end_date)
             
             statement = statement.order_by(Message.timestamp.desc())
-            return list(session.exec(statement))
+            return self.author_store.fill(session, self.content_store.messages(session, statement))
     
     def get_last_message_id(self, project_id: int) -> Optional[int]:
         """Retorna o ID da última mensagem coletada de um projeto"""
@@ -173,6 +324,29 @@ class DatabaseManager:
             statement = select(Project)
             return list(session.exec(statement))
     
+    def record_collection(self, project_id: int, interval_seconds: int,
+                          message_velocity: Optional[float] = None,
+                          collected_at: Optional[datetime] = None) -> Optional[Project]:
+        """Registra uma coleta concluída e agenda a próxima conforme o intervalo calculado"""
+        from datetime import timedelta
+        with self.get_session() as session:
+            project = session.get(Project, project_id)
+            if not project:
+                return None
+            
+            now = collected_at or datetime.utcnow()
+            project.last_collected_at = now
+            project.message_velocity = message_velocity
+            project.next_collection_at = now + timedelta(seconds=interval_seconds)
+            project.updated_at = now
+            
+            session.add(project)
+            session.commit()
+            session.refresh(project)
+            logger.info(f"Next collection scheduled for {project.name} at {project.next_collection_at} "
+                        f"(interval {interval_seconds}s)")
+            return project
+    
     def schedule_next_collection(self, project_id: int, interval_seconds: int) -> Optional[Project]:
         """Agenda a próxima coleta para um projeto"""
         from datetime import datetime, timedelta
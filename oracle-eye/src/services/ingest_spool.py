@@ -0,0 +1,320 @@
+"""
+Spool local de ingestão: a coleta não depende do banco estar livre
+
+O coletor grava cada lote de mensagens buscadas num segmento append-only em
+SPOOL_DIR (uma linha JSON por lote, com fsync) e segue para o próximo; o
+SpoolDrainer grava o spool no banco em lotes, em segundo plano. Se o banco
+recusa a escrita (ex: `database is locked` enquanto o Neural Core roda uma
+consulta longa), os lotes ficam no disco e o drenador tenta de novo com
+backoff. Nada se perde num restart: o checkpoint (segmento, offset) só avança
+depois do commit no banco, e repetir um lote é inofensivo (ON CONFLICT DO NOTHING).
+Com SPOOL_MAX_PENDING mensagens pendentes, a coleta espera o drenador (backpressure).
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from services.rollups import RollupAccumulator
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".log"
+CHECKPOINT_FILE = "checkpoint.json"
+
+Position = Tuple[int, int]  # (segmento, offset em bytes)
+
+def _encode(value) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"),
+                      default=lambda v: v.isoformat() if isinstance(v, datetime) else str(v))
+
+@dataclass
+class SpoolRecord:
+    """Um lote de mensagens buscadas de um projeto"""
+    project_id: int
+    rows: List[dict] = field(default_factory=list)
+    last_message_id: Optional[int] = None  # no último lote de uma coleta completa: maior id visto (inclui mídia)
+
+class IngestSpool:
+    """Segmentos append-only de lotes (JSON por linha) e o checkpoint do que já está no banco
+
+    Um processo por SPOOL_DIR. `append` é chamado pelo loop de coleta e
+    `read`/`commit` pela thread do drenador; um lock serializa o acesso.
+    """
+
+    def __init__(self, directory, segment_bytes: int = 16 * 1024 * 1024, fsync: bool = True):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._file = None
+        self.pending_messages = 0
+        self.pending_records = 0
+        self._high_water: Dict[int, int] = {}
+        self._checkpoint = self._load_checkpoint()
+        self._recover()
+
+    # Arquivos
+    def _segment_path(self, segment: int) -> Path:
+        return self.directory / f"{SEGMENT_PREFIX}{segment:010d}{SEGMENT_SUFFIX}"
+
+    def _segments(self) -> List[int]:
+        return sorted(int(path.name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+                      for path in self.directory.glob(f"{SEGMENT_PREFIX}*{SEGMENT_SUFFIX}"))
+
+    def _load_checkpoint(self) -> Position:
+        try:
+            with open(self.directory / CHECKPOINT_FILE, encoding="utf-8") as f:
+                data = json.load(f)
+            return data["segment"], data["offset"]
+        except FileNotFoundError:
+            segments = self._segments()
+            return (segments[0] if segments else 1), 0
+
+    def _write_checkpoint(self, position: Position):
+        """Troca atômica (arquivo temporário + rename) para sobreviver a uma queda no meio"""
+        path = self.directory / CHECKPOINT_FILE
+        temporary = path.with_suffix(".tmp")
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump({"segment": position[0], "offset": position[1]}, f)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.replace(temporary, path)
+
+    def _recover(self):
+        """Descarta a linha incompleta de uma queda durante o append e reconta o pendente"""
+        segments = self._segments()
+        if segments:
+            last = self._segment_path(segments[-1])
+            data = last.read_bytes()
+            complete = data.rfind(b"\n") + 1
+            if complete < len(data):
+                logger.warning(f"Discarding {len(data) - complete} bytes of an incomplete spool record in {last.name}")
+                with open(last, "r+b") as f:
+                    f.truncate(complete)
+        for record, _ in self._read_from(self._checkpoint, None):
+            self._count(record, 1)
+        if self.pending_records:
+            logger.info(f"Ingest spool has {self.pending_messages:,} messages ({self.pending_records} batches) "
+                        f"waiting from a previous run")
+
+    def _count(self, record: SpoolRecord, sign: int):
+        self.pending_records += sign
+        self.pending_messages += sign * len(record.rows)
+        if sign > 0 and record.last_message_id:
+            # Só o id do fim de uma coleta completa: as mensagens vêm da mais nova para a mais antiga
+            self._high_water[record.project_id] = max(self._high_water.get(record.project_id, 0),
+                                                      record.last_message_id)
+
+    # Escrita
+    def append(self, record: SpoolRecord):
+        """Grava um lote no segmento atual (durável ao retornar, com SPOOL_FSYNC)"""
+        line = (_encode({"project_id": record.project_id, "last_message_id": record.last_message_id,
+                         "rows": record.rows}) + "\n").encode("utf-8")
+        with self._lock:
+            if self._file is None or self._file.tell() >= self.segment_bytes:
+                self._rotate()
+            self._file.write(line)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self._count(record, 1)
+
+    def _rotate(self):
+        segments = self._segments()
+        if self._file is not None:
+            self._file.close()
+            segment = segments[-1] + 1
+        else:
+            # Primeiro append do processo: continua no último segmento (já sem linha incompleta)
+            segment = segments[-1] if segments else self._checkpoint[0]
+        self._file = open(self._segment_path(segment), "ab")
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    # Leitura (drenador)
+    def _read_from(self, position: Position, max_rows: Optional[int]) -> List[Tuple[SpoolRecord, Position]]:
+        """Lotes a partir de `position` com a posição logo depois de cada um"""
+        records = []
+        rows = 0
+        segment, offset = position
+        for current in [s for s in self._segments() if s >= segment]:
+            if current != segment:
+                offset = 0
+            with open(self._segment_path(current), "rb") as f:
+                f.seek(offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # append em andamento
+                    offset += len(line)
+                    try:
+                        data = json.loads(line)
+                    except ValueError:
+                        logger.error(f"Skipping unreadable spool record in segment {current} at byte {offset - len(line)}")
+                        continue
+                    for row in data["rows"]:
+                        row["timestamp"] = datetime.fromisoformat(row["timestamp"])
+                    records.append((SpoolRecord(data["project_id"], data["rows"], data.get("last_message_id")),
+                                    (current, offset)))
+                    rows += len(data["rows"])
+                    if max_rows is not None and rows >= max_rows:
+                        return records
+        return records
+
+    def read(self, max_rows: int) -> List[Tuple[SpoolRecord, Position]]:
+        """Próximos lotes ainda não gravados no banco (pelo menos um, até ~max_rows mensagens)"""
+        with self._lock:
+            return self._read_from(self._checkpoint, max_rows)
+
+    def commit(self, records: List[Tuple[SpoolRecord, Position]]):
+        """Marca os lotes como gravados no banco e remove os segmentos já consumidos"""
+        if not records:
+            return
+        with self._lock:
+            position = records[-1][1]
+            self._write_checkpoint(position)
+            self._checkpoint = position
+            for record, _ in records:
+                self._count(record, -1)
+            active = self._file.name if self._file is not None else None
+            for segment in self._segments():
+                path = self._segment_path(segment)
+                if segment < position[0] and str(path) != active:
+                    path.unlink()
+
+    def high_water(self, project_id: int) -> int:
+        """Maior id coletado do projeto segundo o spool (coletas completas, ainda no disco ou já gravadas)"""
+        return self._high_water.get(project_id, 0)
+
+class SpoolDrainer:
+    """Grava o spool no banco em lotes, em segundo plano, com backoff quando o banco recusa a escrita"""
+
+    def __init__(self, spool: IngestSpool, db, relevance_analyzer=None, metrics=None,
+                 batch_size: int = 500, max_pending: int = 50000, retry_max: float = 30.0):
+        self.spool = spool
+        self.db = db
+        self.relevance_analyzer = relevance_analyzer
+        self.metrics = metrics
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.retry_max = retry_max
+        self.failures = 0
+        self._last_ids: Dict[int, int] = {}
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    # Thread do drenador
+    def drain_once(self) -> int:
+        """Grava o próximo bloco de lotes; retorna quantas mensagens novas entraram no banco"""
+        records = self.spool.read(self.batch_size)
+        if not records:
+            self._flush_progress()
+            return 0
+        stored = 0
+        # Lotes consecutivos do mesmo projeto viram um INSERT só
+        groups: List[Tuple[int, List[dict]]] = []
+        for record, _ in records:
+            if groups and groups[-1][0] == record.project_id:
+                groups[-1][1].extend(record.rows)
+            else:
+                groups.append((record.project_id, list(record.rows)))
+            if record.last_message_id:
+                self._last_ids[record.project_id] = max(self._last_ids.get(record.project_id, 0),
+                                                        record.last_message_id)
+        for project_id, rows in groups:
+            if not rows:
+                continue
+            started = time.perf_counter()
+            # Rollups na transação das mensagens: um lote repetido depois de uma falha não conta duas vezes
+            messages = self.db.create_messages(project_id, rows, RollupAccumulator(project_id, self.relevance_analyzer))
+            if self.metrics:
+                self.metrics.observe_db_write(time.perf_counter() - started)
+            stored += len(messages)
+        self.spool.commit(records)
+        self._flush_progress()
+        return stored
+
+    def _flush_progress(self):
+        """Último id coletado dos lotes gravados (fica em memória se o banco recusar)"""
+        for project_id, message_id in list(self._last_ids.items()):
+            self.db.advance_collected_message_id(project_id, message_id)
+            del self._last_ids[project_id]
+
+    # Loop assíncrono
+    def wake(self):
+        self._wake.set()
+
+    async def run(self):
+        """Drena sempre que acordado; com o banco indisponível, tenta de novo com backoff"""
+        while True:
+            try:
+                await asyncio.to_thread(self.drain_once)
+            except Exception as e:
+                self.failures += 1
+                self._report()
+                if self._stopping:
+                    return
+                delay = min(self.retry_max, 2 ** (self.failures - 1))
+                logger.warning(f"Could not drain ingest spool ({getattr(e, 'orig', e)}); {self.spool.pending_messages:,} messages "
+                               f"kept on disk, retrying in {delay}s")
+                await asyncio.sleep(delay)
+                continue
+            if self.failures:
+                logger.info(f"Database writable again, draining ingest spool "
+                            f"({self.spool.pending_messages:,} messages pending)")
+                self.failures = 0
+            self._report()
+            if self.spool.pending_records:
+                continue
+            if self._stopping:
+                return
+            await self._wake.wait()
+            self._wake.clear()
+
+    def _report(self):
+        if self.metrics:
+            self.metrics.set_spool(self.spool.pending_messages, self.failures)
+
+    def start(self):
+        self._stopping = False
+        self._task = asyncio.create_task(self.run())
+
+    async def wait_for_capacity(self):
+        """Backpressure: segura a coleta enquanto o spool passa de SPOOL_MAX_PENDING mensagens"""
+        if self.spool.pending_messages < self.max_pending:
+            return
+        logger.warning(f"Ingest spool holds {self.spool.pending_messages:,} messages, "
+                       f"pausing collection until the database catches up")
+        while self.spool.pending_messages >= self.max_pending:
+            self.wake()
+            await asyncio.sleep(0.5)
+
+    async def stop(self, timeout: float = 30.0):
+        """Tenta esvaziar o spool antes de parar; o que sobrar fica no disco para a próxima execução"""
+        if self._task is None:
+            return
+        self._stopping = True
+        self.wake()
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._task = None
+        if self.spool.pending_records:
+            logger.warning(f"Stopping with {self.spool.pending_messages:,} messages in the ingest spool "
+                           f"(written on the next start)")
+        self.spool.close()
@@ -0,0 +1,71 @@
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from models import Project
+from utils.config import Config
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class CollectionPlan:
+    """Resultado do agendamento de um projeto após uma coleta"""
+    interval_seconds: int
+    message_velocity: Optional[float]  # mensagens/hora
+    reason: str
+
+class AdaptiveIntervalPolicy:
+    """Ajusta o intervalo de coleta de cada projeto à velocidade de mensagens observada"""
+
+    def __init__(self, config: Optional[Config] = None):
+        self.config = config or Config()
+
+    def _bounds(self, project: Project) -> tuple:
+        low = project.min_collection_interval or self.config.MIN_COLLECTION_INTERVAL
+        high = project.max_collection_interval or self.config.MAX_COLLECTION_INTERVAL
+        return low, max(low, high)
+
+    def update_velocity(self, project: Project, messages_collected: int, now: datetime) -> Optional[float]:
+        """Atualiza a média móvel de mensagens/hora com a coleta mais recente"""
+        previous = project.message_velocity
+        if not project.last_collected_at:
+            return previous
+
+        elapsed = (now - project.last_collected_at).total_seconds()
+        # Coletas muito próximas (ex: collect-now logo após o agendamento) geram velocidades ruidosas
+        if elapsed <= 0 or elapsed < self.config.MIN_COLLECTION_INTERVAL / 2:
+            return previous
+
+        observed = messages_collected / elapsed * 3600
+        if previous is None:
+            return observed
+        alpha = self.config.VELOCITY_SMOOTHING
+        return alpha * observed + (1 - alpha) * previous
+
+    def plan(self, project: Project, messages_collected: int, now: Optional[datetime] = None) -> CollectionPlan:
+        """Calcula a velocidade atualizada e o intervalo até a próxima coleta"""
+        now = now or datetime.utcnow()
+        velocity = self.update_velocity(project, messages_collected, now)
+
+        if project.collection_interval:
+            return CollectionPlan(project.collection_interval, velocity, "project override")
+        if not self.config.ADAPTIVE_COLLECTION_ENABLED:
+            return CollectionPlan(self.config.COLLECTION_INTERVAL, velocity, "fixed interval")
+
+        low, high = self._bounds(project)
+        if messages_collected >= self.config.MAX_MESSAGES_PER_COLLECTION:
+            # Atingiu o limite da coleta: há backlog, volta o quanto antes
+            return CollectionPlan(low, velocity, "collection limit reached")
+        if velocity is None:
+            interval = self.config.COLLECTION_INTERVAL
+            reason = "no velocity yet"
+        elif velocity <= 0:
+            interval = high
+            reason = "quiet group"
+        else:
+            # Tempo para acumular ADAPTIVE_TARGET_MESSAGES mensagens
+            interval = self.config.ADAPTIVE_TARGET_MESSAGES / velocity * 3600
+            reason = f"{velocity:.1f} msgs/hour"
+
+        return CollectionPlan(int(min(high, max(low, interval))), velocity, reason)
@@ -0,0 +1,263 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Dict, Optional, Tuple, List, Any
+from urllib.parse import parse_qs, urlsplit
+
+logger = logging.getLogger(__name__)
+
+# Buckets em segundos, cobrindo desde escritas rápidas no banco até coletas longas
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class Histogram:
+    """Histograma cumulativo no estilo Prometheus"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "buckets": {str(bound): count for bound, count in zip(self.buckets, self.counts)},
+            "sum": round(self.sum, 6),
+            "count": self.count
+        }
+
+class MetricsRegistry:
+    """Registro em memória das métricas de saúde e throughput da coleta"""
+
+    PREFIX = "oracle_eye_"
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self._help: Dict[str, str] = {}
+        self._last_success: Dict[str, float] = {}
+        self._session_throttled_until: Dict[str, float] = {}
+
+        self.describe("messages_collected_total", "Messages stored per project")
+        self.describe("collection_errors_total", "Failed collections per project")
+        self.describe("project_messages_per_second", "Throughput of the last collection per project")
+        self.describe("collection_duration_seconds", "Duration of a project collection")
+        self.describe("flood_wait_seconds_total", "Seconds requested by Telegram FloodWait errors")
+        self.describe("flood_wait_events_total", "Number of FloodWait errors")
+        self.describe("db_write_duration_seconds", "Latency of message writes to the database")
+        self.describe("loop_iteration_duration_seconds", "Duration of a collection loop iteration")
+        self.describe("backlog_depth", "Projects and commands waiting to be collected")
+        self.describe("seconds_since_last_success", "Seconds since the last successful collection per project")
+        self.describe("uptime_seconds", "Seconds since the service started")
+        self.describe("project_message_velocity", "Smoothed messages per hour per project")
+        self.describe("project_collection_interval_seconds", "Current collection interval per project")
+        self.describe("session_projects", "Projects assigned to each Telegram session")
+        self.describe("session_throttled_seconds", "Seconds left in the FloodWait of each Telegram session")
+        self.describe("spool_pending_messages", "Fetched messages in the ingest spool not yet written to the database")
+        self.describe("spool_drain_failures", "Consecutive failed attempts to drain the ingest spool")
+
+    @staticmethod
+    def _key(labels: Dict[str, Any]) -> LabelKey:
+        return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def describe(self, name: str, help_text: str):
+        """Registra o texto de ajuda de uma métrica"""
+        self._help[name] = help_text
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        """Incrementa um contador"""
+        series = self._counters.setdefault(name, {})
+        key = self._key(labels)
+        series[key] = series.get(key, 0.0) + value
+
+    def set_gauge(self, name: str, value: float, **labels):
+        """Define o valor de um gauge"""
+        self._gauges.setdefault(name, {})[self._key(labels)] = value
+
+    def observe(self, name: str, value: float, **labels):
+        """Registra uma observação em um histograma"""
+        series = self._histograms.setdefault(name, {})
+        key = self._key(labels)
+        if key not in series:
+            series[key] = Histogram()
+        series[key].observe(value)
+
+    # Helpers de domínio usados pelo serviço e pelo coletor
+    def record_collection(self, project_name: str, messages: int, duration: float, success: bool = True):
+        """Registra o resultado de uma coleta de projeto"""
+        self.observe("collection_duration_seconds", duration, project=project_name)
+        if success:
+            self.inc("messages_collected_total", messages, project=project_name)
+            self.set_gauge("project_messages_per_second", messages / duration if duration > 0 else 0.0,
+                           project=project_name)
+            self._last_success[project_name] = time.time()
+        else:
+            self.inc("collection_errors_total", project=project_name)
+
+    def record_flood_wait(self, project_name: str, seconds: float, session: Optional[str] = None):
+        """Registra um FloodWait recebido do Telegram"""
+        labels = {"project": project_name}
+        if session:
+            labels["session"] = session
+        self.inc("flood_wait_seconds_total", seconds, **labels)
+        self.inc("flood_wait_events_total", **labels)
+
+    def record_session(self, session: str, projects: int, throttled_for: float):
+        """Registra a carga e o bloqueio (FloodWait) de uma sessão do pool"""
+        self.set_gauge("session_projects", projects, session=session)
+        self._session_throttled_until[session] = time.time() + throttled_for
+
+    def record_schedule(self, project_name: str, interval_seconds: float, velocity: Optional[float]):
+        """Registra o intervalo adaptativo calculado para um projeto"""
+        self.set_gauge("project_collection_interval_seconds", interval_seconds, project=project_name)
+        if velocity is not None:
+            self.set_gauge("project_message_velocity", velocity, project=project_name)
+
+    def observe_db_write(self, seconds: float):
+        self.observe("db_write_duration_seconds", seconds)
+
+    def observe_loop_iteration(self, seconds: float):
+        self.observe("loop_iteration_duration_seconds", seconds)
+
+    def set_backlog(self, depth: int):
+        self.set_gauge("backlog_depth", depth)
+
+    def set_spool(self, pending_messages: int, failures: int):
+        self.set_gauge("spool_pending_messages", pending_messages)
+        self.set_gauge("spool_drain_failures", failures)
+
+    def _derived_gauges(self) -> Dict[str, Dict[LabelKey, float]]:
+        """Gauges calculados no momento da leitura"""
+        now = time.time()
+        derived = {
+            "uptime_seconds": {(): now - self.started_at},
+            "seconds_since_last_success": {
+                self._key({"project": project}): now - ts
+                for project, ts in self._last_success.items()
+            },
+            "session_throttled_seconds": {
+                self._key({"session": session}): max(0.0, until - now)
+                for session, until in self._session_throttled_until.items()
+            }
+        }
+        return derived
+
+    def render_prometheus(self) -> str:
+        """Renderiza as métricas no formato texto do Prometheus"""
+        lines: List[str] = []
+
+        def fmt_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+            pairs = list(key) + ([extra] if extra else [])
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+        def header(name: str, metric_type: str):
+            full = self.PREFIX + name
+            if name in self._help:
+                lines.append(f"# HELP {full} {self._help[name]}")
+            lines.append(f"# TYPE {full} {metric_type}")
+
+        for name, series in sorted(self._counters.items()):
+            header(name, "counter")
+            for key, value in series.items():
+                lines.append(f"{self.PREFIX}{name}{fmt_labels(key)} {value}")
+
+        gauges = dict(self._gauges)
+        gauges.update(self._derived_gauges())
+        for name, series in sorted(gauges.items()):
+            header(name, "gauge")
+            for key, value in series.items():
+                lines.append(f"{self.PREFIX}{name}{fmt_labels(key)} {value}")
+
+        for name, series in sorted(self._histograms.items()):
+            header(name, "histogram")
+            for key, hist in series.items():
+                for bound, count in zip(hist.buckets, hist.counts):
+                    lines.append(f"{self.PREFIX}{name}_bucket{fmt_labels(key, ('le', str(bound)))} {count}")
+                lines.append(f"{self.PREFIX}{name}_bucket{fmt_labels(key, ('le', '+Inf'))} {hist.count}")
+                lines.append(f"{self.PREFIX}{name}_sum{fmt_labels(key)} {hist.sum}")
+                lines.append(f"{self.PREFIX}{name}_count{fmt_labels(key)} {hist.count}")
+
+        return "\n".join(lines) + "\n"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Retorna as métricas como dicionário serializável em JSON"""
+        def series_to_list(series: Dict[LabelKey, Any], convert=lambda v: v) -> List[Dict[str, Any]]:
+            return [{"labels": dict(key), "value": convert(value)} for key, value in series.items()]
+
+        gauges = dict(self._gauges)
+        gauges.update(self._derived_gauges())
+        return {
+            "counters": {name: series_to_list(s) for name, s in self._counters.items()},
+            "gauges": {name: series_to_list(s) for name, s in gauges.items()},
+            "histograms": {name: series_to_list(s, lambda h: h.to_dict()) for name, s in self._histograms.items()}
+        }
+
+class MetricsServer:
+    """Servidor HTTP local mínimo que expõe o MetricsRegistry"""
+
+    def __init__(self, registry: MetricsRegistry, host: str = "127.0.0.1", port: int = 9108):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        logger.info(f"Metrics endpoint listening on http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+            logger.info("Metrics endpoint stopped")
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            # Descarta os headers da requisição
+            while True:
+                line = await asyncio.wait_for(reader.readline(), timeout=5)
+                if not line or line in (b"\r\n", b"\n"):
+                    break
+
+            parts = request_line.decode("latin-1").split()
+            target = urlsplit(parts[1] if len(parts) >= 2 else "/")
+            path = target.path.rstrip("/") or "/"
+            output = parse_qs(target.query).get("format", ["prometheus"])[-1]
+
+            if parts and parts[0] != "GET":
+                status, content_type, body = "405 Method Not Allowed", "text/plain", "Method not allowed\n"
+            elif path == "/metrics.json" or (path == "/metrics" and output == "json"):
+                status, content_type, body = "200 OK", "application/json", json.dumps(self.registry.to_dict())
+            elif path == "/metrics":
+                status, content_type, body = "200 OK", "text/plain; version=0.0.4", self.registry.render_prometheus()
+            else:
+                status, content_type, body = "404 Not Found", "text/plain", "Not found\n"
+
+            payload = body.encode("utf-8")
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode("latin-1") + payload
+            )
+            await writer.drain()
+        except Exception as e:
+            logger.error(f"Error serving metrics request: {e}")
+        finally:
+            writer.close()
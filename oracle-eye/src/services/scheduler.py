@@ -0,0 +1,103 @@
+import asyncio
+import heapq
+import itertools
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from models import Project
+from utils.config import Config
+
+logger = logging.getLogger(__name__)
+
+class CollectionScheduler:
+    """Min-heap de prazos (next_collection_at) por projeto
+
+    O loop de coleta dorme exatamente até o próximo prazo ou até ser acordado
+    por `wake()` (novo comando, mudança de projetos). Reagendar um projeto só
+    empilha o novo prazo; entradas antigas são descartadas ao chegar ao topo.
+    """
+
+    def __init__(self, config: Optional[Config] = None):
+        self.config = config or Config()
+        self._heap: List[Tuple[datetime, int, int]] = []  # (prazo, sequência, project_id)
+        self._deadlines: Dict[int, datetime] = {}
+        self._failures: Dict[int, int] = {}
+        self._sequence = itertools.count()
+        self._wake = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def load(self, projects: Iterable[Project]):
+        """Reconstrói a fila a partir dos projetos ativos"""
+        self._heap.clear()
+        self._deadlines.clear()
+        now = datetime.utcnow()
+        for project in projects:
+            if project.is_active:
+                self.schedule(project.id, project.next_collection_at or now)
+        logger.info(f"Scheduler loaded {len(self._deadlines)} projects")
+
+    def schedule(self, project_id: int, due_at: datetime):
+        """Define (ou substitui) o prazo de um projeto; o próximo wait() já considera o novo prazo"""
+        self._deadlines[project_id] = due_at
+        heapq.heappush(self._heap, (due_at, next(self._sequence), project_id))
+
+    def remove(self, project_id: int):
+        self._deadlines.pop(project_id, None)
+
+    def _discard_stale(self):
+        while self._heap:
+            due_at, _, project_id = self._heap[0]
+            if self._deadlines.get(project_id) == due_at:
+                return
+            heapq.heappop(self._heap)
+
+    def next_due_at(self) -> Optional[datetime]:
+        self._discard_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: Optional[datetime] = None) -> List[int]:
+        """Remove e retorna os projetos cujo prazo venceu, em ordem de prazo"""
+        now = now or datetime.utcnow()
+        due = []
+        while True:
+            head = self.next_due_at()
+            if head is None or head > now:
+                return due
+            _, _, project_id = heapq.heappop(self._heap)
+            del self._deadlines[project_id]
+            due.append(project_id)
+
+    def overdue_count(self, now: Optional[datetime] = None) -> int:
+        now = now or datetime.utcnow()
+        return sum(1 for due_at in self._deadlines.values() if due_at <= now)
+
+    def record_success(self, project_id: int):
+        self._failures.pop(project_id, None)
+
+    def record_failure(self, project_id: int) -> int:
+        """Backoff exponencial por projeto; retorna os segundos até a nova tentativa"""
+        failures = self._failures.get(project_id, 0) + 1
+        self._failures[project_id] = failures
+        delay = self.config.COLLECTION_ERROR_BACKOFF_BASE * (2 ** (failures - 1))
+        return int(min(self.config.COLLECTION_ERROR_BACKOFF_MAX, delay))
+
+    def wake(self):
+        """Interrompe a espera atual (novo comando ou mudança de projetos)"""
+        self._wake.set()
+
+    async def wait(self):
+        """Dorme até o próximo prazo ou até `wake()`"""
+        head = self.next_due_at()
+        timeout = None
+        if head is not None:
+            timeout = max(0.0, (head - datetime.utcnow()).total_seconds())
+        try:
+            if timeout is None or timeout > 0:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self._wake.clear()
@@ -1,35 +1,53 @@
-import asyncio
 import logging
-from typing import List, Optional
-from datetime import datetime
+import time
+from typing import Any, Callable, List, Optional
 from telethon import TelegramClient
 from telethon.tl.types import Message as TelegramMessage
 from telethon.errors import FloodWaitError, ChannelPrivateError
-from models import Project, Message
+from models import Project
+from services.client_pool import CollectionDeferred, TelegramClientPool, parse_sessions
 from services.database import DatabaseManager
+from services.ingest_spool import IngestSpool, SpoolDrainer, SpoolRecord
+from services.metrics import MetricsRegistry
+from services.relevance_analyzer import RelevanceAnalyzer
 from utils.config import Config
 
 logger = logging.getLogger(__name__)
 
 class TelegramCollector:
-    def __init__(self, api_id: int, api_hash: str, phone: str):
+    def __init__(self, api_id: int, api_hash: str, phone: str,
+                 metrics: Optional[MetricsRegistry] = None,
+                 client_factory: Optional[Callable[..., Any]] = None):
         self.api_id = api_id
         self.api_hash = api_hash
         self.phone = phone
-        self.client = None
+        # Permite trocar o TelegramClient por um cliente simulado (soak/load tests)
+        self.client_factory = client_factory or TelegramClient
         self.db = DatabaseManager()
         self.config = Config()
+        self.metrics = metrics
+        self.relevance_analyzer = RelevanceAnalyzer()
+        self.pool = TelegramClientPool(
+            api_id, api_hash,
+            sessions=parse_sessions(self.config.TELEGRAM_SESSIONS, phone),
+            sessions_dir=self.config.SESSIONS_DIR,
+            client_factory=self.client_factory,
+            metrics=metrics
+        )
+        self.spool = IngestSpool(self.config.SPOOL_DIR, self.config.SPOOL_SEGMENT_BYTES, self.config.SPOOL_FSYNC)
+        self.drainer = SpoolDrainer(
+            self.spool, self.db, self.relevance_analyzer, metrics,
+            batch_size=self.config.INGEST_BATCH_SIZE,
+            max_pending=self.config.SPOOL_MAX_PENDING,
+            retry_max=self.config.SPOOL_RETRY_MAX
+        )
     
     async def start(self):
-        """Inicia o cliente Telegram"""
+        """Inicia o drenador do spool e as sessões Telegram do pool"""
         try:
-            self.client = TelegramClient(
-                self.config.SESSIONS_DIR / "crypto_insights",
-                self.api_id,
-                self.api_hash
-            )
-            
-            await self.client.start(phone=self.phone)
+            # Antes do Telegram: lotes que ficaram no spool na execução anterior já começam a ir para o banco
+            self.drainer.start()
+            await self.pool.start()
             logger.info("Telegram client started successfully")
             
         except Exception as e:
@@ -37,112 +55,163 @@ class TelegramCollector:
             raise
     
     async def disconnect(self):
-        """Desconecta o cliente Telegram"""
-        if self.client:
-            await self.client.disconnect()
-            logger.info("Telegram client disconnected")
+        """Desconecta as sessões Telegram e grava o que der do spool"""
+        await self.drainer.stop()
+        await self.pool.disconnect()
+        logger.info("Telegram client disconnected")
     
-    async def collect_messages(self, project: Project):
-        """Coleta mensagens de um projeto"""
+    async def collect_messages(self, project: Project) -> int:
+        """Coleta mensagens de um projeto e retorna quantas foram buscadas
+
+        As mensagens vão para o spool de ingestão (durável) e chegam ao banco pelo
+        drenador; a coleta não espera o banco, só o spool cheio (SPOOL_MAX_PENDING).
+        Levanta CollectionDeferred quando a sessão do projeto recebe FloodWait ou
+        ChannelPrivateError (outra sessão pode ser membro) ou todas as sessões estão
+        bloqueadas; o agendador tenta de novo depois.
+        """
+        started = time.perf_counter()
+        messages_collected = 0
+        session = self.pool.session_for(project.id)
+        client = session.client
         try:
-            logger.info(f"Starting collection for project: {project.name}")
+            logger.info(f"Starting collection for project: {project.name} (session '{session.name}')")
             
             # Busca o grupo/canal
-            entity = await self.client.get_entity(project.telegram_group)
+            entity = await client.get_entity(project.telegram_group)
             
-            # Busca a última mensagem coletada
-            last_message_id = project.last_collected_message_id or 0
+            # Busca a última mensagem coletada (o spool pode estar à frente do banco)
+            first_message_id = max(project.last_collected_message_id or 0, self.spool.high_water(project.id))
+            last_message_id = first_message_id
             
-            # Coleta mensagens novas
-            messages_collected = 0
-            async for message in self.client.iter_messages(
+            # Coleta mensagens novas, enviadas ao spool em lotes de INGEST_BATCH_SIZE
+            batch = []
+            async for message in client.iter_messages(
                 entity,
-                min_id=last_message_id,
+                min_id=first_message_id,
                 limit=self.config.MAX_MESSAGES_PER_COLLECTION
             ):
-                if await self._process_message(message, project):
-                    messages_collected += 1
+                row = self._message_row(message)
+                if row:
+                    batch.append(row)
+                    if len(batch) >= self.config.INGEST_BATCH_SIZE:
+                        messages_collected += await self._spool_batch(project, batch)
+                        batch = []
                 
                 # Atualiza o ID da última mensagem coletada
                 if message.id > last_message_id:
                     last_message_id = message.id
             
-            # Atualiza o projeto com o último ID coletado
-            if last_message_id > (project.last_collected_message_id or 0):
-                self.db.update_project(
-                    project.id,
-                    last_collected_message_id=last_message_id
-                )
+            # O último lote leva o novo checkpoint (gravado no projeto junto com as mensagens)
+            if batch or last_message_id > first_message_id:
+                messages_collected += await self._spool_batch(project, batch, last_message_id)
             
+            self.pool.report_collected(session, project.id)
             logger.info(f"Collected {messages_collected} new messages for {project.name}")
+            if self.metrics:
+                self.metrics.record_collection(project.name, messages_collected, time.perf_counter() - started)
+            return messages_collected
             
         except FloodWaitError as e:
-            logger.warning(f"Rate limit hit for {project.name}, waiting {e.seconds} seconds")
-            await asyncio.sleep(e.seconds)
+            # Bloqueia só esta sessão; a nova tentativa vai para outra sessão livre, se houver
+            logger.warning(f"Rate limit hit for {project.name} on session '{session.name}' ({e.seconds}s)")
+            self.pool.report_flood_wait(session, e.seconds)
+            if self.metrics:
+                self.metrics.record_flood_wait(project.name, e.seconds, session=session.name)
+                self.metrics.record_collection(project.name, messages_collected,
+                                               time.perf_counter() - started, success=False)
+            raise CollectionDeferred(self.pool.retry_after(), f"FloodWait of {e.seconds}s on session '{session.name}'")
         except ChannelPrivateError:
-            logger.error(f"Channel {project.telegram_group} is private or inaccessible")
+            if self.metrics:
+                self.metrics.record_collection(project.name, messages_collected,
+                                               time.perf_counter() - started, success=False)
+            # Sessão que não é membro do grupo: a nova tentativa vai para outra sessão
+            if self.pool.report_private(session, project.id):
+                raise CollectionDeferred(0, f"Channel {project.telegram_group} is private for session '{session.name}'")
+            logger.error(f"Channel {project.telegram_group} is private or inaccessible to every session")
+            raise
         except Exception as e:
             logger.error(f"Error collecting messages from {project.name}: {e}")
+            if self.metrics:
+                self.metrics.record_collection(project.name, messages_collected,
+                                               time.perf_counter() - started, success=False)
             raise
     
-    async def _process_message(self, message: TelegramMessage, project: Project) -> bool:
-        """Processa uma mensagem individual"""
-        try:
-            # Filtra apenas mensagens de texto
-            if not message.text:
-                return False
-            
-            # Verifica se a mensagem já existe
-            existing_message = self._get_existing_message(project.id, message.id)
-            if existing_message:
-                return False
-            
-            # Extrai informações da mensagem
-            content = message.text
-            author = None
-            if message.sender:
-                if hasattr(message.sender, 'username') and message.sender.username:
-                    author = f"@{message.sender.username}"
-                elif hasattr(message.sender, 'first_name'):
-                    author = message.sender.first_name
-                    if hasattr(message.sender, 'last_name') and message.sender.last_name:
-                        author += f" {message.sender.last_name}"
-            
-            # Determina o tipo da mensagem
-            message_type = "text"
-            if "http" in content:
-                message_type = "link"
-            
-            # Cria a mensagem no banco
-            self.db.create_message(
-                project_id=project.id,
-                telegram_message_id=message.id,
-                content=content,
-                author=author,
-                timestamp=message.date,
-                message_type=message_type
-            )
-            
-            return True
-            
-        except Exception as e:
-            logger.error(f"Error processing message {message.id}: {e}")
-            return False
+    async def _spool_batch(self, project: Project, batch: List[dict], last_message_id: Optional[int] = None) -> int:
+        """Grava um lote no spool e acorda o drenador (espera antes se o spool estiver cheio)"""
+        await self.drainer.wait_for_capacity()
+        self.spool.append(SpoolRecord(project.id, batch, last_message_id))
+        self.drainer.wake()
+        return len(batch)
+    
+    def _message_row(self, message: TelegramMessage) -> Optional[dict]:
+        """Campos de uma mensagem de texto para a ingestão (None para mídia sem texto)"""
+        # Filtra apenas mensagens de texto
+        if not message.text:
+            return None
+        
+        # Extrai informações da mensagem
+        content = message.text
+        author = None
+        username = None
+        if message.sender:
+            if hasattr(message.sender, 'username') and message.sender.username:
+                username = message.sender.username
+                author = f"@{username}"
+            elif hasattr(message.sender, 'first_name'):
+                author = message.sender.first_name
+                if hasattr(message.sender, 'last_name') and message.sender.last_name:
+                    author += f" {message.sender.last_name}"
+        
+        # Determina o tipo da mensagem
+        message_type = "text"
+        if "http" in content:
+            message_type = "link"
+        
+        return {
+            "telegram_message_id": message.id,
+            "content": content,
+            "author": author,
+            # Remetente para a tabela de autores (a mensagem guarda só author_id)
+            "sender": {"telegram_id": message.sender_id, "username": username, "display_name": author}
+                      if author and message.sender_id else None,
+            "timestamp": message.date,
+            "message_type": message_type,
+            "reply_to_message_id": self._reply_to(message),
+            "forward_from": self._forward_origin(message),
+        }
+    
+    def _reply_to(self, message: TelegramMessage) -> Optional[int]:
+        """Id da mensagem respondida no mesmo grupo (None se não é resposta)"""
+        header = getattr(message, "reply_to", None)
+        if not header or not getattr(header, "reply_to_msg_id", None) or getattr(header, "reply_to_peer_id", None):
+            return None
+        # Em grupos com tópicos, toda mensagem do tópico "responde" à mensagem que o abriu
+        if getattr(header, "forum_topic", False) and not getattr(header, "reply_to_top_id", None):
+            return None
+        return header.reply_to_msg_id
     
-    def _get_existing_message(self, project_id: int, telegram_message_id: int) -> Optional[Message]:
-        """Verifica se uma mensagem já existe no banco"""
-        with self.db.get_session() as session:
-            from sqlmodel import select
-            statement = select(Message).where(
-                Message.project_id == project_id,
-                Message.telegram_message_id == telegram_message_id
+    def _forward_origin(self, message: TelegramMessage) -> Optional[str]:
+        """Origem de uma mensagem encaminhada: @username, título do canal ou nome (None se não é encaminhada)"""
+        forward = getattr(message, "forward", None)
+        if not forward:
+            return None
+        for entity in (getattr(forward, "chat", None), getattr(forward, "sender", None)):
+            if not entity:
+                continue
+            if getattr(entity, "username", None):
+                return f"@{entity.username}"
+            name = getattr(entity, "title", None) or " ".join(
+                part for part in (getattr(entity, "first_name", None), getattr(entity, "last_name", None)) if part
             )
-            return session.exec(statement).first()
+            if name:
+                return name
+        # Remetente que esconde a conta nos encaminhamentos: só o nome
+        return getattr(forward, "from_name", None) or "unknown"
     
     async def test_connection(self, telegram_group: str) -> bool:
         """Testa a conexão com um grupo/canal"""
         try:
-            entity = await self.client.get_entity(telegram_group)
+            await self.pool.least_loaded().client.get_entity(telegram_group)
             logger.info(f"Successfully connected to {telegram_group}")
             return True
         except Exception as e:
@@ -0,0 +1,202 @@
+"""
+Servidor Telegram simulado para soak/load tests do Oracle Eye
+
+O SimulatedTelegramServer gera mensagens em N grupos a uma taxa configurável e
+entrega FakeTelegramClient's que imitam o subconjunto do TelegramClient usado
+pelo TelegramCollector (start, disconnect, get_entity, iter_messages).
+"""
+import asyncio
+import random
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple, Any
+
+from telethon.errors import FloodWaitError
+
+TOPICS = [
+    "staking rewards look good this week", "when is the mainnet upgrade", "governance proposal vote is live",
+    "new partnership announced today", "bridge fees are too high", "validator node keeps restarting",
+    "wen moon", "to the moon guys", "check the roadmap https://project.io/roadmap", "gm everyone",
+    "testnet release fixed the wallet bug", "listing on a new exchange soon?", "read the docs at www.project.io/docs",
+]
+
+@dataclass
+class FakeSender:
+    id: int
+    username: Optional[str] = None
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+
+@dataclass
+class FakeReplyHeader:
+    reply_to_msg_id: int
+
+@dataclass
+class FakeMessage:
+    id: int
+    text: str
+    date: datetime
+    sender: Optional[FakeSender] = None
+    reply_to: Optional[FakeReplyHeader] = None
+
+    @property
+    def sender_id(self) -> Optional[int]:
+        return self.sender.id if self.sender else None
+
+@dataclass
+class FakeEntity:
+    id: int
+    username: str
+    title: str
+
+@dataclass
+class SimulatedGroup:
+    """Grupo cujas mensagens surgem a `rate` mensagens/segundo desde `started_at`"""
+    entity: FakeEntity
+    rate: float
+    started_at: float
+    seed: int
+    paused: bool = False
+
+    def available(self, now: float) -> int:
+        return int(max(0.0, now - self.started_at) * self.rate)
+
+    def message(self, message_id: int) -> FakeMessage:
+        rng = random.Random(self.seed * 1_000_003 + message_id)
+        author_id = int(rng.paretovariate(1.2)) % 5000
+        if author_id % 4 == 0:
+            sender = FakeSender(id=author_id, first_name=f"Member{author_id}", last_name="Sim")
+        else:
+            sender = FakeSender(id=author_id, username=f"sim_user_{author_id}")
+        created = self.started_at + (message_id - 1) / self.rate
+        # Cerca de um terço das mensagens responde a uma das 20 anteriores
+        reply_to = None
+        if message_id > 1 and rng.random() < 0.3:
+            reply_to = FakeReplyHeader(max(1, message_id - rng.randint(1, 20)))
+        return FakeMessage(
+            id=message_id,
+            text=f"{rng.choice(TOPICS)} #{message_id}",
+            date=datetime.fromtimestamp(created, tz=timezone.utc),
+            sender=sender,
+            reply_to=reply_to,
+        )
+
+@dataclass
+class ServerStats:
+    api_calls: int = 0
+    messages_served: int = 0
+    flood_waits_injected: int = 0
+    flood_wait_seconds: float = 0.0
+    disconnects_injected: int = 0
+    connections: int = 0
+
+class SimulatedTelegramServer:
+    """Estado compartilhado entre os clientes simulados"""
+
+    def __init__(self, groups: int = 10, rate: float = 1.0, api_latency: float = 0.0,
+                 flood_wait_probability: float = 0.0, flood_wait_seconds: Tuple[int, int] = (1, 5),
+                 disconnect_probability: float = 0.0, seed: int = 42):
+        self.api_latency = api_latency
+        self.flood_wait_probability = flood_wait_probability
+        self.flood_wait_seconds = flood_wait_seconds
+        self.disconnect_probability = disconnect_probability
+        self.random = random.Random(seed)
+        self.stats = ServerStats()
+        self.groups: Dict[str, SimulatedGroup] = {}
+        self._scheduled_faults: List[Tuple[str, Optional[str], int]] = []
+        for i in range(groups):
+            self.add_group(f"@sim_group_{i}", rate)
+
+    def add_group(self, username: str, rate: float) -> SimulatedGroup:
+        """Cria um grupo com `rate` mensagens/segundo a partir de agora"""
+        entity = FakeEntity(id=len(self.groups) + 1, username=username.lstrip("@"), title=username)
+        group = SimulatedGroup(entity=entity, rate=rate, started_at=time.time(), seed=len(self.groups) + 1)
+        self.groups[username] = group
+        return group
+
+    def schedule_flood_wait(self, seconds: int, group: Optional[str] = None):
+        """Força um FloodWait na próxima chamada (opcionalmente só para um grupo)"""
+        self._scheduled_faults.append(("flood", group, seconds))
+
+    def schedule_disconnect(self, group: Optional[str] = None):
+        """Força uma desconexão na próxima chamada (opcionalmente só para um grupo)"""
+        self._scheduled_faults.append(("disconnect", group, 0))
+
+    def client_factory(self, session: Any, api_id: int, api_hash: str) -> "FakeTelegramClient":
+        """Assinatura compatível com TelegramClient(session, api_id, api_hash)"""
+        return FakeTelegramClient(self, session)
+
+    def total_generated(self) -> int:
+        now = time.time()
+        return sum(group.available(now) for group in self.groups.values())
+
+    def _raise_flood(self, seconds: int):
+        self.stats.flood_waits_injected += 1
+        self.stats.flood_wait_seconds += seconds
+        raise FloodWaitError(request=None, capture=seconds)
+
+    def _raise_disconnect(self, client: "FakeTelegramClient"):
+        self.stats.disconnects_injected += 1
+        client.connected = False
+        raise ConnectionError("Simulated Telegram disconnect")
+
+    async def call(self, client: "FakeTelegramClient", group: Optional[str] = None):
+        """Simula latência e falhas injetadas de uma chamada à API"""
+        self.stats.api_calls += 1
+        if self.api_latency:
+            await asyncio.sleep(self.api_latency)
+
+        for i, (kind, target, seconds) in enumerate(self._scheduled_faults):
+            if target is None or target == group:
+                del self._scheduled_faults[i]
+                if kind == "flood":
+                    self._raise_flood(seconds)
+                self._raise_disconnect(client)
+
+        if not client.connected:
+            # Reconexão automática, como o Telethon faz após quedas
+            client.connected = True
+            self.stats.connections += 1
+        if self.flood_wait_probability and self.random.random() < self.flood_wait_probability:
+            self._raise_flood(self.random.randint(*self.flood_wait_seconds))
+        if self.disconnect_probability and self.random.random() < self.disconnect_probability:
+            self._raise_disconnect(client)
+
+class FakeTelegramClient:
+    """Substituto do TelegramClient conectado ao SimulatedTelegramServer"""
+
+    def __init__(self, server: SimulatedTelegramServer, session: Any = None):
+        self.server = server
+        self.session = session
+        self.connected = False
+
+    async def start(self, phone: Optional[str] = None):
+        self.connected = True
+        self.server.stats.connections += 1
+        return self
+
+    async def disconnect(self):
+        self.connected = False
+
+    def is_connected(self) -> bool:
+        return self.connected
+
+    async def get_entity(self, telegram_group: str) -> FakeEntity:
+        await self.server.call(self, telegram_group)
+        group = self.server.groups.get(telegram_group) or self.server.groups.get(f"@{telegram_group.lstrip('@')}")
+        if not group:
+            raise ValueError(f"No user has \"{telegram_group}\" as username")
+        return group.entity
+
+    async def iter_messages(self, entity: FakeEntity, limit: Optional[int] = None, min_id: int = 0, **kwargs):
+        """Entrega mensagens mais novas primeiro, como o Telethon"""
+        group = self.server.groups[f"@{entity.username}"]
+        await self.server.call(self, f"@{entity.username}")
+        newest = group.available(time.time())
+        oldest = min_id + 1
+        if limit:
+            oldest = max(oldest, newest - limit + 1)
+        for message_id in range(newest, oldest - 1, -1):
+            self.server.stats.messages_served += 1
+            yield group.message(message_id)
@@ -0,0 +1,189 @@
+"""
+Soak test do Oracle Eye contra o servidor Telegram simulado
+
+Uso (a partir de oracle-eye/src):
+    python -m simulation.soak_test --groups 50 --rate 2 --duration 600 --output soak.json
+
+Roda o OracleEyeService completo (loop de coleta, banco SQLite, comandos) em um
+diretório temporário e reporta throughput de ingestão, latência de frescor
+(collected_at - timestamp) e crescimento do banco sob carga sustentada.
+Com --database-url o banco é outro (ex.: um PostgreSQL local vazio).
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+from sqlalchemy import text
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def _configure_environment(workdir: Path, args: argparse.Namespace):
+    """Isola banco, sessões e comandos em `workdir` antes de carregar Config"""
+    run_dir = workdir / "run"
+    run_dir.mkdir(parents=True, exist_ok=True)
+    os.chdir(run_dir)  # ../shared passa a ser workdir/shared
+    os.environ.update({
+        "DATABASE_URL": args.database_url or f"sqlite:///{workdir / 'shared' / 'database' / 'soak.db'}",
+        "TELEGRAM_API_ID": "1",
+        "TELEGRAM_API_HASH": "simulated",
+        "TELEGRAM_PHONE_NUMBER": "+10000000000",
+        "TELEGRAM_SESSIONS": ",".join(f"soak_{index}" for index in range(args.sessions)),
+        "COLLECTION_INTERVAL": str(args.interval),
+        "MIN_COLLECTION_INTERVAL": str(args.min_interval),
+        "MAX_COLLECTION_INTERVAL": str(args.interval),
+        "MAX_MESSAGES_PER_COLLECTION": str(args.max_messages),
+        "COMMAND_POLL_INTERVAL": str(args.poll_interval),
+        "COLLECTION_PROJECT_DELAY": "0",
+        "LOOP_ERROR_BACKOFF": "1",
+        "METRICS_ENABLED": "true" if args.metrics_port else "false",
+        "METRICS_PORT": str(args.metrics_port or 0),
+    })
+
+def _database_bytes(db) -> int:
+    if db.engine.dialect.name == "postgresql":
+        with db.engine.connect() as connection:
+            return connection.execute(text("SELECT pg_database_size(current_database())")).scalar() or 0
+    # Em WAL as páginas novas ficam em -wal até o checkpoint: conta o arquivo principal, -wal e -shm
+    db_file = Path(db.engine.url.database or "")
+    files = [db_file, db_file.with_name(db_file.name + "-wal"), db_file.with_name(db_file.name + "-shm")]
+    return sum(path.stat().st_size for path in files if path.is_file())
+
+async def _sample(db, started: float, samples: List[Dict[str, Any]], interval: float):
+    while True:
+        with db.engine.connect() as connection:
+            rows = connection.execute(text("SELECT COUNT(*) FROM message")).scalar() or 0
+        size = _database_bytes(db)
+        samples.append({"elapsed_seconds": round(time.time() - started, 2), "messages": rows, "db_bytes": size})
+        await asyncio.sleep(interval)
+
+async def run_soak(args: argparse.Namespace) -> Dict[str, Any]:
+    # Imports após configurar o ambiente: Config lê as variáveis na construção
+    from main import OracleEyeService
+    from services.database import DatabaseManager
+    from simulation.fake_telegram import SimulatedTelegramServer
+
+    server = SimulatedTelegramServer(
+        groups=args.groups,
+        rate=args.rate,
+        api_latency=args.api_latency,
+        flood_wait_probability=args.flood_wait_probability,
+        flood_wait_seconds=(1, args.flood_wait_max),
+        disconnect_probability=args.disconnect_probability,
+        seed=args.seed,
+    )
+
+    db = DatabaseManager()
+    for username in server.groups:
+        db.create_project(name=username.lstrip("@"), telegram_group=username)
+
+    service = OracleEyeService(client_factory=server.client_factory)
+    service.running = True
+    await service.initialize()
+
+    started = time.time()
+    samples: List[Dict[str, Any]] = []
+    sampler = asyncio.create_task(_sample(db, started, samples, args.sample_interval))
+    loop_task = asyncio.create_task(service.start_collection_loop())
+    try:
+        await asyncio.sleep(args.duration)
+    finally:
+        service.running = False
+        loop_task.cancel()
+        sampler.cancel()
+        await asyncio.gather(loop_task, sampler, return_exceptions=True)
+        await service.stop()
+    elapsed = time.time() - started
+
+    with db.engine.connect() as connection:
+        ingested = connection.execute(text("SELECT COUNT(*) FROM message")).scalar() or 0
+        lag = ("EXTRACT(EPOCH FROM collected_at - timestamp)" if db.engine.dialect.name == "postgresql"
+               else "(julianday(collected_at) - julianday(timestamp)) * 86400.0")
+        lags = [float(row[0]) for row in connection.execute(text(f"SELECT {lag} FROM message"))]
+    db_bytes = _database_bytes(db)
+    first_bytes = samples[0]["db_bytes"] if samples else 0
+
+    generated = server.total_generated()
+    return {
+        "parameters": {k: v for k, v in vars(args).items() if k != "output"},
+        "duration_seconds": round(elapsed, 2),
+        "ingestion": {
+            "messages_generated": generated,
+            "messages_ingested": ingested,
+            "ingested_ratio": round(ingested / generated, 4) if generated else 0.0,
+            "throughput_msgs_per_sec": round(ingested / elapsed, 2) if elapsed else 0.0,
+            "offered_load_msgs_per_sec": round(args.groups * args.rate, 2),
+        },
+        "freshness_seconds": {
+            "p50": round(_percentile(lags, 50), 3),
+            "p95": round(_percentile(lags, 95), 3),
+            "p99": round(_percentile(lags, 99), 3),
+            "max": round(max(lags), 3) if lags else 0.0,
+        },
+        "database": {
+            "final_bytes": db_bytes,
+            "bytes_per_message": round(db_bytes / ingested, 1) if ingested else 0.0,
+            "growth_mb_per_hour": round((db_bytes - first_bytes) / (1024 * 1024) / (elapsed / 3600), 2) if elapsed else 0.0,
+            "samples": samples,
+        },
+        "telegram": vars(server.stats),
+        "sessions": service.collector.pool.status(),
+        "metrics": service.metrics.to_dict(),
+    }
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Oracle Eye soak test against a simulated Telegram server")
+    parser.add_argument("--groups", type=int, default=10, help="Number of simulated groups")
+    parser.add_argument("--rate", type=float, default=1.0, help="Messages per second per group")
+    parser.add_argument("--duration", type=float, default=300, help="Test duration in seconds")
+    parser.add_argument("--interval", type=int, default=30, help="COLLECTION_INTERVAL used by the service")
+    parser.add_argument("--min-interval", type=int, default=2, help="MIN_COLLECTION_INTERVAL for adaptive scheduling")
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="Command directory poll interval in seconds")
+    parser.add_argument("--max-messages", type=int, default=1000, help="MAX_MESSAGES_PER_COLLECTION")
+    parser.add_argument("--api-latency", type=float, default=0.05, help="Simulated latency per API call")
+    parser.add_argument("--flood-wait-probability", type=float, default=0.0, help="Chance of FloodWait per API call")
+    parser.add_argument("--flood-wait-max", type=int, default=5, help="Maximum injected FloodWait seconds")
+    parser.add_argument("--sessions", type=int, default=1, help="Telegram sessions in the client pool")
+    parser.add_argument("--disconnect-probability", type=float, default=0.0, help="Chance of disconnect per API call")
+    parser.add_argument("--sample-interval", type=float, default=5.0, help="Seconds between DB growth samples")
+    parser.add_argument("--metrics-port", type=int, default=0, help="Expose the metrics endpoint on this port")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--database-url", default=None, help="Use this (empty) database instead of a SQLite file, e.g. postgresql://...")
+    parser.add_argument("--workdir", default=None, help="Keep the database here instead of a temp dir")
+    parser.add_argument("--output", default=None, help="Write the JSON report to this file")
+    parser.add_argument("--verbose", action="store_true", help="Show service logs")
+    return parser.parse_args(argv)
+
+def main(argv: List[str] = None):
+    args = parse_args(argv if argv is not None else sys.argv[1:])
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    output = Path(args.output).resolve() if args.output else None
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(args.workdir).resolve() if args.workdir else Path(tmp)
+        _configure_environment(workdir, args)
+        report = asyncio.run(run_soak(args))
+
+    summary = {k: report[k] for k in ("duration_seconds", "ingestion", "freshness_seconds")}
+    summary["database"] = {k: v for k, v in report["database"].items() if k != "samples"}
+    summary["telegram"] = report["telegram"]
+    print(json.dumps(summary, indent=2))
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Full report saved to: {output}")
+
+if __name__ == "__main__":
+    main()
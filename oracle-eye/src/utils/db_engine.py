@@ -0,0 +1,47 @@
+"""
+Engine do banco compartilhado: SQLite (padrão) ou PostgreSQL
+
+SQLite roda em modo WAL, para que as leituras do Neural Core não bloqueiem a
+escrita do Oracle Eye, e espera SQLITE_BUSY_TIMEOUT pelo lock de escrita em vez
+de falhar com "database is locked". Cada commit é durável (synchronous=FULL). PostgreSQL usa um pool de conexões com
+pre-ping; `postgresql://` usa o driver psycopg (3).
+"""
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlmodel import create_engine
+
+def normalize_database_url(url: str) -> str:
+    """postgres:// e postgresql:// -> postgresql+psycopg://"""
+    for prefix in ("postgres://", "postgresql://"):
+        if url.startswith(prefix):
+            return "postgresql+psycopg://" + url[len(prefix):]
+    return url
+
+def is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+def create_database_engine(url: str, config) -> Engine:
+    """Engine com as opções de concorrência adequadas ao backend de `url`"""
+    url = normalize_database_url(url)
+    if not is_sqlite(url):
+        return create_engine(
+            url, echo=False,
+            pool_size=config.DATABASE_POOL_SIZE,
+            max_overflow=config.DATABASE_MAX_OVERFLOW,
+            pool_recycle=config.DATABASE_POOL_RECYCLE,
+            pool_pre_ping=True,
+        )
+
+    engine = create_engine(url, echo=False, connect_args={"timeout": config.SQLITE_BUSY_TIMEOUT})
+    in_memory = url in ("sqlite://", "sqlite:///:memory:")
+
+    @event.listens_for(engine, "connect")
+    def _configure_sqlite(dbapi_connection, _record):
+        cursor = dbapi_connection.cursor()
+        if not in_memory:
+            cursor.execute("PRAGMA journal_mode=WAL")
+        # FULL: commit durável (fsync do WAL) antes de o spool de ingestão avançar o checkpoint
+        cursor.execute("PRAGMA synchronous=FULL")
+        cursor.close()
+
+    return engine
@@ -0,0 +1,40 @@
+"""Fixtures dos testes do Oracle Eye: src no sys.path e banco/diretórios temporários"""
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    """Cada teste roda em src/ de um diretório temporário (o ../shared da config fica dentro dele)"""
+    src = tmp_path / "src"
+    src.mkdir()
+    monkeypatch.chdir(src)
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'test.db'}")
+    monkeypatch.setenv("TELEGRAM_API_ID", "1")
+    monkeypatch.setenv("TELEGRAM_API_HASH", "test")
+    monkeypatch.setenv("TELEGRAM_PHONE_NUMBER", "+10000000000")
+    return tmp_path
+
+@pytest.fixture
+def db(workdir):
+    from services.database import DatabaseManager
+    return DatabaseManager()
+
+@pytest.fixture
+def project(db):
+    return db.create_project("Test", "@test_group")
+
+def message_rows(first_id: int, count: int, start: datetime = datetime(2026, 1, 1, 12, 0)) -> list:
+    """Linhas no formato do coletor (uma mensagem por minuto, três autores)"""
+    return [{
+        "telegram_message_id": message_id,
+        "timestamp": start + timedelta(minutes=message_id - first_id),
+        "content": f"message {message_id} about the mainnet upgrade",
+        "author": f"@user{message_id % 3}",
+        "sender": {"telegram_id": 1000 + message_id % 3, "username": f"user{message_id % 3}",
+                   "display_name": f"@user{message_id % 3}"},
+    } for message_id in range(first_id, first_id + count)]
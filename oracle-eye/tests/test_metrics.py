@@ -0,0 +1,43 @@
+"""Endpoint de métricas: rota pelo caminho e pelo parâmetro format"""
+import asyncio
+import json
+
+import pytest
+
+from services.metrics import MetricsRegistry, MetricsServer
+
+async def _get(port: int, target: str) -> tuple:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"GET {target} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode("latin-1"))
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.decode("utf-8").partition("\r\n\r\n")
+    return head.split(" ", 2)[1], body
+
+@pytest.mark.parametrize("target, status, is_json", [
+    ("/metrics", "200", False),
+    ("/metrics/", "200", False),
+    ("/metrics?foo", "200", False),
+    ("/metrics?format=json", "200", True),
+    ("/metrics?format=json&x=1", "200", True),
+    ("/metrics?x=1&format=json", "200", True),
+    ("/metrics.json", "200", True),
+    ("/other?format=json", "404", False),
+])
+def test_routes_on_path_and_format(target, status, is_json):
+    async def request():
+        server = MetricsServer(MetricsRegistry(), port=0)
+        await server.start()
+        try:
+            port = server._server.sockets[0].getsockname()[1]
+            return await _get(port, target)
+        finally:
+            await server.stop()
+
+    response_status, body = asyncio.run(request())
+    assert response_status == status
+    if is_json:
+        assert isinstance(json.loads(body), dict)
+    elif status == "200":
+        assert not body.lstrip().startswith("{")
@@ -0,0 +1,72 @@
+"""Rollups na ingestão: incrementos atômicos na transação das mensagens"""
+import threading
+from collections import Counter, defaultdict
+
+import pytest
+from sqlalchemy import select
+
+from conftest import message_rows
+from models import ActivityRollup, AuthorRollup, Message
+from services.rollups import RollupAccumulator, hour_bucket
+
+def _activity(db) -> dict:
+    with db.engine.connect() as connection:
+        return {row.bucket_start: (row.message_count, row.distinct_authors)
+                for row in connection.execute(select(ActivityRollup.__table__))}
+
+def _author_counts(db) -> Counter:
+    with db.engine.connect() as connection:
+        return Counter({(row.bucket_start, row.author): row.message_count
+                        for row in connection.execute(select(AuthorRollup.__table__))})
+
+def _expected(rows) -> dict:
+    authors = defaultdict(set)
+    counts = Counter()
+    for row in rows:
+        bucket = hour_bucket(row["timestamp"])
+        counts[bucket] += 1
+        authors[bucket].add(row["author"])
+    return {bucket: (counts[bucket], len(authors[bucket])) for bucket in counts}
+
+def _store(db, project_id, rows):
+    return db.create_messages(project_id, rows, RollupAccumulator(project_id))
+
+def test_batches_add_up_and_replays_count_once(db, project):
+    rows = message_rows(1, 150)  # 2h30 de mensagens, lotes cruzando as horas
+    for start in range(0, 150, 40):
+        _store(db, project.id, rows[start:start + 40])
+    assert _store(db, project.id, rows[:40]) == []  # lote repetido: nada novo
+
+    assert _activity(db) == _expected(rows)
+    assert sum(_author_counts(db).values()) == 150
+
+def test_concurrent_writers_do_not_lose_increments(db, project):
+    rows = message_rows(1, 240)
+    chunks = [rows[start::4] for start in range(4)]  # cada writer com mensagens de todas as horas
+    errors = []
+
+    def write(chunk):
+        try:
+            for start in range(0, len(chunk), 10):
+                _store(db, project.id, chunk[start:start + 10])
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write, args=(chunk,)) for chunk in chunks]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert _activity(db) == _expected(rows)
+
+def test_rollup_failure_rolls_back_the_messages(db, project, monkeypatch):
+    def fail(self, connection):
+        raise RuntimeError("rollup write failed")
+    monkeypatch.setattr(RollupAccumulator, "flush", fail)
+
+    with pytest.raises(RuntimeError):
+        _store(db, project.id, message_rows(1, 10))
+    with db.engine.connect() as connection:
+        assert connection.execute(select(Message.__table__.c.id)).first() is None
@@ -0,0 +1,71 @@
+"""Fila de coletas: ordem do heap, reagendamento (adiamento) e backoff"""
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from services.scheduler import CollectionScheduler
+
+NOW = datetime(2026, 1, 1, 12, 0)
+
+def _scheduler(monkeypatch) -> CollectionScheduler:
+    monkeypatch.setenv("COLLECTION_ERROR_BACKOFF_BASE", "60")
+    monkeypatch.setenv("COLLECTION_ERROR_BACKOFF_MAX", "300")
+    return CollectionScheduler()
+
+def test_pop_due_returns_projects_in_deadline_order(monkeypatch):
+    scheduler = _scheduler(monkeypatch)
+    for project_id, minutes in ((1, 30), (2, -10), (3, 0), (4, -20), (5, 5)):
+        scheduler.schedule(project_id, NOW + timedelta(minutes=minutes))
+
+    assert scheduler.next_due_at() == NOW - timedelta(minutes=20)
+    assert scheduler.overdue_count(NOW) == 3
+    assert scheduler.pop_due(NOW) == [4, 2, 3]
+    assert len(scheduler) == 2
+    assert scheduler.pop_due(NOW + timedelta(hours=1)) == [5, 1]
+    assert scheduler.next_due_at() is None
+
+def test_deferred_project_keeps_only_the_new_deadline(monkeypatch):
+    scheduler = _scheduler(monkeypatch)
+    scheduler.schedule(1, NOW - timedelta(minutes=5))
+    scheduler.schedule(2, NOW - timedelta(minutes=1))
+    # Adiado (FloodWait): o prazo antigo fica no heap, mas é descartado ao chegar ao topo
+    scheduler.schedule(1, NOW + timedelta(minutes=10))
+
+    assert len(scheduler) == 2
+    assert scheduler.next_due_at() == NOW - timedelta(minutes=1)
+    assert scheduler.pop_due(NOW) == [2]
+    assert scheduler.pop_due(NOW + timedelta(minutes=9)) == []
+    assert scheduler.pop_due(NOW + timedelta(minutes=10)) == [1]
+
+def test_removed_and_reloaded_projects(monkeypatch):
+    scheduler = _scheduler(monkeypatch)
+    scheduler.schedule(1, NOW)
+    scheduler.remove(1)
+    assert scheduler.pop_due(NOW) == []
+
+    scheduler.load([
+        SimpleNamespace(id=1, is_active=True, next_collection_at=NOW + timedelta(minutes=1)),
+        SimpleNamespace(id=2, is_active=False, next_collection_at=NOW),
+        SimpleNamespace(id=3, is_active=True, next_collection_at=NOW),
+    ])
+    assert len(scheduler) == 2
+    assert scheduler.pop_due(NOW + timedelta(minutes=1)) == [3, 1]
+
+def test_failure_backoff_doubles_up_to_the_maximum(monkeypatch):
+    scheduler = _scheduler(monkeypatch)
+    assert [scheduler.record_failure(1) for _ in range(5)] == [60, 120, 240, 300, 300]
+    assert scheduler.record_failure(2) == 60
+    scheduler.record_success(1)
+    assert scheduler.record_failure(1) == 60
+
+def test_wait_returns_on_wake(monkeypatch):
+    scheduler = _scheduler(monkeypatch)
+    scheduler.schedule(1, datetime.utcnow() + timedelta(hours=1))
+
+    async def wait_and_wake():
+        waiting = asyncio.create_task(scheduler.wait())
+        await asyncio.sleep(0)
+        scheduler.wake()
+        await asyncio.wait_for(waiting, timeout=1)
+
+    asyncio.run(wait_and_wake())